@@ -27,4 +27,12 @@ app.conf.beat_schedule = {
         'task': 'movies.tasks.upload_popular_movies',
         'schedule': crontab(minute=0, hour=0),
     },
+    'relay_outbox_messages': {
+        'task': 'movies.tasks.relay_outbox_messages',
+        'schedule': 5.0,
+    },
+    'flush_rating_votes': {
+        'task': 'movies.tasks.flush_rating_votes',
+        'schedule': 60.0,
+    },
 }
@@ -222,8 +222,18 @@ if DEBUG:
                    ['127.0.0.1', '10.0.2.2']
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS':
+        'movies.pagination.CountableLimitOffsetPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': (
+        'movies.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'movies.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_FILTER_BACKENDS':
         ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -235,11 +245,20 @@ REST_FRAMEWORK = {
 
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', 'test')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', 'test')
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '1') == '1'
+EMAIL_TIMEOUT = 30
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
+# Amount of subscribers notified by one task over one connection
+NOTIFICATION_CHUNK_SIZE = 100
+# Updates of the movie during the delay in seconds are sent as one email
+NOTIFICATION_DELAY = 60 * 5
+# Chunks failed by the mail server are retried after the doubling delay
+NOTIFICATION_MAX_RETRIES = 5
+NOTIFICATION_RETRY_DELAY = 30
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Your Project API',
@@ -282,6 +301,49 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Shared cache of all processes is Redis when its url is set
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', '')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cache of the process in front of the shared cache, see movies.cache
+TWO_TIER_CACHE = {
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 1024,
+    'LOCK_TIMEOUT': 10,
+    # Seconds the process keeps versions of keys, invalidation by other
+    # processes is seen after them
+    'VERSION_TIMEOUT': 1,
+}
+
+RATED_MOVIES_CACHE_TIMEOUT = 60 * 60 * 24
+# Seconds autocomplete serves the index without checking changes of other
+# processes
+AUTOCOMPLETE_VERSION_CHECK_INTERVAL = 0.1
+MOVIE_LIST_CACHE_TIMEOUT = 60 * 5
+MOVIE_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+DETAIL_REVIEW_THREADS = 10
+REVIEW_REPLY_DEPTH = 3
+MOVIE_FACET_SIZE = 20
+MOVIE_FACET_YEAR_BUCKET = 10
+# Rendered responses of movies and actors cached with compressed variants,
+# brotli is used when the library is installed
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+RESPONSE_COMPRESSION_MIN_LENGTH = 200
+RESPONSE_GZIP_LEVEL = 9
+RESPONSE_BROTLI_QUALITY = 9
+
 REDIS_HOST = 'redis'
 REDIS_PORT = '6379'
 
@@ -291,3 +353,18 @@ CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + REDIS_PORT
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Amount of tasks published from the outbox over one connection
+OUTBOX_BATCH_SIZE = 100
+
+# Write-behind buffer of rating votes: '' writes votes at once, 'local'
+# keeps them in memory of the process, 'redis' shares them between processes
+RATING_BUFFER_BACKEND = os.environ.get('RATING_BUFFER_BACKEND', '')
+RATING_BUFFER_REDIS_URL = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/1'
+RATING_BUFFER_MAX_SIZE = 1000
+RATING_BUFFER_MAX_DELAY = 2
+
+TMDB_API_URL = os.environ.get('TMDB_API_URL', 'https://api.themoviedb.org/3')
+TMDB_PAGES = 5
+TMDB_WORKERS = 4
+# Timeouts of connecting and reading in seconds
+TMDB_TIMEOUT = (3.05, 10)
@@ -9,7 +9,7 @@ from ckeditor_uploader.widgets import CKEditorUploadingWidget
 from django_admin_inline_paginator.admin import TabularInlinePaginated
 
 from .models import Category, Genre, Movie, Actor, Rating, RatingStar, \
-    Review, Director, MovieImdb
+    Review, Director, MovieImdb, OutboxMessage
 
 
 class MovieAdminForm(forms.ModelForm):
@@ -111,6 +111,7 @@ class RatingAdmin(admin.ModelAdmin):
 admin.site.register(RatingStar)
 admin.site.register(Director)
 admin.site.register(MovieImdb)
+admin.site.register(OutboxMessage)
 
 admin.site.site_title = 'Django Movies'
 admin.site.site_header = 'Django Movies'
@@ -0,0 +1,258 @@
+"""
+    Collect in-memory prefix index for autocomplete of the search box
+"""
+
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Movie, Actor, Director, Genre
+
+
+AUTOCOMPLETE_VERSION_KEY = 'autocomplete_version'
+AUTOCOMPLETE_CHANGE_KEY = 'autocomplete_change:{}'
+# Processes further behind than the limit load indexes from the database
+AUTOCOMPLETE_CHANGES_LIMIT = 1000
+AUTOCOMPLETE_CHANGES_TIMEOUT = 60 * 60
+
+AUTOCOMPLETE_SOURCES = {
+    'movies': (Movie, 'title'),
+    'actors': (Actor, 'name'),
+    'directors': (Director, 'name'),
+    'genres': (Genre, 'name'),
+}
+
+
+def fold(text: str) -> str:
+    """
+    Normalize the text for case-insensitive comparison of any alphabet
+    """
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+class PrefixIndex:
+    """
+    Sorted array of names. Every word of the name starts a key, so the
+    name is found by the beginning of any word
+    """
+
+    def __init__(self, names: Dict[int, str] = None):
+        self.names = {}
+        self.keys: List[Tuple[str, int]] = []
+        self._keys_of: Dict[int, List[Tuple[str, int]]] = {}
+        for object_id, name in (names or {}).items():
+            self.keys.extend(self._register(object_id, name))
+        self.keys.sort()
+
+    @staticmethod
+    def get_keys(object_id: int, name: str) -> List[Tuple[str, int]]:
+        """
+        Get keys of the name, one for the beginning of every word
+        """
+        words = fold(name).split()
+        return [(' '.join(words[start:]), object_id)
+                for start in range(len(words))]
+
+    def copy(self) -> 'PrefixIndex':
+        """
+        Copy the index, so it is changed while searches read the original
+        """
+        index = PrefixIndex()
+        index.names = dict(self.names)
+        index.keys = list(self.keys)
+        index._keys_of = dict(self._keys_of)
+        return index
+
+    def _register(self, object_id: int, name: str) -> list:
+        keys = self.get_keys(object_id, name)
+        self.names[object_id] = name
+        self._keys_of[object_id] = keys
+        return keys
+
+    def add(self, object_id: int, name: str) -> None:
+        """
+        Add the name or replace the name of the object
+        """
+        self.remove(object_id)
+        for key in self._register(object_id, name):
+            insort(self.keys, key)
+
+    def remove(self, object_id: int) -> None:
+        """
+        Remove the name of the object
+        """
+        for key in self._keys_of.pop(object_id, ()):
+            index = bisect_left(self.keys, key)
+            if index < len(self.keys) and self.keys[index] == key:
+                del self.keys[index]
+        self.names.pop(object_id, None)
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        """
+        Find names with a word starting with the prefix
+        :param prefix: folded prefix
+        :param limit: maximal amount of names
+        :return: list of found objects in order of keys
+        """
+        found = {}
+        index = bisect_left(self.keys, (prefix,))
+        while index < len(self.keys) and len(found) < limit:
+            key, object_id = self.keys[index]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(object_id, self.names[object_id])
+            index += 1
+        return [{'id': object_id, 'name': name}
+                for object_id, name in found.items()]
+
+
+class AutocompleteIndex:
+    """
+    Prefix indexes of titles of movies and names of actors, directors and
+    genres kept in memory of the process. Every change is numbered by the
+    version in the cache and kept in the log of changes, so processes apply
+    changes made since their version to copies of changed indexes and
+    replace them. Indexes are loaded from the database again when the
+    changes are not in the log anymore. Searches read indexes without the
+    lock and the version is checked once in the check interval
+    """
+
+    def __init__(self):
+        self.indexes: Optional[Dict[str, PrefixIndex]] = None
+        self.version = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_version():
+        """
+        Get the shared version of autocomplete data
+        """
+        version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+        if version is None:
+            cache.add(AUTOCOMPLETE_VERSION_KEY, int(time.time() * 1000), None)
+            version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+        return version
+
+    @staticmethod
+    def bump_version():
+        """
+        Change the shared version of autocomplete data
+        """
+        try:
+            return cache.incr(AUTOCOMPLETE_VERSION_KEY)
+        except ValueError:
+            cache.add(AUTOCOMPLETE_VERSION_KEY, int(time.time() * 1000), None)
+            return None
+
+    def load(self) -> Dict[str, PrefixIndex]:
+        """
+        Load indexes from the database
+        """
+        version = self.get_version()
+        indexes = {}
+        for kind, (model, field) in AUTOCOMPLETE_SOURCES.items():
+            indexes[kind] = PrefixIndex(
+                dict(model.objects.values_list('pk', field)))
+        with self._lock:
+            self.indexes, self.version = indexes, version
+            self.checked_at = time.monotonic()
+        return indexes
+
+    @staticmethod
+    def apply_changes(indexes: Dict[str, PrefixIndex], start: int,
+                      end: int) -> Optional[Dict[str, PrefixIndex]]:
+        """
+        Apply changes from the log to copies of changed indexes
+        :param indexes: indexes of the start version
+        :param start: version of indexes
+        :param end: current version
+        :return: indexes of the current version, None when changes are
+            missing in the log
+        """
+        if start is None or not 0 < end - start <= AUTOCOMPLETE_CHANGES_LIMIT:
+            return None
+        keys = [AUTOCOMPLETE_CHANGE_KEY.format(version)
+                for version in range(start + 1, end + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        changed = {}
+        for key in keys:
+            kind, object_id, name = changes[key]
+            if kind not in changed:
+                changed[kind] = indexes[kind].copy()
+            if name is None:
+                changed[kind].remove(object_id)
+            else:
+                changed[kind].add(object_id, name)
+        return {**indexes, **changed}
+
+    def refresh(self) -> Dict[str, PrefixIndex]:
+        """
+        Bring indexes to the current version by changes from the log, or
+        load them when changes are missing
+        """
+        version = self.get_version()
+        with self._lock:
+            indexes = self.indexes
+            if indexes is not None and self.version != version:
+                indexes = self.apply_changes(indexes, self.version, version)
+            if indexes is not None:
+                self.indexes, self.version = indexes, version
+                self.checked_at = time.monotonic()
+                return indexes
+        return self.load()
+
+    def get_indexes(self) -> Dict[str, PrefixIndex]:
+        """
+        Get indexes, the version is checked once in the check interval
+        """
+        indexes = self.indexes
+        if indexes is not None and time.monotonic() - self.checked_at < \
+                settings.AUTOCOMPLETE_VERSION_CHECK_INTERVAL:
+            return indexes
+        return self.refresh()
+
+    def search(self, text: str, limit: int) -> Dict[str, List[dict]]:
+        """
+        Find movies, actors, directors and genres by the beginning of words
+        :param text: text typed by the client
+        :param limit: maximal amount of objects of every kind
+        :return: kind -> found objects
+        """
+        prefix = ' '.join(fold(text).split())
+        indexes = self.get_indexes()
+        if not prefix:
+            return {kind: [] for kind in indexes}
+        return {kind: index.search(prefix, limit)
+                for kind, index in indexes.items()}
+
+    def _change(self, kind: str, object_id: int,
+                name: Optional[str]) -> None:
+        version = self.bump_version()
+        if version is not None:
+            cache.set(AUTOCOMPLETE_CHANGE_KEY.format(version),
+                      (kind, object_id, name), AUTOCOMPLETE_CHANGES_TIMEOUT)
+        if self.indexes is not None:
+            self.refresh()
+
+    def update(self, kind: str, object_id: int, name: str) -> None:
+        """
+        Apply the saved name to the index and to other processes
+        """
+        self._change(kind, object_id, name)
+
+    def remove(self, kind: str, object_id: int) -> None:
+        """
+        Apply the deleted object to the index and to other processes
+        """
+        self._change(kind, object_id, None)
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,292 @@
+"""
+    Collect two-tier cache: the bounded cache in memory of the process in
+    front of the shared cache
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Optional, Union
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    """
+    Cache of the process keeping the given amount of recently used entries
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry) -> None:
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class TwoTierCache:
+    """
+    Values are looked for in the cache of the process, then in the shared
+    cache, and computed on the miss. Every key has the version in the
+    shared cache, so invalidation of the key is seen by all processes.
+    The process keeps versions for the version timeout, so local hits do
+    not go to the shared cache and invalidation by other processes is seen
+    after the timeout.
+
+    Only one process computes the missing value, others wait for it.
+    Values are refreshed before they expire with the probability growing
+    to the expiration and the time of computation. Expired values are
+    served during the stale timeout while another process refreshes them
+    """
+
+    STATS = ('hits', 'local_hits', 'misses', 'refreshes', 'stale_hits')
+
+    def __init__(self, alias: str = 'default', max_entries: int = 1024,
+                 lock_timeout: float = 10, poll_interval: float = 0.05,
+                 beta: float = 1.0, prefix: str = 'two_tier',
+                 version_timeout: float = 1):
+        self.alias = alias
+        self.local = LRUCache(max_entries)
+        self.versions = LRUCache(max_entries)
+        self.version_timeout = version_timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.beta = beta
+        self.prefix = prefix
+        self.stats = dict.fromkeys(self.STATS, 0)
+        self._stats_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Get counters of the process and the amount of local entries
+        """
+        with self._stats_lock:
+            return {**self.stats, 'local_entries': len(self.local)}
+
+    def get_version(self, key: str) -> int:
+        """
+        Get the version of the key
+        """
+        version_key = f'{self.prefix}:version:{key}'
+        version = self.shared.get(version_key)
+        if version is None:
+            # Start from the current time, so the version is not repeated
+            # when the counter was evicted from the cache
+            self.shared.add(version_key, int(time.time() * 1000), None)
+            version = self.shared.get(version_key)
+        return version
+
+    def get_local_version(self, key: str, now: float) -> int:
+        """
+        Get the version of the key kept by the process, it is taken from
+        the shared cache again after the version timeout
+        """
+        entry = self.versions.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        version = self.get_version(key)
+        self.versions.set(key, (version, now + self.version_timeout))
+        return version
+
+    def clear(self) -> None:
+        """
+        Drop values and versions of both tiers, the whole shared cache is
+        cleared
+        """
+        self.local.clear()
+        self.versions.clear()
+        self.shared.clear()
+
+    def invalidate(self, key: str) -> None:
+        """
+        Change the version of the key, so its values become outdated in all
+        processes
+        """
+        self.versions.delete(key)
+        version_key = f'{self.prefix}:version:{key}'
+        try:
+            self.shared.incr(version_key)
+        except ValueError:
+            self.get_version(key)
+            self.shared.incr(version_key)
+
+    def get_entry(self, data_key: str, now: float) -> Optional[tuple]:
+        """
+        Get not expired entry from the cache of the process or the shared one
+        :return: value, time of freshness end, time of expiration and
+            duration of computation
+        """
+        entry = self.local.get(data_key)
+        if entry is not None and entry[2] <= now:
+            self.local.delete(data_key)
+            entry = None
+        if entry is not None:
+            self.count('local_hits')
+            return entry
+        entry = self.shared.get(data_key)
+        if entry is not None and entry[2] > now:
+            self.local.set(data_key, entry)
+            return entry
+        return None
+
+    def should_refresh(self, entry: tuple, now: float) -> bool:
+        """
+        Decide to refresh the value early. Values which take longer to
+        compute are refreshed earlier
+        """
+        _, fresh_until, _, delta = entry
+        return now - delta * self.beta * math.log(1 - random.random()) \
+            >= fresh_until
+
+    def compute(self, data_key: str, func: Callable, timeout: Optional[float],
+                stale_timeout: float):
+        """
+        Compute the value and put it to both caches
+        """
+        started = time.monotonic()
+        value = func()
+        delta = time.monotonic() - started
+        now = time.time()
+        fresh_until = math.inf if timeout is None else now + timeout
+        entry = (value, fresh_until, fresh_until + stale_timeout, delta)
+        self.shared.set(data_key, entry,
+                        None if timeout is None else timeout + stale_timeout)
+        self.local.set(data_key, entry)
+        return value
+
+    def acquire(self, data_key: str) -> bool:
+        return self.shared.add(f'{data_key}:lock', True, self.lock_timeout)
+
+    def release(self, data_key: str) -> None:
+        self.shared.delete(f'{data_key}:lock')
+
+    def get_or_set(self, key: str, func: Callable,
+                   timeout: Optional[float] = 60, stale_timeout: float = 0):
+        """
+        Get the value of the key or compute it
+        :param key: key of the value
+        :param func: function computing the value
+        :param timeout: amount of seconds the value is fresh, None for
+            values which are changed only by invalidation
+        :param stale_timeout: amount of seconds the expired value is served
+            while it is refreshed
+        :return: value
+        """
+        now = time.time()
+        data_key = f'{self.prefix}:{key}:{self.get_local_version(key, now)}'
+        entry = self.get_entry(data_key, now)
+        if entry is not None:
+            if not self.should_refresh(entry, now):
+                self.count('hits')
+                return entry[0]
+            if not self.acquire(data_key):
+                # Another process refreshes the value
+                self.count('stale_hits')
+                return entry[0]
+            self.count('refreshes')
+            try:
+                return self.compute(data_key, func, timeout, stale_timeout)
+            finally:
+                self.release(data_key)
+
+        self.count('misses')
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            if self.acquire(data_key):
+                try:
+                    return self.compute(data_key, func, timeout,
+                                        stale_timeout)
+                finally:
+                    self.release(data_key)
+            time.sleep(self.poll_interval)
+            entry = self.get_entry(data_key, time.time())
+            if entry is not None:
+                return entry[0]
+        # The process holding the lock takes too long
+        return self.compute(data_key, func, timeout, stale_timeout)
+
+
+def get_two_tier_cache() -> TwoTierCache:
+    """
+    Get the two-tier cache configured in settings
+    """
+    global _two_tier_cache
+    if _two_tier_cache is None:
+        options = settings.TWO_TIER_CACHE
+        _two_tier_cache = TwoTierCache(
+            alias=options.get('ALIAS', 'default'),
+            max_entries=options.get('MAX_ENTRIES', 1024),
+            lock_timeout=options.get('LOCK_TIMEOUT', 10),
+            version_timeout=options.get('VERSION_TIMEOUT', 1))
+    return _two_tier_cache
+
+
+_two_tier_cache: Optional[TwoTierCache] = None
+
+
+def cached(key: Union[str, Callable[..., str]],
+           timeout: Optional[float] = 60, stale_timeout: float = 0,
+           cache: TwoTierCache = None):
+    """
+    Decorator caching results of the function in the two-tier cache.
+    Decorated function gets invalidate method taking the same arguments
+    :param key: key or template of the key formatted with arguments of the
+        function, or function building the key from them
+    :param timeout: amount of seconds the value is fresh
+    :param stale_timeout: amount of seconds the expired value is served
+        while it is refreshed
+    :param cache: two-tier cache, the one from settings by default
+    """
+    def make_key(*args, **kwargs) -> str:
+        return key(*args, **kwargs) if callable(key) \
+            else key.format(*args, **kwargs)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            return (cache or get_two_tier_cache()).get_or_set(
+                make_key(*args, **kwargs), lambda: func(*args, **kwargs),
+                timeout, stale_timeout)
+
+        def invalidate(*args, **kwargs) -> None:
+            (cache or get_two_tier_cache()).invalidate(
+                make_key(*args, **kwargs))
+
+        wrapper.invalidate = invalidate
+        return wrapper
+    return decorator
@@ -0,0 +1,220 @@
+"""
+    Collect compiled read-only serializers for hot list endpoints
+"""
+
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+
+class CompiledSerializer:
+    """
+    Read-only serializer compiled from the model serializer class. Fields
+    of the serializer are inspected once, rows are read by values() of the
+    queryset and every page is serialized by the generated function, which
+    gives the same output as the serializer
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.pk_column = self.model._meta.pk.attname
+        self.fields = [self.compile_field(name, field) for name, field
+                       in serializer_class().fields.items()
+                       if not field.write_only]
+        self._functions = {}
+
+    def compile_field(self, name: str, field) -> dict:
+        """
+        Find out how the value of the field is read from the row
+        :param name: name of the field in the output
+        :param field: field of the serializer
+        :return: description of the field
+        """
+        if field.source == '*' or '.' in field.source:
+            raise ImproperlyConfigured(
+                f'Field {name} of {self.serializer_class.__name__} can not '
+                f'be compiled, its source is {field.source!r}')
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            model_field = None
+
+        if isinstance(field, ManyRelatedField):
+            relation = field.child_relation
+            supported = all((isinstance(relation, PrimaryKeyRelatedField),
+                             isinstance(model_field, models.ManyToManyField),
+                             relation.pk_field is None))
+            if not supported:
+                raise ImproperlyConfigured(
+                    f'Field {name} of {self.serializer_class.__name__} can '
+                    f'not be compiled, only primary keys of many to many '
+                    f'fields are supported')
+            return {'name': name, 'kind': 'many', 'field': model_field}
+
+        column = field.source
+        if isinstance(field, PrimaryKeyRelatedField):
+            if field.pk_field is not None or model_field is None:
+                raise ImproperlyConfigured(
+                    f'Field {name} of {self.serializer_class.__name__} can '
+                    f'not be compiled, only foreign keys are supported')
+            column = model_field.attname
+            kind = 'value'
+        elif isinstance(field, (serializers.IntegerField,
+                                serializers.CharField)):
+            kind = 'value'
+        elif isinstance(field, serializers.BooleanField):
+            kind = 'bool'
+        elif isinstance(field, serializers.DateField) and \
+                self.get_date_format(field) == ISO_8601:
+            kind = 'date'
+        else:
+            kind = 'field'
+        return {'name': name, 'kind': kind, 'column': column,
+                'field': field, 'concrete': model_field is not None}
+
+    @staticmethod
+    def get_date_format(field) -> str:
+        """
+        Get the output format of the date field
+        """
+        return str(getattr(field, 'format', api_settings.DATE_FORMAT)).lower()
+
+    def get_columns(self, queryset) -> Tuple[str, ...]:
+        """
+        Get columns of rows for the queryset. Fields which are not
+        annotated to the queryset are skipped like the serializer does
+        """
+        annotations = queryset.query.annotations
+        columns = {self.pk_column: None}
+        for field in self.fields:
+            if field['kind'] == 'many':
+                continue
+            if field['concrete'] or field['column'] in annotations:
+                columns[field['column']] = None
+        return tuple(columns)
+
+    def values(self, queryset):
+        """
+        Get the queryset of rows for the serialization
+        """
+        return queryset.values(*self.get_columns(queryset))
+
+    def get_function(self, columns: Tuple[str, ...]):
+        """
+        Get the function serializing rows with the columns, it is generated
+        once for every set of columns
+        """
+        function = self._functions.get(columns)
+        if function is None:
+            function = self._functions[columns] = self.generate(columns)
+        return function
+
+    def generate(self, columns: Tuple[str, ...]):
+        """
+        Generate the function which serializes list of rows
+        :param columns: columns of rows
+        :return: function taking rows and primary keys of many to many
+            fields for every row
+        """
+        namespace = {}
+        items = []
+        many = []
+        for field in self.fields:
+            if field['kind'] == 'many':
+                argument = f'many_{len(many)}'
+                many.append(argument)
+                items.append(f'{field["name"]!r}: '
+                             f'{argument}.get(row[{self.pk_column!r}]) or []')
+                continue
+            if field['column'] not in columns:
+                continue
+            value = f'row[{field["column"]!r}]'
+            if field['kind'] == 'value':
+                expression = value
+            elif field['kind'] == 'bool':
+                expression = f'None if {value} is None else bool({value})'
+            elif field['kind'] == 'date':
+                expression = f'{value} and {value}.isoformat()'
+            else:
+                converter = f'convert_{len(namespace)}'
+                namespace[converter] = field['field'].to_representation
+                expression = f'None if {value} is None else ' \
+                             f'{converter}({value})'
+            items.append(f'{field["name"]!r}: {expression}')
+
+        source = 'def serialize(rows, many):\n'
+        if many:
+            source += f'    {", ".join(many)}, = many\n'
+        source += f'    return [{{{", ".join(items)}}} for row in rows]\n'
+        exec(compile(source, f'<compiled {self.serializer_class.__name__}>',
+                     'exec'), namespace)
+        return namespace['serialize']
+
+    def load_many(self, rows: list) -> list:
+        """
+        Load primary keys of many to many fields for rows
+        :return: dict primary key of row -> list of primary keys for every
+            many to many field
+        """
+        ids = [row[self.pk_column] for row in rows]
+        many = []
+        for field in self.fields:
+            if field['kind'] != 'many':
+                continue
+            model_field = field['field']
+            query_name = model_field.related_query_name()
+            related = defaultdict(list)
+            if ids:
+                pairs = (model_field.related_model._default_manager
+                         .filter(**{f'{query_name}__in': ids})
+                         .values_list(query_name, 'pk'))
+                for row_id, related_id in pairs:
+                    related[row_id].append(related_id)
+            many.append(related)
+        return many
+
+    def serialize(self, rows) -> list:
+        """
+        Serialize rows read by values() of the queryset
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        return self.get_function(tuple(rows[0]))(rows, self.load_many(rows))
+
+
+_compiled: Dict[type, CompiledSerializer] = {}
+
+
+def compile_serializer(serializer_class) -> CompiledSerializer:
+    """
+    Get the compiled serializer for the serializer class, it is compiled
+    once for every class
+    """
+    compiled = _compiled.get(serializer_class)
+    if compiled is None:
+        compiled = _compiled[serializer_class] = \
+            CompiledSerializer(serializer_class)
+    return compiled
+
+
+class CompiledListMixin:
+    """
+    Serve list of the view with the compiled serializer of the view
+    """
+
+    def list(self, request, *args, **kwargs):
+        compiled = compile_serializer(self.get_serializer_class())
+        queryset = compiled.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        data = compiled.serialize(page if page is not None else queryset)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,208 @@
+"""
+    Collect the cache of rendered responses kept with compressed variants,
+    so responses are compressed once and not on every request
+"""
+
+import gzip
+import hashlib
+import json
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http.response import HttpResponseBase
+from django.utils.cache import patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Encodings preferred by the server when the client accepts them equally
+PREFERRED_ENCODINGS = ('br', 'gzip')
+
+
+def compress_variants(content: bytes) -> Dict[str, bytes]:
+    """
+    Compress the content by every available encoding. Short content and
+    variants which are not smaller than the content are skipped
+    :param content: rendered content
+    :return: encoding -> content, identity is the content as is
+    """
+    variants = {'identity': content}
+    if len(content) < settings.RESPONSE_COMPRESSION_MIN_LENGTH:
+        return variants
+    compressed = {'gzip': gzip.compress(
+        content, settings.RESPONSE_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        compressed['br'] = brotli.compress(
+            content, quality=settings.RESPONSE_BROTLI_QUALITY)
+    variants.update((encoding, data) for encoding, data in compressed.items()
+                    if len(data) < len(content))
+    return variants
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Parse Accept-Encoding header
+    :param header: value of the header
+    :return: encoding -> quality
+    """
+    accepted = {}
+    for item in header.split(','):
+        encoding, *params = item.split(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def choose_encoding(header: str, encodings) -> str:
+    """
+    Choose the encoding with the highest quality for the client among
+    available ones
+    :param header: value of Accept-Encoding header
+    :param encodings: available encodings
+    :return: encoding, identity when no compressed variant is accepted
+    """
+    accepted = parse_accept_encoding(header)
+    chosen, chosen_quality = 'identity', 0.0
+    for encoding in PREFERRED_ENCODINGS:
+        if encoding not in encodings:
+            continue
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > chosen_quality:
+            chosen, chosen_quality = encoding, quality
+    return chosen
+
+
+class VariantResponse(Response):
+    """
+    Response with the content rendered in advance. Data is parsed from the
+    content when it is read, so the response is not rendered again
+    """
+
+    def __init__(self, content: bytes, identity: bytes, content_type: str):
+        super().__init__(content_type=content_type)
+        self.identity = identity
+        self['Content-Type'] = content_type
+        self.content = content
+
+    @property
+    def data(self):
+        if self._data is None and getattr(self, 'identity', None):
+            self._data = json.loads(self.identity)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+
+def response_from_variants(request, entry: dict,
+                           etag: Optional[str] = None) -> VariantResponse:
+    """
+    Build the response from the cached variant accepted by the client
+    :param request: request with Accept-Encoding header
+    :param entry: cached content type and variants of the content
+    :param etag: tag of the representation, it is weak for compressed
+        variants, because their bytes differ from the representation
+    :return: response
+    """
+    variants = entry['variants']
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''),
+                               variants)
+    response = VariantResponse(variants[encoding], variants['identity'],
+                               entry['content_type'])
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    if etag is not None:
+        response['ETag'] = etag if encoding == 'identity' else f'W/{etag}'
+    patch_vary_headers(response, ('Accept-Encoding', ))
+    return response
+
+
+class CompressedResponseMixin:
+    """
+    Keep rendered JSON responses of the view in the cache with compressed
+    variants. Responses are tagged by validators, so the tag and the media
+    type are the key of the cache and changed responses are not served
+    """
+
+    def get_compressed_cache_key(self, etag: str) -> str:
+        signature = hashlib.md5(
+            f'{self.basename}:{etag}:{self.request.accepted_media_type}'
+            .encode()).hexdigest()
+        return f'compressed_response:{signature}'
+
+    def tagged_response(self, build: Callable[[], HttpResponseBase],
+                        etag: Optional[str] = None,
+                        last_modified: Optional[datetime] = None,
+                        shared: bool = True) -> HttpResponseBase:
+        """
+        Answer the request with the compressed variant of the response
+        :param build: function building the response
+        :param etag: tag of the current representation
+        :param last_modified: time of the last change of the representation
+        :param shared: whether the representation is served to many clients,
+            variants of a representation of one client are not cached
+        :return: response
+        """
+        if etag is None or \
+                not isinstance(self.request.accepted_renderer, JSONRenderer):
+            return super().tagged_response(build, etag=etag,
+                                           last_modified=last_modified)
+        key = self.get_compressed_cache_key(etag) if shared else None
+        response = super().tagged_response(
+            self.cached_build(key, build, etag), etag=etag,
+            last_modified=last_modified)
+        if response.status_code == 304:
+            patch_vary_headers(response, ('Accept-Encoding', ))
+        return response
+
+    def cached_build(self, key: Optional[str],
+                     build: Callable[[], HttpResponseBase],
+                     etag: str) -> Callable[[], HttpResponseBase]:
+        """
+        Wrap the function building the response, so the response is taken
+        from the cache or rendered and compressed once and put to the cache
+        :param key: key of the cached response, None to compress the response
+            without the cache
+        :param build: function building the response
+        :param etag: tag of the response
+        :return: function building the response
+        """
+        def cached() -> HttpResponseBase:
+            entry = cache.get(key) if key is not None else None
+            if entry is None:
+                response = build()
+                if not isinstance(response, Response) or \
+                        response.status_code != 200:
+                    return response
+                # Headers of the view are added to the served response
+                response.accepted_renderer = self.request.accepted_renderer
+                response.accepted_media_type = \
+                    self.request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                response.render()
+                entry = {'content_type': response['Content-Type'],
+                         'variants': compress_variants(response.content)}
+                if key is not None:
+                    cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+            return response_from_variants(self.request, entry,
+                                          quote_etag(etag))
+        return cached
@@ -0,0 +1,109 @@
+"""
+    Collect conditional GET answering unchanged representations with
+    304 Not Modified. Validators are computed without building the response
+"""
+
+import hashlib
+from calendar import timegm
+from datetime import datetime
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .utils import get_list_cache_key
+
+
+def conditional_response(request, build: Callable[[], HttpResponseBase],
+                         etag: Optional[str] = None,
+                         last_modified: Optional[datetime] = None
+                         ) -> HttpResponseBase:
+    """
+    Answer 304 Not Modified when the client has the current representation,
+    otherwise build the response and set validators to it
+    :param request: request with If-None-Match or If-Modified-Since headers
+    :param build: function building the response
+    :param etag: tag of the current representation
+    :param last_modified: time of the last change of the representation
+    :return: response
+    """
+    etag = quote_etag(etag) if etag is not None else None
+    timestamp = timegm(last_modified.utctimetuple()) \
+        if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=timestamp)
+    if response is not None:
+        return response
+    response = build()
+    if response.status_code == 200:
+        if etag is not None and not response.has_header('ETag'):
+            response['ETag'] = etag
+        if timestamp is not None and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def get_list_etag(list_key: str, *parts) -> str:
+    """
+    Tag of the list built from the key of the cached list, which has the
+    version of the catalog and normalized query params
+    :param list_key: key of the cached list
+    :param parts: other values the representation depends on
+    :return: tag
+    """
+    return hashlib.md5(f'{list_key}:{parts}'.encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    Answer unchanged list and detail of the view with 304 Not Modified.
+    The list is tagged by the version of the catalog, the detail by the
+    time of the last change of the object selected by the primary key
+    """
+
+    def list(self, request, *args, **kwargs):
+        build = partial(super().list, request, *args, **kwargs)
+        return self.tagged_response(build, etag=self.get_list_etag())
+
+    def retrieve(self, request, *args, **kwargs):
+        build = partial(super().retrieve, request, *args, **kwargs)
+        etag, last_modified = self.get_object_validators()
+        return self.tagged_response(build, etag=etag,
+                                    last_modified=last_modified)
+
+    def tagged_response(self, build: Callable[[], HttpResponseBase],
+                        etag: Optional[str] = None,
+                        last_modified: Optional[datetime] = None
+                        ) -> HttpResponseBase:
+        """
+        Answer the request with validators of the current representation
+        :param build: function building the response
+        :param etag: tag of the current representation
+        :param last_modified: time of the last change of the representation
+        :return: response
+        """
+        return conditional_response(self.request, build, etag=etag,
+                                    last_modified=last_modified)
+
+    def get_list_etag(self) -> str:
+        return get_list_etag(get_list_cache_key(self.basename, self.request))
+
+    def get_object_validators(self) -> Tuple[Optional[str],
+                                             Optional[datetime]]:
+        """
+        Get the tag and the time of the last change of the requested object
+        by one query of its updated_at, None when the object is missing
+        """
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            updated_at = (self.get_queryset().model._default_manager
+                          .filter(**{self.lookup_field: lookup})
+                          .values_list('updated_at', flat=True).first())
+        except (ValueError, ValidationError):
+            updated_at = None
+        if updated_at is None:
+            return None, None
+        return f'{lookup}:{updated_at.timestamp()}', updated_at
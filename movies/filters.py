@@ -2,36 +2,101 @@
     Collect filters for movie app
 """
 
+from django.db import models
+from django.db.models.constants import LOOKUP_SEP
 from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
 
 from .models import Movie, Actor
 
 
+MATCH_CHOICES = (('any', 'any'), ('all', 'all'))
+
+
+def get_through_columns(model, relation: str) -> tuple:
+    """
+    Get the table of many to many relation and names of its foreign keys
+    :param model: model which is filtered
+    :param relation: name of the forward or reverse many to many relation
+    :return: through model, foreign key to the model, foreign key to
+        the related model
+    """
+    field = model._meta.get_field(relation)
+    if isinstance(field, models.ManyToManyField):
+        return (field.remote_field.through, field.m2m_field_name(),
+                field.m2m_reverse_field_name())
+    forward = field.remote_field
+    return (forward.remote_field.through, forward.m2m_reverse_field_name(),
+            forward.m2m_field_name())
+
+
 class CharFilterInFilter(filters.BaseInFilter, filters.CharFilter):
     pass
 
 
+class RelatedExistsFilter(CharFilterInFilter):
+    """
+    Filter by values of related objects with correlated EXISTS subquery on
+    the table of many to many relation, so objects are not duplicated by
+    joins. With match=all every listed value must be related
+    """
+
+    def is_match_all(self) -> bool:
+        """
+        Check whether the filterset asks to match all values
+        """
+        form = getattr(self.parent, 'form', None)
+        cleaned_data = getattr(form, 'cleaned_data', {})
+        return cleaned_data.get('match') == 'all'
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        relation, lookup = self.field_name.split(LOOKUP_SEP, 1)
+        through, source, target = get_through_columns(qs.model, relation)
+        if self.is_match_all():
+            groups = [[item] for item in dict.fromkeys(value)]
+        else:
+            groups = [value]
+        for group in groups:
+            qs = qs.filter(models.Exists(through.objects.filter(**{
+                source: models.OuterRef('pk'),
+                f'{target}{LOOKUP_SEP}{lookup}__in': group,
+            })))
+        return qs
+
+
 class MovieFilter(filters.FilterSet):
     """
     Filters for movie
     """
-    genres = CharFilterInFilter(field_name='genres__name', lookup_expr='in')
-    actors = CharFilterInFilter(field_name='actors__name', lookup_expr='in')
-    directors = CharFilterInFilter(field_name='directors__name', lookup_expr='in')
+    genres = RelatedExistsFilter(field_name='genres__name', lookup_expr='in')
+    actors = RelatedExistsFilter(field_name='actors__name', lookup_expr='in')
+    directors = RelatedExistsFilter(field_name='directors__name',
+                                    lookup_expr='in')
     title = CharFilterInFilter(field_name='title', lookup_expr='in')
     year = filters.RangeFilter()
+    match = filters.ChoiceFilter(choices=MATCH_CHOICES, method='filter_match',
+                                 label='Match all or any of listed names')
 
     class Meta:
         model = Movie
         fields = ['genres', 'year', 'directors', 'actors', 'title']
 
+    def filter_match(self, queryset, name, value):
+        """
+        The mode is read by filters of related names
+        """
+        return queryset
+
 
 class ActorBasedMovie(filters.FilterSet):
     """
     Find the actors who played in the film with the name X
     """
 
-    title = CharFilterInFilter(field_name='film_actor__title', lookup_expr='in')
+    title = RelatedExistsFilter(field_name='film_actor__title',
+                                lookup_expr='in')
 
     class Meta:
         model = Actor
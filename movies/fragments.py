@@ -0,0 +1,118 @@
+"""
+    Collect functions for the store of pre-serialized movies
+"""
+
+import time
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models.functions import NullIf
+
+from .compiled import compile_serializer
+from .models import Movie
+from .renderers import JSONFragment, FastJSONRenderer
+from .serializers import MovieListSerializer
+
+
+def movie_version_key(movie_id: int) -> str:
+    """
+    Key of the version of the movie representation in the cache
+    """
+    return f'movie_version:{movie_id}'
+
+
+def get_movie_versions(movie_ids: Iterable[int]) -> dict:
+    """
+    Get versions of movies representation
+    :param movie_ids: ids of movies
+    :return: id of movie -> version
+    """
+    keys = {movie_id: movie_version_key(movie_id) for movie_id in movie_ids}
+    cached = cache.get_many(keys.values())
+    versions = {}
+    for movie_id, key in keys.items():
+        if key not in cached:
+            # Start from the current time, so the version is not repeated
+            # when the counter was evicted from the cache
+            cache.add(key, int(time.time() * 1000), None)
+            cached[key] = cache.get(key)
+        versions[movie_id] = cached[key]
+    return versions
+
+
+def bump_movie_versions(movie_ids: Iterable[int]) -> None:
+    """
+    Change versions of movies, so their fragments are built again
+    """
+    for movie_id in movie_ids:
+        try:
+            cache.incr(movie_version_key(movie_id))
+        except ValueError:
+            cache.add(movie_version_key(movie_id), int(time.time() * 1000),
+                      None)
+
+
+def get_movie_fragments(kind: str, movie_ids: list,
+                        build: Callable[[list], dict]) -> list:
+    """
+    Get serialized movies from the cache, building missing ones
+    :param kind: name of the representation of movies
+    :param movie_ids: ids of movies
+    :param build: function which serializes movies by ids to
+        dict id of movie -> JSON bytes
+    :return: fragments in order of ids, deleted movies are skipped
+    """
+    versions = get_movie_versions(movie_ids)
+    keys = {movie_id: f'movie_fragment:{kind}:{movie_id}:{version}'
+            for movie_id, version in versions.items()}
+    contents = cache.get_many(keys.values())
+
+    missing = [movie_id for movie_id in movie_ids
+               if keys[movie_id] not in contents]
+    if missing:
+        built = {keys[movie_id]: content
+                 for movie_id, content in build(missing).items()}
+        cache.set_many(built, settings.MOVIE_FRAGMENT_CACHE_TIMEOUT)
+        contents.update(built)
+
+    return [JSONFragment(movie_id, contents[keys[movie_id]])
+            for movie_id in movie_ids if keys[movie_id] in contents]
+
+
+def render_fragments(items) -> dict:
+    """
+    Render serialized objects to JSON separately
+    :param items: serialized objects
+    :return: id of object -> JSON bytes
+    """
+    renderer = FastJSONRenderer()
+    return {item['id']: renderer.render(item) for item in items}
+
+
+def build_movie_list_fragments(movie_ids: list) -> dict:
+    """
+    Serialize movies as they are present in the list of movies. Movies are
+    not marked as rated, it is done for every client separately
+    """
+    compiled = compile_serializer(MovieListSerializer)
+    movies = (
+        Movie.objects.filter(pk__in=movie_ids)
+            .annotate(
+            rating_user=models.Value(False, output_field=models.BooleanField())
+        ).annotate(
+            middle_star=models.F('rating_sum') / NullIf(
+                models.F('rating_count'), 0)
+        )
+    )
+    return render_fragments(compiled.serialize(compiled.values(movies)))
+
+
+def build_wished_movie_fragments(movie_ids: list) -> dict:
+    """
+    Serialize movies as they are present in wishes of users
+    """
+    compiled = compile_serializer(MovieListSerializer)
+    movies = Movie.objects.filter(pk__in=movie_ids)
+    return render_fragments(compiled.serialize(compiled.values(movies)))
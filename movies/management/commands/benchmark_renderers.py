@@ -0,0 +1,117 @@
+"""
+    Command for comparing the fast JSON renderer and parser with the
+    standard ones
+"""
+
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models.functions import NullIf
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from movies import parsers, renderers
+from movies.compiled import compile_serializer
+from movies.models import Movie, MovieImdb
+from movies.parsers import FastJSONParser
+from movies.renderers import FastJSONRenderer
+from movies.serializers import MovieListSerializer, MovieDetailSerializer
+
+from .benchmark_serializers import Command as SerializersCommand
+
+
+class Command(BaseCommand):
+    help = 'Measure rendering and parsing of pages of movies, details of ' \
+           'movies and pages of imdb movies by the standard JSON renderer ' \
+           'and parser and by the fast ones. Movies are created in the ' \
+           'transaction which is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100,
+                            help='Amount of movies in the page')
+        parser.add_argument('--pages', type=int, default=100,
+                            help='Amount of pages rendered in one measurement')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Amount of measurements, the best is shown')
+
+    @staticmethod
+    def _get_payloads(rows: int) -> dict:
+        """
+        Serialize payloads the api responds with
+        :return: name of payload -> data
+        """
+        SerializersCommand._create_movies(rows)
+        movies = Movie.objects.filter(url__startswith='benchmark-movie-')
+        compiled = compile_serializer(MovieListSerializer)
+        page = compiled.serialize(compiled.values(
+            movies.annotate(
+                rating_user=models.Value(
+                    False, output_field=models.BooleanField()),
+                middle_star=models.F('rating_sum') / NullIf(
+                    models.F('rating_count'), 0))))
+        detail = MovieDetailSerializer(
+            movies.select_related('category')
+            .prefetch_related('directors', 'actors', 'genres').first()).data
+        MovieImdb.objects.bulk_create(
+            MovieImdb(unique_id=10 ** 8 + number, title=f'Movie {number}',
+                      overview='Overview of the movie. ' * 10,
+                      release_date=date(2000 + number % 20, 1, 1),
+                      vote_count=number * 10,
+                      vote_average=Decimal(number % 1000) / 100,
+                      media_type='movie') for number in range(rows))
+        imdb_page = list(MovieImdb.objects.filter(unique_id__gte=10 ** 8)
+                         .values())
+        return {
+            'Movie list page': {'count': rows, 'next': None,
+                                'previous': None, 'results': page},
+            'Movie detail': detail,
+            'Imdb movie page': {'count': rows, 'next': None,
+                                'previous': None, 'results': imdb_page},
+        }
+
+    def _compare(self, name: str, standard, fast, repeat: int) -> None:
+        """
+        Measure both functions and write the result
+        """
+        standard_time, standard_output = SerializersCommand._measure(
+            standard, repeat)
+        fast_time, fast_output = SerializersCommand._measure(fast, repeat)
+        if standard_output != fast_output:
+            raise CommandError(f'Output of the fast {name} differs')
+        self.stdout.write(
+            f'{name}: {standard_time * 1000:.1f} ms standard, '
+            f'{fast_time * 1000:.1f} ms fast, '
+            f'{standard_time / fast_time:.1f} times faster')
+
+    def handle(self, *args, **options):
+        rows, pages, repeat = \
+            options['rows'], options['pages'], options['repeat']
+        if renderers.orjson is None or parsers.orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson is not installed, the fast renderer and parser fall '
+                'back to the standard ones'))
+        with transaction.atomic():
+            payloads = self._get_payloads(rows)
+            transaction.set_rollback(True)
+
+        standard_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        standard_parser, fast_parser = JSONParser(), FastJSONParser()
+        for name, data in payloads.items():
+            content = standard_renderer.render(data)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}, {len(content)} bytes x {pages}'))
+            self._compare(
+                'renderer',
+                lambda: [standard_renderer.render(data) for _ in range(pages)],
+                lambda: [fast_renderer.render(data) for _ in range(pages)],
+                repeat)
+            self._compare(
+                'parser',
+                lambda: [standard_parser.parse(io.BytesIO(content))
+                         for _ in range(pages)],
+                lambda: [fast_parser.parse(io.BytesIO(content))
+                         for _ in range(pages)],
+                repeat)
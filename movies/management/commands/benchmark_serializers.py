@@ -0,0 +1,104 @@
+"""
+    Command for comparing compiled serializers with serializers of the api
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from movies.compiled import compile_serializer
+from movies.models import Movie, Actor, Director, Genre
+from movies.serializers import MovieListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure serialization of the page of movies by the list ' \
+           'serializer and by the compiled one. Movies are created in the ' \
+           'transaction which is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help='Amount of movies in the page')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Amount of measurements, the best is shown')
+
+    @staticmethod
+    def _create_movies(rows: int) -> None:
+        """
+        Create movies with actors, directors and genres
+        """
+        Actor.objects.bulk_create(
+            Actor(name=f'Benchmark actor {number}', age=30,
+                  description='Actor') for number in range(10))
+        Director.objects.bulk_create(
+            Director(name=f'Benchmark director {number}', age=50)
+            for number in range(5))
+        Genre.objects.bulk_create(
+            Genre(name=f'Benchmark genre {number}', description='Genre',
+                  url=f'benchmark-genre-{number}') for number in range(5))
+        Movie.objects.bulk_create(
+            Movie(title=f'Movie {number}', description='Movie', year=2000,
+                  country='USA', url=f'benchmark-movie-{number}')
+            for number in range(rows))
+
+        actors = list(Actor.objects.filter(name__startswith='Benchmark ')
+                      .values_list('pk', flat=True))
+        directors = list(Director.objects
+                         .filter(name__startswith='Benchmark ')
+                         .values_list('pk', flat=True))
+        genres = list(Genre.objects.filter(url__startswith='benchmark-')
+                      .values_list('pk', flat=True))
+        movies = Movie.objects.filter(url__startswith='benchmark-movie-')\
+            .values_list('pk', flat=True)
+        links = {'actors': [], 'directors': [], 'genres': []}
+        for number, movie_id in enumerate(movies):
+            links['actors'].extend(Movie.actors.through(
+                movie_id=movie_id, actor_id=actor_id)
+                for actor_id in actors[number % 10:number % 10 + 3])
+            links['directors'].append(Movie.directors.through(
+                movie_id=movie_id, director_id=directors[number % 5]))
+            links['genres'].extend(Movie.genres.through(
+                movie_id=movie_id, genre_id=genre_id)
+                for genre_id in genres[number % 5:number % 5 + 2])
+        for name, objects in links.items():
+            getattr(Movie, name).through.objects.bulk_create(objects)
+
+    @staticmethod
+    def _measure(serialize, repeat: int):
+        """
+        Run the serialization several times
+        :return: the best time in seconds and the output
+        """
+        best, data = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = serialize()
+            spent = time.perf_counter() - start
+            best = spent if best is None else min(best, spent)
+        return best, data
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderer = JSONRenderer()
+        compiled = compile_serializer(MovieListSerializer)
+        with transaction.atomic():
+            self._create_movies(rows)
+            movies = Movie.objects.filter(url__startswith='benchmark-movie-')
+
+            serializer_time, serializer_data = self._measure(
+                lambda: MovieListSerializer(
+                    movies.prefetch_related('directors', 'actors', 'genres'),
+                    many=True).data, repeat)
+            compiled_time, compiled_data = self._measure(
+                lambda: compiled.serialize(compiled.values(movies)), repeat)
+            transaction.set_rollback(True)
+
+        if renderer.render(serializer_data) != renderer.render(compiled_data):
+            raise CommandError('Output of the compiled serializer differs')
+        self.stdout.write(f'Serializer: {serializer_time * 1000:.1f} ms')
+        self.stdout.write(f'Compiled serializer: {compiled_time * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Compiled serializer is {serializer_time / compiled_time:.1f} '
+            f'times faster on {rows} rows'))
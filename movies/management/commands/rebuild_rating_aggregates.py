@@ -0,0 +1,58 @@
+"""
+    Command for rebuilding stored rating aggregates of movies
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from movies.models import Movie, Rating
+
+
+class Command(BaseCommand):
+    help = 'Rebuild rating count, sum and histogram of movies from ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Amount of movies locked and updated at once')
+
+    def _rebuild_batch(self, movie_ids: list) -> int:
+        """
+        Recalculate aggregates for the batch of movies while their rows are
+        locked, so votes arriving meanwhile are applied on top of the result
+        :param movie_ids: ids of movies
+        :return: amount of changed movies
+        """
+        with transaction.atomic():
+            movies = list(Movie.objects.select_for_update()
+                          .only('rating_count', 'rating_sum',
+                                'rating_histogram')
+                          .filter(pk__in=movie_ids))
+            histograms = {movie_id: {} for movie_id in movie_ids}
+            rows = (Rating.objects.filter(movie_id__in=movie_ids)
+                    .values_list('movie_id', 'star__value')
+                    .annotate(total=Count('id')).order_by())
+            for movie_id, value, total in rows:
+                histograms[movie_id][str(value)] = total
+
+            changed = []
+            for movie in movies:
+                state = (movie.rating_count, movie.rating_sum,
+                         movie.rating_histogram)
+                movie.set_rating_histogram(histograms[movie.pk])
+                if state != (movie.rating_count, movie.rating_sum,
+                             movie.rating_histogram):
+                    changed.append(movie)
+            Movie.objects.bulk_update(changed, ['rating_count', 'rating_sum',
+                                                'rating_histogram'])
+        return len(changed)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        movie_ids = list(Movie.objects.order_by('pk')
+                         .values_list('pk', flat=True))
+        changed = 0
+        for start in range(0, len(movie_ids), batch_size):
+            changed += self._rebuild_batch(movie_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rating aggregates rebuilt, {changed} movies were corrected'))
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.6 on 2026-10-18 07:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Rating = apps.get_model('movies', 'Rating')
+    histograms = {}
+    rows = (Rating.objects.values_list('movie_id', 'star__value')
+            .annotate(total=Count('id')).order_by())
+    for movie_id, value, total in rows:
+        histograms.setdefault(movie_id, {})[str(value)] = total
+    movies = list(Movie.objects.filter(pk__in=histograms))
+    for movie in movies:
+        movie.rating_histogram = histograms[movie.pk]
+        movie.rating_count = sum(movie.rating_histogram.values())
+        movie.rating_sum = sum(int(value) * total for value, total
+                               in movie.rating_histogram.items())
+    Movie.objects.bulk_update(movies, ['rating_count', 'rating_sum',
+                                       'rating_histogram'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_auto_20220528_1408'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Rating count'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_histogram',
+            field=models.JSONField(default=dict, editable=False, help_text='Amount of votes per star', verbose_name='Rating histogram'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Rating sum'),
+        ),
+        migrations.RunPython(fill_rating_aggregates,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_movie_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['ip', 'movie'], name='movies_rati_ip_5a1d76_idx'),
+        ),
+    ]
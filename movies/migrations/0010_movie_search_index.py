@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from movies.search import create_search_index, drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_rating_ip_movie_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.6 on 2026-10-18 12:10
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_ratings(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Rating = apps.get_model('movies', 'Rating')
+    duplicates = (Rating.objects.values('ip', 'movie_id')
+                  .annotate(total=Count('id'), last_id=Max('id'))
+                  .filter(total__gt=1).order_by())
+    movie_ids = set()
+    for duplicate in duplicates:
+        Rating.objects.filter(ip=duplicate['ip'],
+                              movie_id=duplicate['movie_id'])\
+            .exclude(pk=duplicate['last_id']).delete()
+        movie_ids.add(duplicate['movie_id'])
+    if not movie_ids:
+        return
+
+    histograms = {movie_id: {} for movie_id in movie_ids}
+    rows = (Rating.objects.filter(movie_id__in=movie_ids)
+            .values_list('movie_id', 'star__value')
+            .annotate(total=Count('id')).order_by())
+    for movie_id, value, total in rows:
+        histograms[movie_id][str(value)] = total
+    movies = list(Movie.objects.filter(pk__in=movie_ids))
+    for movie in movies:
+        movie.rating_histogram = histograms[movie.pk]
+        movie.rating_count = sum(movie.rating_histogram.values())
+        movie.rating_sum = sum(int(value) * total for value, total
+                               in movie.rating_histogram.items())
+    Movie.objects.bulk_update(movies, ['rating_count', 'rating_sum',
+                                       'rating_histogram'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_movie_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_ratings,
+                             migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='rating',
+            name='movies_rati_ip_5a1d76_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('ip', 'movie'), name='unique_rating_ip_movie'),
+        ),
+    ]
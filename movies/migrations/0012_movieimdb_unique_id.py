@@ -0,0 +1,31 @@
+# Generated by Django 3.2.6 on 2026-10-18 08:06
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_movies(apps, schema_editor):
+    MovieImdb = apps.get_model('movies', 'MovieImdb')
+    duplicates = (MovieImdb.objects.values('unique_id')
+                  .annotate(total=Count('id'), last_id=Max('id'))
+                  .filter(total__gt=1).order_by())
+    for duplicate in duplicates:
+        MovieImdb.objects.filter(unique_id=duplicate['unique_id'])\
+            .exclude(pk=duplicate['last_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_rating_unique_ip_movie'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_movies,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='movieimdb',
+            name='unique_id',
+            field=models.PositiveIntegerField(unique=True, verbose_name='Unique ID'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.6 on 2026-10-18 08:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_movieimdb_unique_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=200, verbose_name='Task')),
+                ('args', models.JSONField(default=list, verbose_name='Arguments')),
+                ('dedup_key', models.CharField(blank=True, help_text='Only one message with the key waits to be published', max_length=200, null=True, unique=True, verbose_name='Deduplication key')),
+                ('available_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Available at')),
+            ],
+            options={
+                'verbose_name': 'Outbox message',
+                'verbose_name_plural': 'Outbox messages',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0014_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movieimdb',
+            name='release_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Release date'),
+        ),
+    ]
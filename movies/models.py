@@ -2,12 +2,59 @@
     Collect all models for movie
 """
 
+from collections import Counter, defaultdict
 from datetime import date
-from django.db import models
+from typing import Dict, Tuple
+
+from django.db import connection, models, transaction, NotSupportedError
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
+from django.utils import timezone
 
 from django.contrib.auth.models import User
 
 
+# Sent with movie_id when rating aggregates of the movie are changed by the
+# update query, so caches of the movie are outdated as after its save
+rating_aggregates_changed = Signal()
+
+
+class HistogramChange(models.Func):
+    """
+    Change amounts of votes per star value in the histogram of votes by the
+    database. Values without votes are removed from the histogram
+    """
+
+    def __init__(self, expression, changes: Dict[int, int]):
+        super().__init__(expression, output_field=models.JSONField())
+        self.changes = {str(value): delta for value, delta
+                        in sorted(changes.items()) if delta}
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            f'Histogram is not changed by {connection.vendor}')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        items, item_params = [], []
+        for value, delta in self.changes.items():
+            items.append(f'%s, NULLIF(MAX(COALESCE(JSON_EXTRACT({column}, %s), '
+                         f'0) + %s, 0), 0)')
+            item_params.extend([value, *params, f'$."{value}"', delta])
+        return f'JSON_PATCH({column}, JSON_OBJECT({", ".join(items)}))', \
+            [*params, *item_params]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        items, item_params = [], []
+        for value, delta in self.changes.items():
+            items.append(f'%s::text, NULLIF(GREATEST(COALESCE(({column} ->> %s)'
+                         f'::integer, 0) + %s, 0), 0)')
+            item_params.extend([value, *params, value, delta])
+        return f'JSONB_STRIP_NULLS({column} || JSONB_BUILD_OBJECT(' \
+               f'{", ".join(items)}))', [*params, *item_params]
+
+
 class Category(models.Model):
     """
     Model for film category
@@ -16,6 +63,7 @@ class Category(models.Model):
     name = models.CharField('Category', max_length=150)
     description = models.TextField('Description')
     url = models.SlugField(max_length=160, unique=True)
+    updated_at = models.DateTimeField('Updated', auto_now=True)
 
     def __str__(self):
         return self.name
@@ -32,6 +80,7 @@ class Actor(models.Model):
     name = models.CharField('Name', max_length=100)
     age = models.PositiveSmallIntegerField('Age', default=0)
     description = models.TextField('Description')
+    updated_at = models.DateTimeField('Updated', auto_now=True)
 
     def __str__(self):
         return self.name
@@ -47,6 +96,7 @@ class Director(models.Model):
     """
     name = models.CharField('Name', max_length=100)
     age = models.PositiveSmallIntegerField('Age', default=0)
+    updated_at = models.DateTimeField('Updated', auto_now=True)
 
     def __str__(self):
         return self.name
@@ -63,6 +113,7 @@ class Genre(models.Model):
     name = models.CharField('Genre', max_length=100)
     description = models.TextField('Description')
     url = models.SlugField(max_length=160, unique=True)
+    updated_at = models.DateTimeField('Updated', auto_now=True)
 
     def __str__(self):
         return self.name
@@ -95,10 +146,71 @@ class Movie(models.Model):
     category = models.ForeignKey(Category, verbose_name='Category',
                                  on_delete=models.SET_NULL, null=True)
     url = models.SlugField(max_length=130, unique=True)
+    rating_count = models.PositiveIntegerField('Rating count', default=0,
+                                               editable=False)
+    rating_sum = models.PositiveIntegerField('Rating sum', default=0,
+                                             editable=False)
+    rating_histogram = models.JSONField('Rating histogram', default=dict,
+                                        editable=False,
+                                        help_text='Amount of votes per star')
+    updated_at = models.DateTimeField('Updated', auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def set_rating_histogram(self, histogram: dict) -> None:
+        """
+        Set histogram of votes and recalculate count and sum from it
+        :param histogram: star value -> amount of votes
+        :return: None
+        """
+        self.rating_histogram = {str(value): total
+                                 for value, total in histogram.items() if total}
+        self.rating_count = sum(self.rating_histogram.values())
+        self.rating_sum = sum(int(value) * total for value, total
+                              in self.rating_histogram.items())
+
+    @classmethod
+    def apply_rating_changes(cls, movie_id: int, added=(), removed=()) -> bool:
+        """
+        Add and remove votes in the stored rating aggregates of the movie by
+        one update query. The row is not locked before, new aggregates are
+        computed by the database from the current ones, so concurrent votes
+        are not lost
+        :param movie_id: id of the movie
+        :param added: star values of new votes
+        :param removed: star values of withdrawn votes
+        :return: False when the movie does not exist
+        """
+        changes = Counter(added)
+        changes.subtract(removed)
+        count, total = len(added) - len(removed), sum(added) - sum(removed)
+        updated = cls.objects.filter(pk=movie_id).update(
+            rating_count=Greatest(models.F('rating_count') + count, 0),
+            rating_sum=Greatest(models.F('rating_sum') + total, 0),
+            rating_histogram=HistogramChange('rating_histogram', changes),
+            updated_at=timezone.now())
+        if updated:
+            rating_aggregates_changed.send(sender=cls, movie_id=movie_id)
+        return bool(updated)
+
+    def change_rating_histogram(self, added=(), removed=()) -> None:
+        """
+        Add and remove votes in the histogram of the locked movie and save
+        the rating aggregates
+        :param added: star values of new votes
+        :param removed: star values of withdrawn votes
+        :return: None
+        """
+        histogram = dict(self.rating_histogram)
+        for value in added:
+            histogram[str(value)] = histogram.get(str(value), 0) + 1
+        for value in removed:
+            histogram[str(value)] = max(histogram.get(str(value), 0) - 1, 0)
+        self.set_rating_histogram(histogram)
+        self.save(update_fields=['rating_count', 'rating_sum',
+                                 'rating_histogram', 'updated_at'])
+
     def get_review(self):
         return self.reviews_set.filter(parent__isnull=True)
 
@@ -137,9 +249,142 @@ class Rating(models.Model):
     def __str__(self):
         return f'{self.star} - {self.movie}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember movie and star the rating was loaded with, so the rating
+        aggregates of the movie can be corrected when the rating is changed
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.aggregated_as = (instance.__dict__.get('movie_id'),
+                                  instance.__dict__.get('star_id'))
+        return instance
+
+    @classmethod
+    def vote(cls, ip: str, movie_id: int, star_id: int,
+             star_values: dict) -> 'Rating':
+        """
+        Create or change the vote from the ip with one upsert of the row,
+        then change rating aggregates of the movie by one update query in
+        the same transaction. The row of the movie is locked only by the
+        update. Signals of the rating are not sent
+        :param ip: ip of the client
+        :param movie_id: id of the movie
+        :param star_id: id of the star
+        :param star_values: id of the star -> value of the star
+        :return: Rating
+        :raises Movie.DoesNotExist: when the movie does not exist
+        """
+        with transaction.atomic():
+            rating_id, old_star_id = cls._upsert(ip, movie_id, star_id)
+            if old_star_id != star_id:
+                removed = [] if old_star_id is None \
+                    else [star_values[old_star_id]]
+                # Foreign keys are checked on commit, so the missing movie is
+                # found by the update and the vote is rolled back
+                if not Movie.apply_rating_changes(
+                        movie_id, added=[star_values[star_id]],
+                        removed=removed):
+                    raise Movie.DoesNotExist(
+                        f'Movie {movie_id} does not exist')
+        rating = cls(id=rating_id, ip=ip, movie_id=movie_id, star_id=star_id)
+        rating.aggregated_as = (movie_id, star_id)
+        return rating
+
+    @classmethod
+    def vote_many(cls, votes: Dict[Tuple[str, int], int],
+                  star_values: dict, batch_size: int = 300) -> int:
+        """
+        Create or change many votes at once. Rows of their movies are locked
+        in the order of ids, votes are upserted in batches and aggregates of
+        every movie are changed once. Votes for missing movies and stars are
+        skipped. Signals of the rating are not sent
+        :param votes: (ip, id of the movie) -> id of the star
+        :param star_values: id of the star -> value of the star
+        :param batch_size: amount of votes in one query
+        :return: amount of changed votes
+        """
+        votes = {key: star_id for key, star_id in votes.items()
+                 if star_id in star_values}
+        with transaction.atomic():
+            movies = {movie.pk: movie for movie in Movie.objects
+                      .select_for_update().only('rating_histogram')
+                      .filter(pk__in={movie_id for _, movie_id in votes})
+                      .order_by('pk')}
+            votes = [(ip, movie_id, star_id) for (ip, movie_id), star_id
+                     in votes.items() if movie_id in movies]
+            changed = []
+            histograms = defaultdict(lambda: ([], []))
+            for start in range(0, len(votes), batch_size):
+                batch = votes[start:start + batch_size]
+                old_stars = {(ip, movie_id): star_id for ip, movie_id, star_id
+                             in cls.objects.filter(
+                                 ip__in={vote[0] for vote in batch},
+                                 movie_id__in={vote[1] for vote in batch})
+                             .values_list('ip', 'movie_id', 'star_id')}
+                for ip, movie_id, star_id in batch:
+                    old_star_id = old_stars.get((ip, movie_id))
+                    if old_star_id == star_id:
+                        continue
+                    added, removed = histograms[movie_id]
+                    added.append(star_values[star_id])
+                    if old_star_id is not None:
+                        removed.append(star_values[old_star_id])
+                    changed.append((ip, movie_id, star_id))
+
+            with connection.cursor() as cursor:
+                for start in range(0, len(changed), batch_size):
+                    batch = changed[start:start + batch_size]
+                    cursor.execute(cls._get_upsert_sql(len(batch)),
+                                   [value for vote in batch for value in vote])
+            for movie_id, (added, removed) in histograms.items():
+                movies[movie_id].change_rating_histogram(added, removed)
+        return len(changed)
+
+    @classmethod
+    def _get_upsert_sql(cls, rows: int) -> str:
+        """
+        Get the query inserting votes or changing stars of existing ones
+        :param rows: amount of votes
+        :return: sql with ip, id of the movie and id of the star for every
+            vote as params
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        values = ', '.join(['(%s, %s, %s)'] * rows)
+        return f'INSERT INTO {table} (ip, movie_id, star_id) ' \
+               f'VALUES {values} ON CONFLICT (ip, movie_id) ' \
+               f'DO UPDATE SET star_id = excluded.star_id'
+
+    @classmethod
+    def _upsert(cls, ip: str, movie_id: int, star_id: int) -> tuple:
+        """
+        Insert the vote or change the star of the existing one
+        :return: id of the rating and id of the previous star or None
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        upsert = cls._get_upsert_sql(1)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'WITH old AS (SELECT star_id FROM {table} '
+                    f'WHERE ip = %s AND movie_id = %s) {upsert} '
+                    f'RETURNING id, (SELECT star_id FROM old)',
+                    [ip, movie_id, ip, movie_id, star_id])
+                return cursor.fetchone()
+
+            cursor.execute(f'SELECT id, star_id FROM {table} '
+                           f'WHERE ip = %s AND movie_id = %s', [ip, movie_id])
+            old = cursor.fetchone()
+            cursor.execute(upsert, [ip, movie_id, star_id])
+            return tuple(old) if old else (cursor.lastrowid, None)
+
     class Meta:
         verbose_name = 'Rating'
         verbose_name_plural = 'Ratings'
+        constraints = [
+            models.UniqueConstraint(fields=['ip', 'movie'],
+                                    name='unique_rating_ip_movie'),
+        ]
 
 
 class Review(models.Model):
@@ -160,6 +405,16 @@ class Review(models.Model):
     def __str__(self):
         return f'{self.name} - {self.movie}'
 
+    @property
+    def replies(self):
+        """
+        Children of the review. They are taken from memory when the whole
+        thread was linked at once, otherwise they are fetched from db
+        """
+        if hasattr(self, 'linked_replies'):
+            return self.linked_replies
+        return self.children.all()
+
     class Meta:
         verbose_name = 'Review'
         verbose_name_plural = 'Reviews'
@@ -182,10 +437,10 @@ class MovieImdb(models.Model):
     """
     Model for saving films from imdb ip
     """
-    unique_id = models.PositiveIntegerField('Unique ID')
+    unique_id = models.PositiveIntegerField('Unique ID', unique=True)
     title = models.CharField('Title', max_length=100)
     overview = models.TextField('Overview', default='')
-    release_date = models.DateField('Release date', default=date.today)
+    release_date = models.DateField('Release date', null=True, blank=True)
     vote_count = models.PositiveIntegerField('Vote count', default=0)
     vote_average = models.DecimalField('Vote Average', max_digits=4,
                                        decimal_places=2, default=0)
@@ -193,3 +448,26 @@ class MovieImdb(models.Model):
 
     def __str__(self):
         return f'{self.title}: {self.vote_average}: {self.media_type}'
+
+
+class OutboxMessage(models.Model):
+    """
+    Model for celery tasks waiting to be published. Messages are written in
+    the transaction of the change, so tasks of rolled back changes are not
+    published
+    """
+    task = models.CharField('Task', max_length=200)
+    args = models.JSONField('Arguments', default=list)
+    dedup_key = models.CharField('Deduplication key', max_length=200,
+                                 null=True, blank=True, unique=True,
+                                 help_text='Only one message with the key '
+                                           'waits to be published')
+    available_at = models.DateTimeField('Available at', default=timezone.now,
+                                        db_index=True)
+
+    def __str__(self):
+        return f'{self.task}{tuple(self.args)}'
+
+    class Meta:
+        verbose_name = 'Outbox message'
+        verbose_name_plural = 'Outbox messages'
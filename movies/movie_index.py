@@ -0,0 +1,374 @@
+"""
+    Collect inverted index of movies for filters of the catalog
+"""
+
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from collections.abc import Sequence
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .filters import MovieFilter, MATCH_CHOICES
+from .models import Movie, Actor, Director, Genre, Category
+
+
+logger = logging.getLogger(__name__)
+
+MOVIE_INDEX_VERSION_KEY = 'movie_index_version'
+
+# Filters of MovieFilter answered by the index, the rest go to the database
+INDEXED_NAME_FILTERS = {'genres': Genre, 'actors': Actor,
+                        'directors': Director}
+INDEXED_RANGE_FILTERS = ('year',)
+MATCH_FILTER = 'match'
+# Fields kept in the index, saves of other fields do not outdate it
+INDEXED_FIELDS = {Movie: ('year', 'category_id', 'country'),
+                  Actor: ('name', ), Director: ('name', ), Genre: ('name', ),
+                  Category: ('name', )}
+
+
+def intersect(first: array, second: array) -> array:
+    """
+    Intersect sorted arrays of ids. Ids of much smaller array are found in
+    the bigger one by binary search
+    """
+    if len(first) > len(second):
+        first, second = second, first
+    if len(first) * 16 >= len(second):
+        return array('q', sorted(set(first).intersection(second)))
+    result = array('q')
+    position = 0
+    for value in first:
+        position = bisect_left(second, value, position)
+        if position == len(second):
+            break
+        if second[position] == value:
+            result.append(value)
+    return result
+
+
+def unite(arrays: List[array]) -> array:
+    """
+    Unite sorted arrays of ids
+    """
+    if not arrays:
+        return array('q')
+    if len(arrays) == 1:
+        return arrays[0]
+    return array('q', sorted(set().union(*arrays)))
+
+
+class MovieIndex:
+    """
+    Sorted arrays of ids of movies for every genre, actor, director,
+    category, year and country. Movies matching filters are found by union
+    and intersection of arrays
+    """
+
+    def __init__(self, movie_ids: array, postings: Dict[str, dict],
+                 names: Dict[str, dict], labels: Dict[str, dict] = None):
+        self.movie_ids = movie_ids
+        self.postings = postings
+        self.names = names
+        self.labels = labels or {}
+        self.range_keys = {facet: sorted(postings[facet])
+                           for facet in INDEXED_RANGE_FILTERS}
+
+    @classmethod
+    def build(cls) -> 'MovieIndex':
+        """
+        Build the index from movies and tables of their relations
+        """
+        postings = {facet: defaultdict(lambda: array('q')) for facet in
+                    ('genres', 'actors', 'directors', 'category', 'year',
+                     'country')}
+        movie_ids = array('q')
+        rows = (Movie.objects.order_by('pk')
+                .values_list('pk', 'year', 'category_id', 'country'))
+        for movie_id, year, category_id, country in rows:
+            movie_ids.append(movie_id)
+            postings['year'][year].append(movie_id)
+            postings['country'][country].append(movie_id)
+            if category_id is not None:
+                postings['category'][category_id].append(movie_id)
+
+        names, labels = {}, {}
+        for facet, model in INDEXED_NAME_FILTERS.items():
+            through = getattr(Movie, facet).through
+            column = f'{model._meta.model_name}_id'
+            rows = (through.objects.order_by(column, 'movie_id')
+                    .values_list(column, 'movie_id'))
+            for related_id, movie_id in rows:
+                postings[facet][related_id].append(movie_id)
+            labels[facet] = dict(model.objects.values_list('pk', 'name'))
+            names[facet] = defaultdict(list)
+            for related_id, name in labels[facet].items():
+                names[facet][name].append(related_id)
+        labels['category'] = dict(Category.objects.values_list('pk', 'name'))
+        return cls(movie_ids, {facet: dict(values) for facet, values
+                               in postings.items()}, names, labels)
+
+    def get_postings(self, facet: str, keys: Iterable) -> List[array]:
+        """
+        Get arrays of ids of movies for keys of the facet
+        """
+        postings = self.postings[facet]
+        return [postings[key] for key in keys if key in postings]
+
+    def get_postings_by_names(self, facet: str,
+                              names: Iterable[str]) -> List[array]:
+        """
+        Get arrays of ids of movies related to objects with the names
+        """
+        return self.get_postings(facet, [related_id for name in names
+                                         for related_id in
+                                         self.names[facet].get(name, ())])
+
+    def get_postings_by_range(self, facet: str, start=None,
+                              stop=None) -> List[array]:
+        """
+        Get arrays of ids of movies with the value of the facet between
+        start and stop
+        """
+        keys = self.range_keys[facet]
+        low = 0 if start is None else bisect_left(keys, start)
+        high = len(keys) if stop is None else bisect_right(keys, stop)
+        return self.get_postings(facet, keys[low:high])
+
+    def get_selected_postings(self, params) -> Optional[List[List[array]]]:
+        """
+        Get arrays of ids of movies for every filter in query params of
+        MovieFilter. Movies match the filter when they are in any of arrays
+        :param params: query params of the request
+        :return: arrays for every used filter or None when params contain
+            filters which are not indexed
+        """
+        match = params.get(MATCH_FILTER) or 'any'
+        if match not in dict(MATCH_CHOICES):
+            return None
+        selected = []
+        for name in MovieFilter.base_filters:
+            if name == MATCH_FILTER:
+                continue
+            if name in INDEXED_NAME_FILTERS:
+                value = params.get(name)
+                if not value:
+                    continue
+                names = value.split(',')
+                if match == 'all':
+                    selected.extend(self.get_postings_by_names(name, [item])
+                                    for item in dict.fromkeys(names))
+                else:
+                    selected.append(self.get_postings_by_names(name, names))
+            elif name in INDEXED_RANGE_FILTERS:
+                bounds = [params.get(f'{name}_{suffix}') or None
+                          for suffix in ('min', 'max')]
+                if not any(bounds):
+                    continue
+                try:
+                    start, stop = [None if bound is None else Decimal(bound)
+                                   for bound in bounds]
+                except InvalidOperation:
+                    return None
+                if not all(bound.is_finite() for bound in (start, stop)
+                           if bound is not None):
+                    return None
+                selected.append(self.get_postings_by_range(name, start, stop))
+            elif params.get(name) or params.get(f'{name}_min') or \
+                    params.get(f'{name}_max'):
+                return None
+        return selected
+
+    def select(self, params) -> Optional[array]:
+        """
+        Find movies by query params of MovieFilter. The filter with the
+        fewest movies is united first, then the result is intersected with
+        every array of other filters, so big unions are not built
+        :param params: query params of the request
+        :return: sorted ids of movies or None when params contain filters
+            which are not indexed
+        """
+        selected = self.get_selected_postings(params)
+        if selected is None:
+            return None
+        if not selected:
+            return self.movie_ids
+        selected.sort(key=lambda postings: sum(map(len, postings)))
+        result = unite(selected[0])
+        for postings in selected[1:]:
+            if not result:
+                break
+            result = unite([intersect(result, ids) for ids in postings])
+        return result
+
+    def count(self, facet: str, movie_ids: array) -> Dict[object, int]:
+        """
+        Count movies of every key of the facet among the movies
+        :param facet: name of the facet
+        :param movie_ids: sorted ids of selected movies
+        :return: key -> amount of selected movies, zero counts are skipped
+        """
+        postings = self.postings[facet]
+        if len(movie_ids) == len(self.movie_ids):
+            return {key: len(ids) for key, ids in postings.items()}
+        selected = set(movie_ids)
+        counts = {}
+        for key, ids in postings.items():
+            if len(ids) > len(movie_ids) * 16:
+                total = len(intersect(movie_ids, ids))
+            else:
+                total = sum(map(selected.__contains__, ids))
+            if total:
+                counts[key] = total
+        return counts
+
+    def count_facets(self, movie_ids: array, size: int,
+                     year_bucket: int) -> dict:
+        """
+        Count selected movies per genre, category, director, country and
+        range of years
+        :param movie_ids: sorted ids of selected movies
+        :param size: amount of directors with the most movies in the result
+        :param year_bucket: amount of years in the range
+        :return: counts of facets
+        """
+        def labelled(facet, counts):
+            return [{'id': key, 'name': self.labels[facet].get(key),
+                     'count': total} for key, total in counts]
+
+        def by_count(counts):
+            return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+        years = defaultdict(int)
+        for year, total in self.count('year', movie_ids).items():
+            years[year // year_bucket * year_bucket] += total
+        directors = heapq.nsmallest(
+            size, self.count('directors', movie_ids).items(),
+            key=lambda item: (-item[1], item[0]))
+        return {
+            'count': len(movie_ids),
+            'genres': labelled('genres',
+                               by_count(self.count('genres', movie_ids))),
+            'categories': labelled('category',
+                                   by_count(self.count('category', movie_ids))),
+            'directors': labelled('directors', directors),
+            'countries': [{'name': country, 'count': total} for country, total
+                          in by_count(self.count('country', movie_ids))],
+            'years': [{'from': start, 'to': start + year_bucket - 1,
+                       'count': years[start]} for start in sorted(years)],
+        }
+
+
+class SharedMovieIndex:
+    """
+    Index of movies kept in memory of the process. It is built again when
+    the version in the cache is changed by signals of any process. The new
+    index is built by the thread in the background, requests are answered
+    by the previous index until it is ready
+    """
+
+    def __init__(self):
+        self.index: Optional[MovieIndex] = None
+        self.version = None
+        self.building = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_version():
+        """
+        Get the shared version of the index
+        """
+        version = cache.get(MOVIE_INDEX_VERSION_KEY)
+        if version is None:
+            cache.add(MOVIE_INDEX_VERSION_KEY, int(time.time() * 1000), None)
+            version = cache.get(MOVIE_INDEX_VERSION_KEY)
+        return version
+
+    def get(self) -> MovieIndex:
+        """
+        Get the index. The first index is built at once, outdated one is
+        served while the new one is built in the background. Inside the
+        transaction the index is built at once, because other connections
+        do not see changes of the transaction
+        """
+        version = self.get_version()
+        index = self.index
+        if index is not None and self.version == version:
+            return index
+        if index is not None and \
+                not transaction.get_connection().in_atomic_block:
+            self.start_build(version)
+            return index
+        with self._lock:
+            if self.index is None or self.version != version:
+                self.index, self.version = MovieIndex.build(), version
+            return self.index
+
+    def start_build(self, version) -> None:
+        """
+        Build the index of the version by the thread, unless it is built
+        already
+        """
+        with self._lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self.build, args=(version, ),
+                         daemon=True).start()
+
+    def build(self, version) -> None:
+        """
+        Build the index of the version and replace the current one
+        """
+        try:
+            index = MovieIndex.build()
+            with self._lock:
+                self.index, self.version = index, version
+        except Exception:
+            logger.exception('Index of movies is not built')
+        finally:
+            with self._lock:
+                self.building = False
+            connection.close()
+
+
+def bump_movie_index_version() -> None:
+    """
+    Change the version of the index, so processes build it again
+    """
+    try:
+        cache.incr(MOVIE_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.add(MOVIE_INDEX_VERSION_KEY, int(time.time() * 1000), None)
+
+
+class IndexedMovies(Sequence):
+    """
+    Movies selected by the index. Paginators count and slice it like the
+    queryset, movies of the page have only ids
+    """
+
+    def __init__(self, movie_ids: array):
+        self.movie_ids = movie_ids
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [Movie(pk=movie_id) for movie_id in self.movie_ids[item]]
+        return Movie(pk=self.movie_ids[item])
+
+    def count(self, *args) -> int:
+        return len(self.movie_ids)
+
+
+movie_index = SharedMovieIndex()
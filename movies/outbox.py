@@ -0,0 +1,67 @@
+"""
+    Collect transactional outbox of celery tasks
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from django_movie.celery import app
+
+from .models import OutboxMessage
+
+
+def enqueue_task(task: str, args: list = (), dedup_key: str = None,
+                 delay: int = 0) -> None:
+    """
+    Put the task to the outbox in the current transaction. The message is
+    skipped when the message with the same key waits to be published
+    :param task: name of the celery task
+    :param args: arguments of the task
+    :param dedup_key: key of deduplication
+    :param delay: amount of seconds before the task is published
+    :return: None
+    """
+    message = OutboxMessage(
+        task=task, args=list(args), dedup_key=dedup_key,
+        available_at=timezone.now() + timedelta(seconds=delay))
+    OutboxMessage.objects.bulk_create([message], ignore_conflicts=True)
+
+
+def publish_outbox_batch(batch_size: int) -> int:
+    """
+    Publish available messages over one connection to the broker and
+    remove them from the outbox. Rows are locked, so concurrent relays take
+    different messages. Messages are published at least once: when the
+    broker fails, the whole batch is published again
+    :param batch_size: amount of messages
+    :return: amount of published messages
+    """
+    with transaction.atomic():
+        messages = list(OutboxMessage.objects.select_for_update(skip_locked=True)
+                        .filter(available_at__lte=timezone.now())
+                        .order_by('available_at', 'id')[:batch_size])
+        if not messages:
+            return 0
+        with app.producer_or_acquire() as producer:
+            for message in messages:
+                app.send_task(message.task, args=message.args,
+                              producer=producer)
+        OutboxMessage.objects.filter(
+            pk__in=[message.pk for message in messages]).delete()
+    return len(messages)
+
+
+def relay_outbox(batch_size: int) -> int:
+    """
+    Publish all available messages batch by batch
+    :param batch_size: amount of messages in one batch
+    :return: amount of published messages
+    """
+    total = 0
+    while True:
+        published = publish_outbox_batch(batch_size)
+        total += published
+        if published < batch_size:
+            return total
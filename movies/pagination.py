@@ -0,0 +1,114 @@
+"""
+    Collect pagination classes for movie api
+"""
+
+from django.utils.encoding import force_str
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CountableLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit offset pagination where client can turn off the total count with
+    ?count=false. Without the count one more row is fetched to find out
+    whether the next page exists
+    """
+    count_query_param = 'count'
+    count_query_description = 'Set false to skip calculation of the total ' \
+                              'count.'
+
+    def is_count_requested(self, request) -> bool:
+        """
+        Check whether client wants to get the total count
+        """
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in ('false', '0', 'no')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_count_requested(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = None
+        self.display_page_controls = False
+        page = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+        return page[:self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param,
+                                   self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        if self.count is not None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': force_str(self.count_query_description),
+            'schema': {
+                'type': 'boolean',
+            },
+        })
+        return parameters
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination by primary key. Every page is fetched by the index
+    of primary key, so the deep pages cost the same as the first one
+    """
+    ordering = 'id'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class KeysetPaginationMixin:
+    """
+    Switch list of the view to keyset pagination when client asks for it
+    with ?pagination=cursor or passes the cursor of the page
+    """
+    cursor_pagination_class = IdCursorPagination
+    pagination_mode_query_param = 'pagination'
+
+    def is_cursor_pagination_requested(self) -> bool:
+        """
+        Check whether client asks for keyset pagination
+        """
+        params = self.request.query_params
+        mode = params.get(self.pagination_mode_query_param)
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        return mode == 'cursor' or cursor_param in params
+
+    @property
+    def paginator(self):
+        """
+        The paginator instance associated with the view, or `None`.
+        """
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            if request is not None and self.is_cursor_pagination_requested():
+                self._paginator = self.cursor_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
@@ -0,0 +1,245 @@
+"""
+    Collect write-behind buffer of rating votes
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+import redis
+
+from django.conf import settings
+from django.db import connection
+
+from django_movie.celery import app
+
+from .models import Rating
+from .utils import get_star_values
+
+
+FLUSH_TASK = 'movies.tasks.flush_rating_votes'
+
+logger = logging.getLogger(__name__)
+
+# Lua script sets the vote unless the buffer is full, so the check and
+# the write are atomic for all processes
+REDIS_ADD_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0
+        and redis.call('HLEN', KEYS[1]) >= tonumber(ARGV[3]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return redis.call('HLEN', KEYS[1])
+"""
+
+
+class RatingBuffer(ABC):
+    """
+    Buffer of votes waiting to be written. Only the last vote from the ip
+    for the movie is kept, so repeated votes are coalesced
+    """
+
+    def __init__(self, max_size: int, max_delay: float):
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+    @abstractmethod
+    def add(self, ip: str, movie_id: int, star_id: int) -> Optional[int]:
+        """
+        Put the vote to the buffer
+        :return: amount of buffered votes or None when the buffer is full
+        """
+
+    @abstractmethod
+    def drain(self) -> Dict[Tuple[str, int], int]:
+        """
+        Take all buffered votes out of the buffer
+        :return: (ip, id of the movie) -> id of the star
+        """
+
+    @abstractmethod
+    def claim_flush(self) -> bool:
+        """
+        Mark that the flush is scheduled
+        :return: False when the flush was already scheduled
+        """
+
+    @abstractmethod
+    def schedule_flush(self, countdown: float) -> None:
+        """
+        Flush the buffer after countdown seconds
+        """
+
+    @abstractmethod
+    def restore(self, votes: Dict[Tuple[str, int], int]) -> None:
+        """
+        Put drained votes back to the buffer. Votes buffered since the drain
+        are newer, so they are kept
+        :param votes: (ip, id of the movie) -> id of the star
+        """
+
+    def flush(self) -> int:
+        """
+        Write buffered votes to the database. When the write fails, votes
+        are put back, so they are written by the next flush
+        :return: amount of changed votes
+        """
+        votes = self.drain()
+        if not votes:
+            return 0
+        try:
+            return Rating.vote_many(votes, get_star_values())
+        except BaseException:
+            self.restore(votes)
+            raise
+
+    def vote(self, ip: str, movie_id: int, star_id: int) -> bool:
+        """
+        Buffer the vote. The first vote schedules the flush after max delay,
+        the vote which fills the buffer flushes it at once
+        :return: False when the buffer is full and the vote should be
+            written directly
+        """
+        size = self.add(ip, movie_id, star_id)
+        if size is None:
+            return False
+        if size >= self.max_size:
+            self.schedule_flush(0)
+        elif self.claim_flush():
+            self.schedule_flush(self.max_delay)
+        return True
+
+
+class LocalRatingBuffer(RatingBuffer):
+    """
+    Buffer in memory of the process. Votes are flushed by the timer thread
+    of the process, so it suits a single process or tests
+    """
+
+    def __init__(self, max_size: int, max_delay: float):
+        super().__init__(max_size, max_delay)
+        self.votes = {}
+        self.timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def add(self, ip: str, movie_id: int, star_id: int) -> Optional[int]:
+        with self._lock:
+            key = (ip, movie_id)
+            if key not in self.votes and len(self.votes) >= self.max_size:
+                return None
+            self.votes[key] = star_id
+            return len(self.votes)
+
+    def drain(self) -> Dict[Tuple[str, int], int]:
+        with self._lock:
+            votes, self.votes = self.votes, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            return votes
+
+    def restore(self, votes: Dict[Tuple[str, int], int]) -> None:
+        with self._lock:
+            for key, star_id in votes.items():
+                self.votes.setdefault(key, star_id)
+
+    def claim_flush(self) -> bool:
+        with self._lock:
+            if self.timer is not None:
+                return False
+            self.timer = threading.Timer(self.max_delay, self.flush_in_thread)
+            self.timer.daemon = True
+            return True
+
+    def schedule_flush(self, countdown: float) -> None:
+        if not countdown:
+            self.flush()
+            return
+        with self._lock:
+            if self.timer is not None and not self.timer.is_alive():
+                self.timer.start()
+
+    def flush_in_thread(self) -> None:
+        """
+        Flush the buffer from the timer thread and close its connection
+        """
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+class RedisRatingBuffer(RatingBuffer):
+    """
+    Buffer in the hash of Redis shared by all processes. Votes are flushed
+    by the celery task
+    """
+
+    def __init__(self, max_size: int, max_delay: float, url: str,
+                 key: str = 'rating_votes'):
+        super().__init__(max_size, max_delay)
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.flush_key = f'{key}:flush'
+        self._add = self.client.register_script(REDIS_ADD_SCRIPT)
+
+    def add(self, ip: str, movie_id: int, star_id: int) -> Optional[int]:
+        size = self._add(keys=[self.key], args=[f'{movie_id}:{ip}', star_id,
+                                                self.max_size])
+        return None if size < 0 else size
+
+    def drain(self) -> Dict[Tuple[str, int], int]:
+        pipe = self.client.pipeline()
+        pipe.hgetall(self.key)
+        pipe.delete(self.key, self.flush_key)
+        values, _ = pipe.execute()
+        votes = {}
+        for field, star_id in values.items():
+            movie_id, ip = field.decode().split(':', 1)
+            votes[(ip, int(movie_id))] = int(star_id)
+        return votes
+
+    def restore(self, votes: Dict[Tuple[str, int], int]) -> None:
+        pipe = self.client.pipeline()
+        for (ip, movie_id), star_id in votes.items():
+            pipe.hsetnx(self.key, f'{movie_id}:{ip}', star_id)
+        pipe.execute()
+
+    def claim_flush(self) -> bool:
+        # The mark expires, so the next vote schedules the flush again when
+        # the scheduled task was lost
+        return bool(self.client.set(self.flush_key, 1, nx=True,
+                                    ex=max(int(self.max_delay) * 2, 1)))
+
+    def schedule_flush(self, countdown: float) -> None:
+        try:
+            app.send_task(FLUSH_TASK, countdown=countdown, retry=False)
+        except Exception:
+            # The vote is not failed when the broker is unavailable, votes
+            # stay buffered until the periodic flush task
+            logger.warning('Flush of rating votes is not scheduled',
+                           exc_info=True)
+
+
+BUFFER_BACKENDS = {'local': LocalRatingBuffer, 'redis': RedisRatingBuffer}
+
+_buffers = {}
+
+
+def get_rating_buffer() -> Optional[RatingBuffer]:
+    """
+    Get the buffer of votes chosen in settings
+    :return: buffer or None when votes are written at once
+    """
+    backend = settings.RATING_BUFFER_BACKEND
+    if not backend:
+        return None
+    options = {'max_size': settings.RATING_BUFFER_MAX_SIZE,
+               'max_delay': settings.RATING_BUFFER_MAX_DELAY}
+    if backend == 'redis':
+        options['url'] = settings.RATING_BUFFER_REDIS_URL
+    key = (backend, *options.values())
+    if key not in _buffers:
+        _buffers[key] = BUFFER_BACKENDS[backend](**options)
+    return _buffers[key]
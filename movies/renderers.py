@@ -0,0 +1,161 @@
+"""
+    Collect renderers for movie api
+"""
+
+import json
+from collections.abc import Mapping
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONFragment(Mapping):
+    """
+    Object serialized to JSON in advance. Renderer writes its content as is,
+    reading of keys parses the content once
+    """
+    __slots__ = ('id', 'content', '_data')
+
+    def __init__(self, id, content: bytes):
+        self.id = id
+        self.content = content
+        self._data = None
+
+    def __reduce__(self):
+        return self.__class__, (self.id, self.content)
+
+    def __repr__(self):
+        return f'JSONFragment({self.id!r}, {self.content!r})'
+
+    def _parsed(self) -> dict:
+        if self._data is None:
+            self._data = json.loads(self.content)
+        return self._data
+
+    def __getitem__(self, key):
+        return self._parsed()[key]
+
+    def __iter__(self):
+        return iter(self._parsed())
+
+    def __len__(self):
+        return len(self._parsed())
+
+    def replace(self, old: bytes, new: bytes) -> 'JSONFragment':
+        """
+        Get the fragment with the first occurrence of old replaced by new
+        """
+        return self.__class__(self.id, self.content.replace(old, new, 1))
+
+
+class FragmentList(list):
+    """
+    List of fragments or of objects which contain fragments. Renderer
+    stitches it from the content of fragments
+    """
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    """
+    JSON renderer which writes JSON fragments without serializing them again
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not self.has_fragments(data):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return self.stitch(data)
+
+    @staticmethod
+    def has_fragments(data) -> bool:
+        """
+        Check whether data is the list of fragments or it is the page of it
+        """
+        if isinstance(data, FragmentList):
+            return True
+        return isinstance(data, dict) and any(
+            isinstance(value, FragmentList) for value in data.values())
+
+    def stitch(self, data) -> bytes:
+        """
+        Render data, taking content of fragments as is
+        """
+        if isinstance(data, JSONFragment):
+            return data.content
+        if isinstance(data, dict):
+            return b'{' + b','.join(
+                self.render_value(str(key)) + b':' + self.stitch(value)
+                for key, value in data.items()) + b'}'
+        if isinstance(data, (list, tuple)):
+            return b'[' + b','.join(self.stitch(item) for item in data) + b']'
+        return self.render_value(data)
+
+    def render_value(self, value) -> bytes:
+        """
+        Render the value which does not contain fragments
+        """
+        if value is None:
+            return b'null'
+        return super().render(value)
+
+
+class FastJSONRenderer(FragmentJSONRenderer):
+    """
+    Fragment renderer encoding data by orjson straight to bytes. Types
+    which orjson does not know, like decimals and lazy strings, and dates are
+    passed to the encoder of the standard renderer, so the output is the
+    same. The standard renderer is used when orjson is not installed or the
+    output is indented or escaped to ASCII
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME \
+        if orjson is not None else 0
+    line_separators = ('\u2028'.encode(), '\u2029'.encode())
+
+    def __init__(self):
+        super().__init__()
+        self.encoder = self.encoder_class()
+
+    def is_fast(self, accepted_media_type=None,
+                renderer_context=None) -> bool:
+        """
+        Check whether orjson renders the same output as the standard encoder
+        """
+        return orjson is not None and self.compact and not self.ensure_ascii \
+            and self.get_indent(accepted_media_type,
+                                renderer_context or {}) is None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is not None and not self.has_fragments(data) and \
+                self.is_fast(accepted_media_type, renderer_context):
+            try:
+                return self.dumps(data)
+            except orjson.JSONEncodeError:
+                # Values orjson does not support, like too big integers,
+                # are rendered or reported by the standard encoder
+                pass
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def render_value(self, value) -> bytes:
+        if self.is_fast():
+            try:
+                return self.dumps(value)
+            except orjson.JSONEncodeError:
+                pass
+        return super().render_value(value)
+
+    def dumps(self, data) -> bytes:
+        """
+        Encode data by orjson. Line separators are escaped like the standard
+        renderer does, so the output can be embedded in javascript
+        """
+        content = orjson.dumps(data, default=self.encoder.default,
+                               option=self.options)
+        for separator in self.line_separators:
+            if separator in content:
+                content = content.replace(
+                    separator, separator.decode().encode('unicode_escape'))
+        return content
@@ -0,0 +1,148 @@
+"""
+    Collect functions for full-text search of movies
+"""
+
+import re
+
+from django.db import models
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_TABLE = 'movies_movie_fts'
+
+SQLITE_SEARCH_INDEX = \
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(" \
+    f"title, description, content='movies_movie', content_rowid='id', " \
+    f"tokenize='unicode61 remove_diacritics 2')"
+SQLITE_SEARCH_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert "
+    f"AFTER INSERT ON movies_movie BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, description) "
+    f"VALUES (new.id, new.title, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete "
+    f"AFTER DELETE ON movies_movie BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, description) "
+    f"VALUES ('delete', old.id, old.title, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update "
+    f"AFTER UPDATE OF title, description ON movies_movie BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, description) "
+    f"VALUES ('delete', old.id, old.title, old.description); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, description) "
+    f"VALUES (new.id, new.title, new.description); END",
+)
+SQLITE_REBUILD_SEARCH_INDEX = \
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"
+
+POSTGRESQL_SEARCH_INDEX = (
+    "ALTER TABLE movies_movie ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX movies_movie_search_vector_idx ON movies_movie "
+    "USING GIN (search_vector)",
+)
+
+
+def create_search_index(connection) -> None:
+    """
+    Create the full-text index of titles and descriptions of movies. On
+    PostgreSQL it is the generated tsvector column with GIN index, on SQLite
+    it is FTS5 table filled by triggers. Other databases have no index
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_SEARCH_INDEX:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_SEARCH_INDEX)
+            for sql in SQLITE_SEARCH_TRIGGERS:
+                cursor.execute(sql)
+            cursor.execute(SQLITE_REBUILD_SEARCH_INDEX)
+
+
+def restore_search_triggers(connection) -> None:
+    """
+    Create triggers of the SQLite index again. SQLite drops triggers when
+    migrations rebuild the table of movies, then the index is rebuilt
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE %s", [f'{SEARCH_TABLE}_%'])
+        if cursor.fetchone()[0] == len(SQLITE_SEARCH_TRIGGERS):
+            return
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name = %s",
+            [SEARCH_TABLE])
+        if not cursor.fetchone()[0]:
+            return
+        for sql in SQLITE_SEARCH_TRIGGERS:
+            cursor.execute(sql)
+        cursor.execute(SQLITE_REBUILD_SEARCH_INDEX)
+
+
+def drop_search_index(connection) -> None:
+    """
+    Drop the full-text index of movies
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('ALTER TABLE movies_movie DROP COLUMN search_vector')
+        elif connection.vendor == 'sqlite':
+            for name in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def get_search_terms(text: str) -> list:
+    """
+    Split the search text to words, which are searched as prefixes
+    """
+    return re.findall(r'\w+', text.casefold())
+
+
+def search_movies(queryset, text: str, vendor: str):
+    """
+    Find movies by words of the title and description
+    :param queryset: queryset of movies
+    :param text: search text of the client
+    :param vendor: vendor of the database
+    :return: queryset ordered by rank, the best matches go first
+    """
+    terms = get_search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{term}:*' for term in terms)
+        matched = RawSQL(
+            "SELECT id FROM movies_movie "
+            "WHERE search_vector @@ to_tsquery('simple', %s)", [query])
+        rank = RawSQL(
+            "ts_rank(movies_movie.search_vector, to_tsquery('simple', %s))",
+            [query], output_field=models.FloatField())
+    elif vendor == 'sqlite':
+        query = ' '.join(f'"{term}"*' for term in terms)
+        matched = RawSQL(
+            f"SELECT rowid FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s", [query])
+        # bm25 is lower for better matches
+        rank = RawSQL(
+            f"SELECT -bm25({SEARCH_TABLE}, 10.0, 1.0) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s "
+            f"AND rowid = movies_movie.id", [query],
+            output_field=models.FloatField())
+    else:
+        condition = models.Q()
+        for term in terms:
+            in_title = models.Q(title__icontains=term)
+            condition &= in_title | models.Q(description__icontains=term)
+        matched = queryset.model.objects.filter(condition).values('id')
+        rank = models.Value(0.0, output_field=models.FloatField())
+
+    return (queryset.filter(pk__in=matched)
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', 'id'))
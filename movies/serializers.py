@@ -2,12 +2,18 @@
     Collect all serializers for movie api
 """
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import models, transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from .models import Movie, Category, Review, Rating, Actor, Genre, UserWishes, \
     RatingStar, Director
-from .tasks import send_notification_email
+from .rating_buffer import get_rating_buffer
+from .tasks import schedule_subscribers_notification
+from .utils import link_review_threads, load_review_threads, \
+    get_star_values
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -18,7 +24,7 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
 
         model = Category
-        fields = '__all__'
+        exclude = ('updated_at', )
 
 
 class ActorSerializer(serializers.ModelSerializer):
@@ -49,7 +55,7 @@ class GenreSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Genre
-        fields = '__all__'
+        exclude = ('updated_at', )
 
 
 class MovieListSerializer(serializers.ModelSerializer):
@@ -65,10 +71,12 @@ class MovieListSerializer(serializers.ModelSerializer):
                   'url')
 
     def update(self, instance, validated_data):
-        super().update(instance, validated_data)
-        list_films = UserWishes.objects.filter(movie=instance.id)
-        json_data = WishesSerializer(list_films, many=True).data
-        send_notification_email.delay(json_data)
+        # The notification is written to the outbox with the change, so it
+        # is not sent for rolled back updates. Subscribers are loaded by the
+        # worker, so the request does not depend on their amount
+        with transaction.atomic():
+            super().update(instance, validated_data)
+            schedule_subscribers_notification(instance.id)
         return instance
 
 
@@ -89,12 +97,12 @@ class FilterReviewListSerializer(serializers.ListSerializer):
 
     def to_representation(self, data):
         """
-        Filter query set where parent=None
+        Link all reviews into threads in memory and output top level ones
         :param data: Queryset
         :return:
         """
-        data = data.filter(parent=None)
-        return super().to_representation(data)
+        reviews = data.all() if isinstance(data, models.Manager) else data
+        return super().to_representation(link_review_threads(reviews))
 
 
 class RecursiveSerializer(serializers.Serializer):
@@ -118,7 +126,7 @@ class ReviewSerializer(serializers.ModelSerializer):
     """
     Serializer for reviews
     """
-    children = RecursiveSerializer(many=True)
+    children = RecursiveSerializer(many=True, source='replies')
 
     class Meta:
         """
@@ -131,6 +139,19 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'text', 'children')
 
 
+class ReviewThreadSerializer(ReviewSerializer):
+    """
+    Serializer for threads of reviews loaded up to the limited depth.
+    Replies which were not loaded are present only in reply_count
+    """
+    reply_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        list_serializer_class = serializers.ListSerializer
+        model = Review
+        fields = ('id', 'name', 'text', 'reply_count', 'children')
+
+
 class MovieDetailSerializer(serializers.ModelSerializer):
     """
     Serializer for film detail
@@ -139,33 +160,76 @@ class MovieDetailSerializer(serializers.ModelSerializer):
     directors = DirectorSerializer(many=True)
     actors = ActorSerializer(many=True)
     genres = GenreSerializer(many=True)
-    reviews = ReviewSerializer(many=True)
+    review_count = serializers.SerializerMethodField()
+    reviews = serializers.SerializerMethodField()
 
     class Meta:
         model = Movie
-        fields = '__all__'
+        exclude = ('updated_at', )
+
+    def get_review_count(self, movie) -> int:
+        """
+        Amount of all reviews and replies of the movie
+        """
+        return movie.reviews.count()
+
+    @extend_schema_field(ReviewThreadSerializer(many=True))
+    def get_reviews(self, movie):
+        """
+        First threads of reviews, the rest are paged by reviews endpoint
+        """
+        top_reviews = (movie.reviews.filter(parent=None)
+                       .order_by('id')[:settings.DETAIL_REVIEW_THREADS])
+        threads = load_review_threads(top_reviews,
+                                      settings.REVIEW_REPLY_DEPTH)
+        return ReviewThreadSerializer(threads, many=True,
+                                      context=self.context).data
 
 
 class CreateRatingSerializer(serializers.ModelSerializer):
     """
-    Serializer for creating rating for films
+    Serializer for creating rating for films. Star and movie are taken as
+    ids, the star is checked against cached stars and the movie is checked
+    by the upsert of the vote, so they are not loaded separately. When the
+    buffer of votes is enabled, the vote is written later
     """
+    star = serializers.IntegerField(source='star_id')
+    movie = serializers.IntegerField(source='movie_id')
+
     class Meta:
         model = Rating
         fields = ('star', 'movie')
 
+    def validate_star(self, value):
+        """
+        Check that the star exists
+        """
+        if value not in get_star_values():
+            raise serializers.ValidationError(
+                f'Invalid pk "{value}" - object does not exist.')
+        return value
+
     def create(self, validated_data):
         """
         Create or update the object to the database.
         :param validated_data: OrderedDict
         :return: Rating
         """
-        rating, _ = Rating.objects.update_or_create(
-            ip=validated_data.get('ip', None),
-            movie=validated_data.get('movie', None),
-            defaults={'star': validated_data.get('star')}
-        )
-        return rating
+        ip = validated_data.get('ip', None)
+        movie_id = validated_data['movie_id']
+        star_id = validated_data['star_id']
+        error = {'movie': [f'Invalid pk "{movie_id}" - object does not exist.']}
+        rating_buffer = get_rating_buffer()
+        if rating_buffer is not None:
+            if not Movie.objects.filter(pk=movie_id).exists():
+                raise serializers.ValidationError(error)
+            if rating_buffer.vote(ip, movie_id, star_id):
+                # The vote is written later, so the rating is not saved yet
+                return Rating(ip=ip, movie_id=movie_id, star_id=star_id)
+        try:
+            return Rating.vote(ip, movie_id, star_id, get_star_values())
+        except Movie.DoesNotExist:
+            raise serializers.ValidationError(error)
 
 
 class RatingSerializer(serializers.ModelSerializer):
@@ -200,6 +264,28 @@ class WishesSerializer(serializers.ModelSerializer):
         fields = ('id', 'movie', 'user', 'added')
 
 
+class MovieFragmentField(serializers.Field):
+    """
+    Field for the movie serialized in advance. Fragments are taken from
+    movie_fragments of the context by id of the movie
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.context['movie_fragments'].get(value)
+
+
+class WishesListSerializer(WishesSerializer):
+    """
+    Serializer for user wishes with pre-serialized movies
+    """
+
+    movie = MovieFragmentField(source='movie_id')
+
+
 class WishesCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating ratings for movie
@@ -0,0 +1,352 @@
+"""
+    Collect signal receivers for movie app
+"""
+
+import weakref
+
+from django.core.cache import cache
+from django.db import transaction, connections
+from django.db.models.signals import post_delete, post_save, m2m_changed, \
+    pre_delete, post_migrate, post_init
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Movie, Rating, RatingStar, Actor, Director, Genre, \
+    Category, Review, rating_aggregates_changed
+from .autocomplete import autocomplete_index, AUTOCOMPLETE_SOURCES
+from .fragments import bump_movie_versions
+from .movie_index import bump_movie_index_version, INDEXED_FIELDS
+from .search import restore_search_triggers
+from .snapshots import bump_reference_version
+from .utils import rated_movies_key, bump_catalog_version, \
+    get_star_values
+
+
+CATALOG_MODELS = (Movie, Actor, Director, Genre, Category, Rating)
+MOVIE_RELATIONS = {Actor: 'actors', Director: 'directors', Genre: 'genres'}
+MOVIE_LOOKUPS = {Category: 'category', **MOVIE_RELATIONS}
+REFERENCE_MODELS = (Category, Director, Genre, RatingStar)
+AUTOCOMPLETE_KINDS = {model: (kind, field) for kind, (model, field)
+                      in AUTOCOMPLETE_SOURCES.items()}
+
+
+def get_star_value(star_id: int):
+    """
+    Get value of the star by id
+    """
+    value = get_star_values().get(star_id)
+    if value is None:
+        value = (RatingStar.objects.filter(pk=star_id)
+                 .values_list('value', flat=True).first())
+    return value
+
+
+@receiver(post_save, sender=RatingStar)
+@receiver(post_delete, sender=RatingStar)
+def forget_star_values(sender, **kwargs):
+    """
+    Drop cached values of stars after the change is committed, so values
+    computed concurrently from not committed rows are not kept
+    """
+    transaction.on_commit(get_star_values.invalidate)
+
+
+@receiver(post_save, sender=Rating)
+def add_rating_to_aggregates(sender, instance, created, **kwargs):
+    """
+    Count new vote or move changed vote in the rating aggregates of the movie
+    """
+    movie_id, star_id = getattr(instance, 'aggregated_as', (None, None))
+    if created:
+        Movie.apply_rating_changes(instance.movie_id,
+                                   added=[get_star_value(instance.star_id)])
+    elif (movie_id, star_id) != (instance.movie_id, instance.star_id):
+        Movie.apply_rating_changes(movie_id, removed=[get_star_value(star_id)])
+        Movie.apply_rating_changes(instance.movie_id,
+                                   added=[get_star_value(instance.star_id)])
+    instance.aggregated_as = (instance.movie_id, instance.star_id)
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    """
+    Withdraw deleted vote from the rating aggregates of the movie
+    """
+    movie_id, star_id = getattr(instance, 'aggregated_as',
+                                (instance.movie_id, instance.star_id))
+    Movie.apply_rating_changes(movie_id, removed=[get_star_value(star_id)])
+    cache.delete(rated_movies_key(instance.ip))
+
+
+def change_catalog_version(sender, **kwargs):
+    """
+    Outdate cached lists of the catalog after the change is committed
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_catalog_version)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(change_catalog_version, sender=model)
+    post_delete.connect(change_catalog_version, sender=model)
+
+for field in ('directors', 'actors', 'genres'):
+    m2m_changed.connect(change_catalog_version,
+                        sender=getattr(Movie, field).through)
+
+
+def change_movie_versions(movie_ids) -> None:
+    """
+    Outdate pre-serialized movies after the change is committed
+    """
+    movie_ids = list(movie_ids)
+    if movie_ids:
+        transaction.on_commit(lambda: bump_movie_versions(movie_ids))
+
+
+def touch_movies(movie_ids) -> None:
+    """
+    Change the time of the last change of movies, so validators of their
+    detail become outdated
+    :param movie_ids: ids of movies or the queryset of them
+    :return: None
+    """
+    Movie.objects.filter(pk__in=movie_ids).update(updated_at=timezone.now())
+
+
+def change_movies(movie_ids) -> None:
+    """
+    Outdate pre-serialized movies and validators of their detail
+    """
+    movie_ids = list(movie_ids)
+    if movie_ids:
+        touch_movies(movie_ids)
+        change_movie_versions(movie_ids)
+
+
+@receiver(post_save, sender=Movie)
+def change_saved_movie_version(sender, instance, **kwargs):
+    """
+    Outdate pre-serialized movie when it is saved
+    """
+    change_movie_versions([instance.pk])
+
+
+@receiver(rating_aggregates_changed, sender=Movie)
+def change_rated_movie_version(sender, movie_id, **kwargs):
+    """
+    Outdate pre-serialized movie and cached lists when rating aggregates of
+    the movie are changed without its save
+    """
+    change_movie_versions([movie_id])
+    transaction.on_commit(bump_catalog_version)
+
+
+def change_linked_movie_versions(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """
+    Outdate pre-serialized movies and their detail when their directors,
+    actors or genres are changed
+    """
+    if not reverse:
+        if action.startswith('post_'):
+            change_movies([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        change_movies(pk_set)
+    elif action == 'pre_clear':
+        change_movies(
+            sender.objects.filter(**{instance._meta.model_name: instance})
+            .values_list('movie_id', flat=True))
+
+
+def change_related_movie_versions(sender, instance, **kwargs):
+    """
+    Outdate pre-serialized movies and detail of deleted director, actor or
+    genre. Links of movies are deleted without m2m_changed signal
+    """
+    through = getattr(Movie, MOVIE_RELATIONS[sender]).through
+    change_movies(
+        through.objects.filter(**{sender._meta.model_name: instance})
+        .values_list('movie_id', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def change_category_movie_versions(sender, instance, **kwargs):
+    """
+    Outdate pre-serialized movies and detail of deleted category
+    """
+    change_movies(Movie.objects.filter(category=instance)
+                  .values_list('pk', flat=True))
+
+
+for model, field in MOVIE_RELATIONS.items():
+    m2m_changed.connect(change_linked_movie_versions,
+                        sender=getattr(Movie, field).through)
+    pre_delete.connect(change_related_movie_versions, sender=model)
+
+
+def touch_related_movies(sender, instance, created, **kwargs):
+    """
+    Outdate detail of movies showing the saved category, director, actor
+    or genre
+    """
+    if not created:
+        touch_movies(Movie.objects.filter(**{MOVIE_LOOKUPS[sender]: instance})
+                     .values('pk'))
+
+
+for model in MOVIE_LOOKUPS:
+    post_save.connect(touch_related_movies, sender=model)
+
+
+class MovieTouches:
+    """
+    Movies changed in the transaction, they are touched by one query after
+    the commit. Deleted movies are not touched
+    """
+
+    def __init__(self):
+        self.movie_ids = set()
+        self.deleted_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        movie_ids = self.movie_ids - self.deleted_ids
+        if movie_ids:
+            touch_movies(movie_ids)
+
+
+def get_movie_touches() -> MovieTouches:
+    """
+    Get movies touched after the commit of the current transaction. The
+    connection keeps only the weak reference, so touches live as long as
+    their commit callback and are dropped with callbacks of the rolled
+    back transaction
+    """
+    connection = transaction.get_connection()
+    reference = getattr(connection, 'movie_touches', None)
+    touches = reference() if reference is not None else None
+    if touches is None or touches.done:
+        touches = MovieTouches()
+        connection.movie_touches = weakref.ref(touches)
+        transaction.on_commit(touches)
+    return touches
+
+
+@receiver(pre_delete, sender=Movie)
+def skip_deleted_movie_touch(sender, instance, **kwargs):
+    """
+    Do not touch the movie when its reviews are deleted with it
+    """
+    if transaction.get_connection().in_atomic_block:
+        get_movie_touches().deleted_ids.add(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def touch_reviewed_movie(sender, instance, **kwargs):
+    """
+    Outdate detail of the movie showing reviews. Movies of reviews changed
+    in the transaction are touched once after the commit
+    """
+    if transaction.get_connection().in_atomic_block:
+        get_movie_touches().movie_ids.add(instance.movie_id)
+    else:
+        touch_movies([instance.movie_id])
+
+
+def update_autocomplete_index(sender, instance, **kwargs):
+    """
+    Apply the saved name to the autocomplete index after the commit.
+    Saves of other fields, like rating aggregates, are skipped
+    """
+    kind, field = AUTOCOMPLETE_KINDS[sender]
+    update_fields = kwargs.get('update_fields')
+    if update_fields and field not in update_fields:
+        return
+    object_id, name = instance.pk, getattr(instance, field)
+    transaction.on_commit(
+        lambda: autocomplete_index.update(kind, object_id, name))
+
+
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    """
+    Remove the deleted object from the autocomplete index after the commit
+    """
+    kind, _ = AUTOCOMPLETE_KINDS[sender]
+    object_id = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove(kind, object_id))
+
+
+for model in AUTOCOMPLETE_KINDS:
+    post_save.connect(update_autocomplete_index, sender=model)
+    post_delete.connect(remove_from_autocomplete_index, sender=model)
+
+
+def get_indexed_values(instance) -> tuple:
+    """
+    Get values of fields of the object kept in inverted indexes of movies
+    """
+    return tuple(instance.__dict__.get(field)
+                 for field in INDEXED_FIELDS[type(instance)])
+
+
+def remember_indexed_values(sender, instance, **kwargs):
+    """
+    Keep indexed values of the loaded object, so saves of other fields
+    are found
+    """
+    instance.indexed_values = get_indexed_values(instance)
+
+
+def change_movie_index_version(sender, **kwargs):
+    """
+    Outdate inverted indexes of movies after the change is committed
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(bump_movie_index_version)
+
+
+def change_saved_index_version(sender, instance, created, **kwargs):
+    """
+    Outdate inverted indexes of movies when indexed fields of the saved
+    object are changed. Descriptions, rating aggregates and other fields
+    are not indexed
+    """
+    values = get_indexed_values(instance)
+    if created or values != getattr(instance, 'indexed_values', None):
+        transaction.on_commit(bump_movie_index_version)
+    instance.indexed_values = values
+
+
+for model in INDEXED_FIELDS:
+    post_init.connect(remember_indexed_values, sender=model)
+    post_save.connect(change_saved_index_version, sender=model)
+    post_delete.connect(change_movie_index_version, sender=model)
+
+for field in ('directors', 'actors', 'genres'):
+    m2m_changed.connect(change_movie_index_version,
+                        sender=getattr(Movie, field).through)
+
+
+def change_reference_version(sender, **kwargs):
+    """
+    Outdate snapshots of the reference table in all processes after the
+    change is committed
+    """
+    transaction.on_commit(lambda: bump_reference_version(sender))
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(change_reference_version, sender=model)
+    post_delete.connect(change_reference_version, sender=model)
+
+
+@receiver(post_migrate)
+def restore_movie_search_index(sender, using, **kwargs):
+    """
+    Restore triggers of the search index after migrations of movie app
+    """
+    if sender.name == 'movies':
+        restore_search_triggers(connections[using])
@@ -0,0 +1,157 @@
+"""
+    Collect snapshots of small reference tables kept in memory of the process
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+from .compiled import compile_serializer
+from .conditional import conditional_response, get_list_etag
+
+
+def reference_version_key(model) -> str:
+    """
+    Key of the version of the table in the cache
+    """
+    return f'reference_version:{model._meta.label_lower}'
+
+
+class ReferenceSnapshot:
+    """
+    Serialized rows of the table kept in memory of the process. The version
+    of the table is shared by all processes through the cache, rows are
+    loaded again when it is changed by signals of any process
+    """
+
+    def __init__(self, model, serializer_class):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.version_key = reference_version_key(model)
+        self.rows: Optional[List[dict]] = None
+        self.rows_by_pk: Dict[object, dict] = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    def get_version(self) -> int:
+        """
+        Get the shared version of the table
+        """
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, int(time.time() * 1000), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def load(self) -> None:
+        """
+        Serialize all rows of the table with the compiled serializer. Rows
+        keep the ordering of the model, unordered tables are ordered by pk
+        """
+        compiled = compile_serializer(self.serializer_class)
+        queryset = self.model._default_manager.all()
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        values = list(compiled.values(queryset))
+        rows = compiled.serialize(values)
+        self.rows_by_pk = {value[compiled.pk_column]: row
+                           for value, row in zip(values, rows)}
+        self.rows = rows
+
+    def get(self) -> List[dict]:
+        """
+        Get serialized rows, loading them when the version was changed
+        """
+        version = self.get_version()
+        if self.rows is None or self.version != version:
+            with self._lock:
+                if self.rows is None or self.version != version:
+                    self.load()
+                    self.version = version
+        return self.rows
+
+    def get_row(self, pk) -> Optional[dict]:
+        """
+        Get the serialized row by the primary key
+        """
+        self.get()
+        try:
+            return self.rows_by_pk.get(self.model._meta.pk.to_python(pk))
+        except ValidationError:
+            return None
+
+
+reference_snapshots: Dict[tuple, ReferenceSnapshot] = {}
+
+
+def get_reference_snapshot(model, serializer_class) -> ReferenceSnapshot:
+    """
+    Get the snapshot of the table serialized by the serializer
+    """
+    key = (model, serializer_class)
+    if key not in reference_snapshots:
+        reference_snapshots[key] = ReferenceSnapshot(model, serializer_class)
+    return reference_snapshots[key]
+
+
+def bump_reference_version(model) -> None:
+    """
+    Change the version of the table, so all processes load it again
+    """
+    version_key = reference_version_key(model)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, int(time.time() * 1000), None)
+
+
+class ReferenceSnapshotMixin:
+    """
+    Serve list of the view from the snapshot of its table without queries
+    to the database. Responses are tagged by the version of the table, so
+    unchanged ones are answered with 304 Not Modified
+    """
+
+    def get_snapshot(self) -> ReferenceSnapshot:
+        return get_reference_snapshot(self.queryset.model,
+                                      self.get_serializer_class())
+
+    def get_snapshot_etag(self) -> str:
+        snapshot = self.get_snapshot()
+        return get_list_etag(f'{snapshot.version_key}:'
+                             f'{snapshot.get_version()}',
+                             sorted(self.request.query_params.lists()),
+                             self.kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(request, self.build_list,
+                                    etag=self.get_snapshot_etag())
+
+    def build_list(self) -> Response:
+        rows = self.get_snapshot().get()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(rows)
+
+
+class ReferenceSnapshotDetailMixin(ReferenceSnapshotMixin):
+    """
+    Serve detail of the view from the snapshot of its table too
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(request, self.build_detail,
+                                    etag=self.get_snapshot_etag())
+
+    def build_detail(self) -> Response:
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        row = self.get_snapshot().get_row(self.kwargs[lookup])
+        if row is None:
+            raise Http404
+        return Response(row)
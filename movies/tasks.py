@@ -3,83 +3,199 @@
 """
 
 
-import os
+import logging
+import warnings
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+from smtplib import SMTPException, SMTPRecipientsRefused
 
-import requests
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
 
 from django_movie.celery import app
-from movies.models import MovieImdb
+from movies.models import Movie, MovieImdb, UserWishes
+from movies.outbox import enqueue_task, relay_outbox
+from movies.rating_buffer import get_rating_buffer
+from movies.tmdb import TrendingFetcher
 
 
-def get_popular_movie() -> dict:
-    """
-    Get movies using api
-    :return: response
-    """
+VOTE_AVERAGE_STEP = Decimal('0.01')
 
-    api_key = os.environ.get('API_KEY', '')
-    url = 'https://api.themoviedb.org/3/trending/all/day?api_key=' + api_key\
-          + '&language=en-US'
-    resp = requests.get(url)
-    return resp.json()
+logger = logging.getLogger(__name__)
 
 
-def add_movie_to_db(movies: dict) -> None:
+def add_movie_to_db(movies: dict, batch_size: int = 500) -> None:
     """
-    Add movies to db
-    :param movies:
+    Add new movies to db and update votes of known ones. Known movies are
+    loaded for the whole batch, so the amount of queries does not depend on
+    the amount of movies
+    :param movies: response of the api
+    :param batch_size: amount of movies in one query
     :return:
     """
+    records = {}
     for movie in movies.get('results', []):
         movie_id = movie.get('id')
-        if not MovieImdb.objects.filter(unique_id=movie_id).exists():
-
-            title = movie.get('title')
-            if title:
-                overview = movie.get('overview')
-                release_date = movie.get('release_date')
-                vote_count = movie.get('vote_count', 0)
-                vote_average = movie.get('vote_average', 0)
-                media_type = movie.get('media_type', 'Unknown')
-                record = MovieImdb(unique_id=movie_id,
-                                   title=title,
-                                   overview=overview,
-                                   release_date=release_date,
-                                   vote_count=vote_count,
-                                   vote_average=vote_average,
-                                   media_type=media_type)
-
-                record.save()
+        title = movie.get('title')
+        if movie_id is None or not title:
+            continue
+        records[movie_id] = MovieImdb(
+            unique_id=movie_id,
+            title=title,
+            overview=movie.get('overview') or '',
+            release_date=movie.get('release_date') or None,
+            vote_count=movie.get('vote_count') or 0,
+            vote_average=Decimal(str(movie.get('vote_average') or 0))
+            .quantize(VOTE_AVERAGE_STEP),
+            media_type=movie.get('media_type', 'Unknown'))
+
+    movie_ids = list(records)
+    known = {}
+    for start in range(0, len(movie_ids), batch_size):
+        known.update((record.unique_id, record) for record in MovieImdb.objects
+                     .filter(unique_id__in=movie_ids[start:start + batch_size])
+                     .only('unique_id', 'vote_count', 'vote_average'))
+
+    changed = []
+    for movie_id, record in known.items():
+        votes = (records[movie_id].vote_count, records[movie_id].vote_average)
+        if (record.vote_count, record.vote_average) != votes:
+            record.vote_count, record.vote_average = votes
+            changed.append(record)
+
+    with transaction.atomic():
+        # Conflicts come from concurrent runs which added the same movies
+        MovieImdb.objects.bulk_create(
+            [record for movie_id, record in records.items()
+             if movie_id not in known],
+            batch_size=batch_size, ignore_conflicts=True)
+        MovieImdb.objects.bulk_update(changed, ['vote_count', 'vote_average'],
+                                      batch_size=batch_size)
+
+
+def schedule_subscribers_notification(movie_id: int) -> None:
+    """
+    Notify subscribers about the update of the movie after the delay. The
+    task is put to the outbox in the transaction of the update, all updates
+    of the movie during the delay are sent as one notification
+    :param movie_id: id of the updated movie
+    :return: None
+    """
+    enqueue_task(notify_subscribers.name, [movie_id],
+                 dedup_key=f'notify_subscribers:{movie_id}',
+                 delay=settings.NOTIFICATION_DELAY)
 
 
 @app.task
-def send_notification_email(list_films: list):
+def notify_subscribers(movie_id: int) -> int:
     """
-    Send notification email when film was updated and user was
-    subscribed on this film
-    :param list_films:
-    :return:
+    Split subscribers of the updated movie into chunks and send emails of
+    every chunk by the separate task, so workers send them in parallel
+    :param movie_id: id of the updated movie
+    :return: amount of chunks
+    """
+    title = (Movie.objects.filter(pk=movie_id)
+             .values_list('title', flat=True).first())
+    if title is None:
+        return 0
+    chunk_size = settings.NOTIFICATION_CHUNK_SIZE
+    emails = (UserWishes.objects.filter(movie_id=movie_id)
+              .exclude(user__email='').order_by('user__email')
+              .values_list('user__email', flat=True).distinct()
+              .iterator(chunk_size=chunk_size))
+    chunks = 0
+    while True:
+        chunk = list(islice(emails, chunk_size))
+        if not chunk:
+            return chunks
+        send_notification_emails.delay(title, chunk)
+        chunks += 1
+
+
+@app.task(bind=True, max_retries=settings.NOTIFICATION_MAX_RETRIES)
+def send_notification_emails(self, title: str, emails: list) -> int:
+    """
+    Send notification emails about the updated movie to subscribers over
+    one connection to the mail server. Refused recipients are skipped, on
+    other errors of the server the rest of emails is retried later
+    :param title: title of the movie
+    :param emails: emails of subscribers
+    :return: amount of sent emails
+    """
+    body = f'The movie: "{title}" was updated to which you were subscribed'
+    connection = get_connection()
+    sent = 0
+    index = 0
+    try:
+        connection.open()
+        for index, email in enumerate(emails):
+            message = EmailMessage('Notification', body,
+                                   settings.DEFAULT_FROM_EMAIL, [email])
+            try:
+                sent += connection.send_messages([message])
+            except SMTPRecipientsRefused:
+                logger.warning('Notification to %s was refused', email)
+    except (SMTPException, OSError) as error:
+        countdown = settings.NOTIFICATION_RETRY_DELAY * \
+            2 ** self.request.retries
+        raise self.retry(exc=error, args=(title, emails[index:]),
+                         countdown=countdown)
+    finally:
+        connection.close()
+    return sent
+
+
+@app.task
+def send_notification_email(list_films: list) -> int:
     """
+    Deprecated, kept for tasks queued before send_notification_emails.
+    Emails are sent by send_notification_emails grouped by movies
+    :param list_films: dicts with the movie and the subscribed user
+    :return: amount of movies
+    """
+    warnings.warn('send_notification_email is deprecated, use '
+                  'send_notification_emails', DeprecationWarning)
+    emails = defaultdict(list)
     for film in list_films:
-        # send_mail('Notification',
-        #     f'The movie: "{film.get("movie").get("title")}" was
-        #     updated to which you were subscribed',
-        #     settings.EMAIL_HOST_USER,  # from_email
-        #     [film.get("user").get("email")],  # to_email
-        #     fail_silently=False,
-        # )
-        print(f'Notification {film.get("movie").get("title")}:'
-              f'{film.get("user").get("email")}')
-    return 'Emails were send'
+        email = film.get('user', {}).get('email')
+        if email:
+            emails[film.get('movie', {}).get('title')].append(email)
+    for title, chunk in emails.items():
+        send_notification_emails.delay(title, chunk)
+    return len(emails)
 
 
 @app.task
 def upload_popular_movies():
     """
-    Task for uploading movies to db
+    Task for uploading movies to db. Movies are saved in batches while the
+    rest of pages are loaded
     :return:
     """
 
-    data = get_popular_movie()
-    add_movie_to_db(data)
+    with TrendingFetcher() as fetcher:
+        fetcher.fetch(settings.TMDB_PAGES, add_movie_to_db)
     return True
+
+
+@app.task
+def flush_rating_votes():
+    """
+    Write votes from the buffer to the database
+    :return: amount of changed votes
+    """
+    rating_buffer = get_rating_buffer()
+    if rating_buffer is None:
+        return 0
+    return rating_buffer.flush()
+
+
+@app.task
+def relay_outbox_messages():
+    """
+    Publish tasks from the outbox
+    :return: amount of published tasks
+    """
+    return relay_outbox(settings.OUTBOX_BATCH_SIZE)
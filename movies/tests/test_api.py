@@ -1,7 +1,14 @@
+import io
 import json
+import threading
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, models, IntegrityError, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.test.client import RequestFactory
 
@@ -9,18 +16,61 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from movies.cache import get_two_tier_cache
 from movies.models import Category, Rating, RatingStar, Movie, Actor, Genre, \
     UserWishes, Review, Director
 from movies.serializers import CategorySerializer, ActorSerializer, \
     GenreSerializer, MovieListSerializer, MovieDetailSerializer, \
     WishesSerializer, RatingSerializer, DirectorSerializer
 
-from movies.utils import get_client_ip
+from movies.utils import get_client_ip, bump_catalog_version, \
+    get_star_values, add_rated_movie_id, cache_rated_movie_ids, \
+    get_rated_movie_ids, rated_movies_key
+
+
+class FakeRedis:
+    """
+    Sets of Redis used by rated movies
+    """
+
+    def __init__(self):
+        self.sets = {}
+
+    def smembers(self, key):
+        return {str(member).encode() for member in self.sets.get(key, ())}
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    def expire(self, key, timeout):
+        pass
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def register_script(self, script):
+        def add(keys, args):
+            if keys[0] not in self.sets:
+                return 0
+            self.sadd(keys[0], *args)
+            return 1
+        return add
 
 
 class MovieApiTestCase(APITestCase):
 
     def setUp(self):
+        cache.clear()
+        get_two_tier_cache().clear()
 
         self.category_1 = Category.objects\
             .create(name='Film', description='First Cat', url='film')
@@ -73,16 +123,16 @@ class MovieApiTestCase(APITestCase):
         self.rating_2 = Rating.objects.create(ip='2.1.1.1', star=self.star_2,
                                               movie=self.movie_2)
 
-        self.review_1 = Review.objects.create(email='test1@mail.ru', name='Carl',
-                                              text='Good film',
-                                              movie=self.movie_1)
-        self.review_2 = Review.objects.create(email='test1@mail.ru', name='Carl',
-                                              text='Good film',
-                                              parent=self.review_1,
-                                              movie=self.movie_1)
-        self.review_3 = Review.objects.create(email='test2@mail.ru', name='Carl1',
-                                              text='Good film',
-                                              movie=self.movie_1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review_1 = Review.objects.create(
+                email='test1@mail.ru', name='Carl', text='Good film',
+                movie=self.movie_1)
+            self.review_2 = Review.objects.create(
+                email='test1@mail.ru', name='Carl', text='Good film',
+                parent=self.review_1, movie=self.movie_1)
+            self.review_3 = Review.objects.create(
+                email='test2@mail.ru', name='Carl1', text='Good film',
+                movie=self.movie_1)
 
     def test_get_category(self):
         response = self.client.get('/api/v1/category/')
@@ -319,6 +369,7 @@ class MovieApiTestCase(APITestCase):
     def test_get_movie_detail(self):
         url = reverse('movie-detail', args=(self.movie_1.id, ))
         response = self.client.get(url)
+        self.movie_1.refresh_from_db()
         test_data = MovieDetailSerializer(self.movie_1).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(test_data, response.data)
@@ -469,6 +520,13 @@ class MovieApiTestCase(APITestCase):
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
         self.assertEqual(3, Rating.objects.all().count())
 
+    def test_star_values_are_forgotten_after_commit(self):
+        get_star_values()
+        with self.captureOnCommitCallbacks(execute=True):
+            star = RatingStar.objects.create(value=5)
+            self.assertNotIn(star.id, get_star_values())
+        self.assertEqual(5, get_star_values()[star.id])
+
     def test_create_review(self):
         self.assertEqual(3, Review.objects.all().count())
         data = {
@@ -485,3 +543,318 @@ class MovieApiTestCase(APITestCase):
                                     content_type='application/json')
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
         self.assertEqual(4, Review.objects.all().count())
+
+    def test_create_rating_updates_aggregates(self):
+        data = {
+            'star': self.star_2.id,
+            'movie': self.movie_1.id,
+        }
+        json_data = json.dumps(data)
+        self.client.force_login(self.user_1)
+        response = self.client.post('/api/v1/add_rating/', data=json_data,
+                                    content_type='application/json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.movie_1.refresh_from_db()
+        self.assertEqual(2, self.movie_1.rating_count)
+        self.assertEqual(3, self.movie_1.rating_sum)
+        self.assertEqual({'1': 1, '2': 1}, self.movie_1.rating_histogram)
+
+    def test_change_rating_moves_vote_in_aggregates(self):
+        data = {
+            'star': self.star_2.id,
+            'movie': self.movie_1.id,
+        }
+        json_data = json.dumps(data)
+        self.client.force_login(self.user_1)
+        self.client.post('/api/v1/add_rating/', data=json_data,
+                         content_type='application/json',
+                         REMOTE_ADDR=self.rating_1.ip)
+        self.movie_1.refresh_from_db()
+        self.assertEqual(1, Rating.objects.filter(movie=self.movie_1).count())
+        self.assertEqual(1, self.movie_1.rating_count)
+        self.assertEqual(2, self.movie_1.rating_sum)
+        self.assertEqual({'2': 1}, self.movie_1.rating_histogram)
+
+    def test_repeated_rating_is_upserted(self):
+        url = '/api/v1/add_rating/'
+        self.client.force_login(self.user_1)
+        self.client.post(url, data={'star': self.star_1.id,
+                                    'movie': self.movie_1.id},
+                         format='json', REMOTE_ADDR='3.1.1.1')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data={'star': self.star_2.id,
+                                                   'movie': self.movie_1.id},
+                                        format='json', REMOTE_ADDR='3.1.1.1')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('"movies_ratingstar"', sql)
+        self.assertEqual(1, sql.count('INSERT INTO "movies_rating"'))
+        self.assertNotIn('FROM "movies_movie"', sql)
+        self.assertEqual(1, sql.count('UPDATE "movies_movie"'))
+        self.assertEqual(2, Rating.objects.filter(movie=self.movie_1).count())
+        self.movie_1.refresh_from_db()
+        self.assertEqual({'1': 1, '2': 1}, self.movie_1.rating_histogram)
+
+    def test_vote_outdates_cached_movie_list(self):
+        url = reverse('movie-list')
+        with self.captureOnCommitCallbacks(execute=True):
+            star = RatingStar.objects.create(value=5)
+        self.client.get(url)
+        self.client.force_login(self.user_1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/v1/add_rating/',
+                             data={'star': star.id, 'movie': self.movie_1.id},
+                             format='json', REMOTE_ADDR='3.1.1.1')
+        results = {movie['id']: movie for movie
+                   in self.client.get(url).data['results']}
+        self.assertEqual(3, results[self.movie_1.id]['middle_star'])
+
+    def test_create_rating_with_missing_objects(self):
+        self.client.force_login(self.user_1)
+        for data in ({'star': 0, 'movie': self.movie_1.id},
+                     {'star': self.star_1.id, 'movie': 0}):
+            response = self.client.post('/api/v1/add_rating/', data=data,
+                                        format='json')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST,
+                             response.status_code)
+        self.assertEqual(2, Rating.objects.count())
+
+    def test_rating_is_unique_per_ip_and_movie(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Rating.objects.create(ip=self.rating_1.ip, star=self.star_2,
+                                  movie=self.movie_1)
+
+    def test_delete_rating_updates_aggregates(self):
+        self.rating_1.delete()
+        self.movie_1.refresh_from_db()
+        self.assertEqual(0, self.movie_1.rating_count)
+        self.assertEqual(0, self.movie_1.rating_sum)
+        self.assertEqual({}, self.movie_1.rating_histogram)
+
+    def test_movie_list_reads_stored_aggregates(self):
+        Movie.objects.filter(pk=self.movie_1.id).update(
+            rating_count=2, rating_sum=7, rating_histogram={'2': 1, '5': 1})
+        response = self.client.get(reverse('movie-list'))
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertEqual(3, results[self.movie_1.id]['middle_star'])
+        self.assertEqual(2, results[self.movie_2.id]['middle_star'])
+
+    def test_rebuild_rating_aggregates(self):
+        Movie.objects.update(rating_count=10, rating_sum=10,
+                             rating_histogram={'1': 10})
+        call_command('rebuild_rating_aggregates', stdout=io.StringIO())
+        self.movie_1.refresh_from_db()
+        self.movie_2.refresh_from_db()
+        self.assertEqual((1, 1, {'1': 1}),
+                         (self.movie_1.rating_count, self.movie_1.rating_sum,
+                          self.movie_1.rating_histogram))
+        self.assertEqual((1, 2, {'2': 1}),
+                         (self.movie_2.rating_count, self.movie_2.rating_sum,
+                          self.movie_2.rating_histogram))
+
+    def test_movie_list_marks_rated_movies(self):
+        data = {
+            'star': self.star_2.id,
+            'movie': self.movie_2.id,
+        }
+        json_data = json.dumps(data)
+        self.client.force_login(self.user_1)
+        self.client.post('/api/v1/add_rating/', data=json_data,
+                         content_type='application/json')
+        response = self.client.get(reverse('movie-list'))
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertFalse(results[self.movie_1.id]['rating_user'])
+        self.assertTrue(results[self.movie_2.id]['rating_user'])
+
+    def test_concurrent_votes_keep_rated_movies(self):
+        ip = '3.1.1.1'
+        cache_rated_movie_ids(ip)
+        threads = [threading.Thread(target=add_rated_movie_id,
+                                    args=(ip, movie_id))
+                   for movie_id in range(1, 21)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(range(1, 21)), get_rated_movie_ids(ip))
+
+    def test_rated_movies_are_added_to_redis_set(self):
+        redis = FakeRedis()
+        key = cache.make_key(rated_movies_key(self.rating_1.ip))
+        with mock.patch('movies.utils.get_redis_client', return_value=redis):
+            self.assertIsNone(get_rated_movie_ids(self.rating_1.ip))
+            add_rated_movie_id(self.rating_1.ip, self.movie_2.id)
+            self.assertEqual({0, self.movie_1.id, self.movie_2.id},
+                             redis.sets[key])
+            with self.assertNumQueries(0):
+                add_rated_movie_id(self.rating_1.ip, 100)
+            self.assertEqual({self.movie_1.id, self.movie_2.id, 100},
+                             get_rated_movie_ids(self.rating_1.ip))
+            self.assertEqual(set(), cache_rated_movie_ids('3.1.1.1'))
+            self.assertEqual(set(), get_rated_movie_ids('3.1.1.1'))
+
+    def test_movie_list_does_not_query_ratings_when_cached(self):
+        response = self.client.get(reverse('movie-list'),
+                                   REMOTE_ADDR=self.rating_1.ip)
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertTrue(results[self.movie_1.id]['rating_user'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('movie-list'),
+                                       REMOTE_ADDR=self.rating_1.ip)
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertTrue(results[self.movie_1.id]['rating_user'])
+        self.assertFalse(results[self.movie_2.id]['rating_user'])
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'movies_rating' in query['sql']])
+
+    def test_movie_list_is_cached(self):
+        url = reverse('movie-list') + '?genres=' + self.genre_1.name
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(url)
+        self.assertEqual(response.data, cached_response.data)
+
+    def test_movie_list_cache_is_shared_between_clients(self):
+        url = reverse('movie-list')
+        self.client.get(url, REMOTE_ADDR='3.3.3.3')
+        response = self.client.get(url, REMOTE_ADDR=self.rating_1.ip)
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertTrue(results[self.movie_1.id]['rating_user'])
+        response = self.client.get(url, REMOTE_ADDR='3.3.3.3')
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertFalse(results[self.movie_1.id]['rating_user'])
+
+    def test_movie_list_cache_is_invalidated(self):
+        url = reverse('movie-list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_2.genres.add(self.genre_2)
+        response = self.client.get(url)
+        results = {movie['id']: movie for movie in response.data['results']}
+        self.assertEqual([self.genre_2.id], results[self.movie_2.id]['genres'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.get(pk=self.movie_2.id).delete()
+        response = self.client.get(url)
+        self.assertEqual([self.movie_1.id],
+                         [movie['id'] for movie in response.data['results']])
+
+    def test_movie_detail_queries_do_not_depend_on_reviews(self):
+        url = reverse('movie-detail', args=(self.movie_1.id, ))
+
+        def add_reviews(parent, levels, amount):
+            for level in range(levels):
+                parent = Review.objects.create(email='test3@mail.ru',
+                                               name='Bob',
+                                               text=f'Reply {level}',
+                                               parent=parent,
+                                               movie=self.movie_1)
+            for number in range(amount):
+                Review.objects.create(email='test3@mail.ru', name='Bob',
+                                      text=f'Review {number}',
+                                      movie=self.movie_1)
+            return parent
+
+        with self.captureOnCommitCallbacks(execute=True):
+            parent = add_reviews(self.review_2, 5, 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            add_reviews(parent, 5, 10)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+
+        self.assertEqual(33, response.data['review_count'])
+        self.assertEqual(settings.DETAIL_REVIEW_THREADS,
+                         len(response.data['reviews']))
+        thread = response.data['reviews'][0]
+        depth = 0
+        while thread['children']:
+            thread = thread['children'][0]
+            depth += 1
+        self.assertEqual(settings.REVIEW_REPLY_DEPTH, depth)
+        self.assertEqual(1, thread['reply_count'])
+
+    def test_get_movie_reviews(self):
+        for number in range(15):
+            Review.objects.create(email='test3@mail.ru', name='Bob',
+                                  text=f'Review {number}', movie=self.movie_1)
+        url = reverse('movie-reviews', args=(self.movie_1.id, ))
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            ids.extend(review['id'] for review in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(list(Review.objects
+                              .filter(movie=self.movie_1, parent=None)
+                              .order_by('id').values_list('id', flat=True)),
+                         ids)
+
+    def test_get_movie_review_replies(self):
+        reply = Review.objects.create(email='test3@mail.ru', name='Bob',
+                                      text='Reply', parent=self.review_2,
+                                      movie=self.movie_1)
+        url = reverse('movie-reviews', args=(self.movie_1.id, ))
+        params = {'parent': self.review_1.id, 'depth': 0}
+        response = self.client.get(url, params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([{'id': self.review_2.id, 'name': 'Carl',
+                           'text': 'Good film', 'reply_count': 1,
+                           'children': []}], response.data['results'])
+
+        response = self.client.get(url, {'parent': self.review_2.id})
+        self.assertEqual([reply.id], [review['id'] for review
+                                      in response.data['results']])
+
+    def test_get_reviews_of_missing_movie(self):
+        url = reverse('movie-reviews', args=(self.movie_2.id + 100, ))
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_movie_list_is_stitched_from_fragments(self):
+        url = reverse('movie-list')
+        response = self.client.get(url)
+        self.assertEqual(response.data, json.loads(response.content))
+
+        bump_catalog_version()
+        with CaptureQueriesContext(connection) as queries:
+            cached_response = self.client.get(url)
+        self.assertEqual(response.content, cached_response.content)
+        self.assertEqual(0, len(queries))
+
+    def test_movie_fragment_is_rebuilt_on_change(self):
+        url = reverse('movie-list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_1.title = 'Forsazh_updated'
+            self.movie_1.save()
+            self.movie_2.actors.add(self.actor_2)
+        response = self.client.get(url)
+        results = {movie['id']: movie for movie in response.json()['results']}
+        self.assertEqual('Forsazh_updated', results[self.movie_1.id]['title'])
+        self.assertEqual([self.actor_2.id], results[self.movie_2.id]['actors'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.actor_2.delete()
+        response = self.client.get(url)
+        results = {movie['id']: movie for movie in response.json()['results']}
+        self.assertEqual([], results[self.movie_2.id]['actors'])
+
+    def test_user_wishes_are_stitched_from_fragments(self):
+        url = reverse('user_wishes-list')
+        self.client.force_login(self.user_1)
+        response = self.client.get(url)
+        self.assertEqual(response.data, json.loads(response.content))
+        with CaptureQueriesContext(connection) as queries:
+            cached_response = self.client.get(url)
+        self.assertEqual(response.content, cached_response.content)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'movies_movie' in query['sql']])
+
+    def test_movie_list_in_browsable_api(self):
+        response = self.client.get(reverse('movie-list'),
+                                   HTTP_ACCEPT='text/html')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertContains(response, self.movie_1.title)
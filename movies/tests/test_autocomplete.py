@@ -0,0 +1,144 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.autocomplete import AutocompleteIndex, PrefixIndex, \
+    AUTOCOMPLETE_VERSION_KEY
+from movies.models import Movie, Actor, Director, Genre
+
+
+class PrefixIndexTestCase(TestCase):
+
+    def test_search_by_beginning_of_words(self):
+        index = PrefixIndex({1: 'Джейсон Стетхем', 2: 'Стивен Сигал',
+                             3: 'Jason Statham'})
+        self.assertEqual([{'id': 1, 'name': 'Джейсон Стетхем'}],
+                         index.search('стет', 10))
+        self.assertEqual([2, 1],
+                         [item['id'] for item in index.search('с', 10)])
+        self.assertEqual([2], [item['id'] for item in index.search('с', 1)])
+        self.assertEqual([], index.search('statham x', 10))
+
+    def test_add_and_remove(self):
+        index = PrefixIndex({1: 'Forsazh'})
+        index.add(1, 'Taxi')
+        index.add(2, 'Forsazh 2')
+        self.assertEqual([2], [item['id'] for item in index.search('fors', 10)])
+        index.remove(2)
+        self.assertEqual([], index.search('fors', 10))
+        self.assertEqual(['taxi'], [key for key, _ in index.keys])
+
+    def test_copy_does_not_change_original(self):
+        index = PrefixIndex({1: 'Forsazh'})
+        copy = index.copy()
+        copy.add(1, 'Taxi')
+        copy.add(2, 'Forsazh 2')
+        self.assertEqual([1], [item['id'] for item in index.search('fors', 10)])
+        self.assertEqual([('forsazh', 1)], index.keys)
+
+
+@override_settings(AUTOCOMPLETE_VERSION_CHECK_INTERVAL=0)
+class AutocompleteTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.actor_1 = Actor.objects.create(name='Джейсон Стетхем', age=40,
+                                            description='Описание')
+        self.director_1 = Director.objects.create(name='Луи Летерье', age=40)
+        self.genre_1 = Genre.objects\
+            .create(name='Боевик', description='Боевик', url='boevik')
+        self.movie_1 = Movie.objects\
+            .create(title='Перевозчик', description='Перевозчик', year=2002,
+                    country='France', url='perevozchik')
+
+    def autocomplete(self, text):
+        response = self.client.get(reverse('autocomplete') + f'?q={text}')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_autocomplete(self):
+        data = self.autocomplete('ПЕРЕВ')
+        self.assertEqual([{'id': self.movie_1.id, 'name': 'Перевозчик'}],
+                         data['movies'])
+        self.assertEqual([], data['actors'])
+        self.assertEqual([self.actor_1.id],
+                         [actor['id'] for actor in
+                          self.autocomplete('стет')['actors']])
+        self.assertEqual([self.director_1.id],
+                         [director['id'] for director in
+                          self.autocomplete('лет')['directors']])
+
+    def test_autocomplete_does_not_query_database(self):
+        self.autocomplete('бое')
+        with self.assertNumQueries(0):
+            self.assertEqual([self.genre_1.id],
+                             [genre['id'] for genre in
+                              self.autocomplete('бое')['genres']])
+
+    def test_index_is_updated_by_changes(self):
+        self.autocomplete('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            actor = Actor.objects.create(name='Jason Statham', age=40,
+                                         description='Actor')
+            self.movie_1.title = 'Transporter'
+            self.movie_1.save()
+        with self.assertNumQueries(0):
+            data = self.autocomplete('stat')
+            self.assertEqual([actor.id],
+                             [actor['id'] for actor in data['actors']])
+            self.assertEqual([], self.autocomplete('перев')['movies'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            actor.delete()
+        self.assertEqual([], self.autocomplete('stat')['actors'])
+
+    def test_rating_changes_are_not_indexed(self):
+        self.autocomplete('a')
+        version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            Movie.apply_rating_changes(self.movie_1.id, added=[5])
+        self.assertEqual(version, cache.get(AUTOCOMPLETE_VERSION_KEY))
+        self.assertFalse([query for query in queries
+                          if '"title"' in query['sql']])
+
+    def test_index_is_loaded_after_changes_of_other_process(self):
+        self.autocomplete('a')
+        Actor.objects.filter(pk=self.actor_1.pk).update(name='Jason Statham')
+        cache.incr(AUTOCOMPLETE_VERSION_KEY)
+        self.assertEqual([self.actor_1.id],
+                         [actor['id'] for actor in
+                          self.autocomplete('stat')['actors']])
+
+    def test_changes_of_other_process_are_applied(self):
+        other = AutocompleteIndex()
+        other.search('a', 10)
+        indexes = other.indexes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.actor_1.name = 'Jason Statham'
+            self.actor_1.save()
+            genre = Genre.objects.create(name='Drama', description='Drama',
+                                         url='drama')
+        with self.assertNumQueries(0):
+            found = other.search('stat', 10)
+            self.assertEqual([self.actor_1.id],
+                             [actor['id'] for actor in found['actors']])
+            self.assertEqual([genre.id], [item['id'] for item in
+                                          other.search('dra', 10)['genres']])
+        self.assertIs(indexes['movies'], other.indexes['movies'])
+        self.assertEqual([], indexes['actors'].search('stat', 10))
+
+    def test_version_is_checked_once_in_interval(self):
+        self.autocomplete('a')
+        Actor.objects.filter(pk=self.actor_1.pk).update(name='Jason Statham')
+        cache.incr(AUTOCOMPLETE_VERSION_KEY)
+        with override_settings(AUTOCOMPLETE_VERSION_CHECK_INTERVAL=60):
+            self.assertEqual([], self.autocomplete('stat')['actors'])
+        self.assertEqual([self.actor_1.id],
+                         [actor['id'] for actor in
+                          self.autocomplete('stat')['actors']])
@@ -0,0 +1,160 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.cache import LRUCache, TwoTierCache, cached
+
+
+# Shared tier of tests stands in for Redis
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+               'LOCATION': 'shared'},
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TwoTierCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.cache = TwoTierCache(alias='shared', max_entries=10,
+                                  poll_interval=0.01)
+        self.calls = 0
+
+    def compute(self, value='value', duration=0):
+        def func():
+            self.calls += 1
+            time.sleep(duration)
+            return value
+        return func
+
+    def test_values_are_found_in_both_tiers(self):
+        self.assertEqual('value', self.cache.get_or_set('key', self.compute()))
+        self.assertEqual('value', self.cache.get_or_set('key', self.compute()))
+        other = TwoTierCache(alias='shared')
+        self.assertEqual('value', other.get_or_set('key', self.compute()))
+        self.assertEqual(1, self.calls)
+        self.assertEqual({'hits': 1, 'local_hits': 1, 'misses': 1,
+                          'refreshes': 0, 'stale_hits': 0,
+                          'local_entries': 1}, self.cache.get_stats())
+        self.assertEqual((1, 0), (other.stats['hits'],
+                                  other.stats['local_hits']))
+
+    def test_invalidation_is_seen_by_other_processes(self):
+        other = TwoTierCache(alias='shared', version_timeout=0.05)
+        self.cache.get_or_set('key', self.compute('old'))
+        other.get_or_set('key', self.compute('old'))
+        self.cache.invalidate('key')
+        self.assertEqual('old', other.get_or_set('key', self.compute('new')))
+        time.sleep(0.06)
+        self.assertEqual('new', other.get_or_set('key', self.compute('new')))
+        self.assertEqual('new', self.cache.get_or_set('key',
+                                                      self.compute('new')))
+        self.assertEqual(2, self.calls)
+
+    def test_local_hits_do_not_use_shared_cache(self):
+        self.cache.get_or_set('key', self.compute())
+        shared = self.cache.shared
+        with mock.patch.object(shared, 'get', wraps=shared.get) as get:
+            self.assertEqual('value', self.cache.get_or_set(
+                'key', self.compute()))
+        get.assert_not_called()
+        self.assertEqual(1, self.cache.stats['local_hits'])
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+
+        def get():
+            results.append(self.cache.get_or_set(
+                'key', self.compute(duration=0.2)))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['value'] * 8, results)
+        self.assertEqual(1, self.calls)
+
+    def test_stale_value_is_served_while_refreshed(self):
+        self.cache.get_or_set('key', self.compute('old'), timeout=0.05,
+                              stale_timeout=60)
+        time.sleep(0.06)
+        version = self.cache.get_version('key')
+        self.assertTrue(self.cache.acquire(f'two_tier:key:{version}'))
+        self.assertEqual('old', self.cache.get_or_set(
+            'key', self.compute('new'), timeout=0.05, stale_timeout=60))
+        self.assertEqual(1, self.cache.stats['stale_hits'])
+        self.cache.release(f'two_tier:key:{version}')
+        self.assertEqual('new', self.cache.get_or_set(
+            'key', self.compute('new'), timeout=60))
+        self.assertEqual(1, self.cache.stats['refreshes'])
+
+    def test_expired_value_is_computed(self):
+        self.cache.get_or_set('key', self.compute('old'), timeout=0.05)
+        time.sleep(0.06)
+        self.assertEqual('new', self.cache.get_or_set('key',
+                                                      self.compute('new')))
+        self.assertEqual(2, self.cache.stats['misses'])
+
+    def test_slow_values_are_refreshed_early(self):
+        cache = TwoTierCache(alias='shared', beta=10 ** 7)
+        cache.get_or_set('key', self.compute('old', duration=0.01),
+                         timeout=1)
+        self.assertEqual('new', cache.get_or_set('key', self.compute('new')))
+        self.assertEqual(1, cache.stats['refreshes'])
+
+    def test_clear(self):
+        self.cache.get_or_set('key', self.compute('old'))
+        self.cache.clear()
+        self.assertEqual('new', self.cache.get_or_set('key',
+                                                      self.compute('new')))
+        self.assertEqual(0, self.cache.stats['local_hits'])
+
+    def test_decorator(self):
+        @cached('double:{0}', cache=self.cache)
+        def double(number):
+            self.calls += 1
+            return number * 2
+
+        self.assertEqual((4, 4, 6), (double(2), double(2), double(3)))
+        self.assertEqual(2, self.calls)
+        double.invalidate(2)
+        self.assertEqual(4, double(2))
+        self.assertEqual(3, self.calls)
+
+
+class LRUCacheTestCase(SimpleTestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        lru = LRUCache(max_entries=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((1, None, 3), (lru.get('a'), lru.get('b'),
+                                        lru.get('c')))
+
+
+class CacheStatsViewTestCase(APITestCase):
+
+    def test_stats_are_shown_to_admins(self):
+        url = reverse('cache-stats')
+        user = User.objects.create_user('test', 'test@mail.ua', '12345')
+        self.client.force_login(user)
+        self.assertEqual(status.HTTP_403_FORBIDDEN,
+                         self.client.get(url).status_code)
+        admin = User.objects.create_superuser('admin', 'admin@mail.ua', '1')
+        self.client.force_login(admin)
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('misses', response.data)
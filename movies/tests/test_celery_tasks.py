@@ -1,27 +1,72 @@
+from decimal import Decimal
 
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
-from movies.tasks import send_notification_email, upload_popular_movies
+
+from movies.models import MovieImdb
+from movies.tasks import send_notification_emails, add_movie_to_db
 
 
 class TestAddTask(APITestCase):
     def setUp(self):
-        data = [
-            {
-                'id': 1,
-                'movie': {'title': 'Test'},
-                'user': {'email': 'test'}
-            }
-        ]
-        self.task = send_notification_email.delay(data)
+        self.task = send_notification_emails.apply(('Test', ['test@mail.ua']))
         self.results = self.task.get()
 
     def test_task_state_send_email(self):
         self.assertEqual(self.task.state, 'SUCCESS')
 
     def test_result_send_email(self):
-        self.assertEqual(self.results, 'Emails were send')
+        self.assertEqual(self.results, 1)
+
+
+class AddMovieToDbTestCase(TestCase):
+
+    def get_results(self, amount, vote_count=10):
+        return {'results': [{'id': number, 'title': f'Movie{number}',
+                             'overview': 'Overview',
+                             'release_date': '2022-05-01',
+                             'vote_count': vote_count, 'vote_average': 7.5,
+                             'media_type': 'movie'}
+                            for number in range(1, amount + 1)]}
+
+    def test_movies_are_added_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            add_movie_to_db(self.get_results(2000))
+        self.assertEqual(2000, MovieImdb.objects.count())
+        selects = [query for query in queries
+                   if query['sql'].startswith('SELECT')]
+        self.assertEqual(4, len(selects))
+        # Inserts are split by the limit of query params of the database
+        self.assertLess(len(queries), 40)
+
+    def test_known_movies_are_updated(self):
+        add_movie_to_db(self.get_results(3))
+        MovieImdb.objects.filter(unique_id=1).update(title='Changed')
+        results = self.get_results(4, vote_count=20)
+        results['results'].append({'id': 5, 'media_type': 'tv'})
+        add_movie_to_db(results)
+        self.assertEqual(4, MovieImdb.objects.count())
+        self.assertEqual({20}, set(MovieImdb.objects
+                                   .values_list('vote_count', flat=True)))
+        movie = MovieImdb.objects.get(unique_id=1)
+        self.assertEqual(('Changed', Decimal('7.50')),
+                         (movie.title, movie.vote_average))
+
+    def test_same_movies_are_not_written_again(self):
+        add_movie_to_db(self.get_results(3))
+        with CaptureQueriesContext(connection) as queries:
+            add_movie_to_db(self.get_results(3))
+        self.assertEqual(3, MovieImdb.objects.count())
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith(('INSERT', 'UPDATE'))])
 
-    def test_upload_popular_movies(self):
-        results = upload_popular_movies.apply()
-        self.assertEqual(results.get(), True)
-        self.assertEqual(results.state, 'SUCCESS')
+    def test_missing_release_date_is_not_invented(self):
+        results = self.get_results(2)
+        results['results'][0]['release_date'] = ''
+        del results['results'][1]['release_date']
+        add_movie_to_db(results)
+        self.assertEqual([None, None], list(MovieImdb.objects
+                                            .values_list('release_date',
+                                                         flat=True)))
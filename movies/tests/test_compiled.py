@@ -0,0 +1,110 @@
+import io
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import models
+from django.db.models.functions import NullIf
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from movies.compiled import compile_serializer
+from movies.models import Category, Movie, Actor, Genre, Director
+from movies.serializers import CategorySerializer, ActorSerializer, \
+    GenreSerializer, MovieListSerializer, DirectorSerializer, \
+    MovieDetailSerializer
+
+
+class CompiledSerializerTestCase(TestCase):
+
+    def setUp(self):
+        self.category_1 = Category.objects\
+            .create(name='Film', description='First Cat', url='film')
+        self.actor_1 = Actor.objects\
+            .create(name='Джейсон Стетхем', age=40, description='Описание')
+        self.actor_2 = Actor.objects\
+            .create(name='Актер "2"', age=42, description='Описание\n')
+        self.director_1 = Director.objects.create(name='Director1', age=40)
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.genre_2 = Genre.objects\
+            .create(name='Horror', description='Horror', url='horror')
+
+        self.movie_1 = Movie.objects.create(title='Test',
+                                            description='Test',
+                                            world_premier='2022-04-28',
+                                            year=2019, country='USA', budget=100,
+                                            fees_is_usa=150, fees_in_world=200,
+                                            category=self.category_1,
+                                            url='test')
+        self.movie_2 = Movie.objects.create(title='ForsazhS',
+                                            description='ForsazhS',
+                                            year=2019, country='USA',
+                                            url='forsazhs')
+        self.movie_1.directors.add(self.director_1)
+        self.movie_1.actors.add(self.actor_1, self.actor_2)
+        self.movie_1.genres.add(self.genre_2, self.genre_1)
+        Movie.objects.filter(pk=self.movie_1.pk)\
+            .update(rating_count=2, rating_sum=7)
+
+    def assertSameOutput(self, serializer_class, queryset):
+        compiled = compile_serializer(serializer_class)
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(serializer_class(queryset, many=True).data),
+            renderer.render(compiled.serialize(compiled.values(queryset))))
+
+    def test_reference_serializers(self):
+        self.assertSameOutput(CategorySerializer, Category.objects.all())
+        self.assertSameOutput(ActorSerializer, Actor.objects.all())
+        self.assertSameOutput(DirectorSerializer, Director.objects.all())
+        self.assertSameOutput(GenreSerializer, Genre.objects.all())
+
+    def test_movie_list_serializer(self):
+        movies = Movie.objects.annotate(
+            rating_user=models.Value(True, output_field=models.BooleanField()),
+            middle_star=models.F('rating_sum') / NullIf(
+                models.F('rating_count'), 0))
+        self.assertSameOutput(MovieListSerializer, movies)
+
+    def test_movie_list_serializer_skips_missing_annotations(self):
+        compiled = compile_serializer(MovieListSerializer)
+        data = compiled.serialize(compiled.values(Movie.objects.all()))
+        self.assertNotIn('rating_user', data[0])
+        self.assertNotIn('middle_star', data[0])
+        self.assertSameOutput(MovieListSerializer, Movie.objects.all())
+
+    def test_serializer_is_compiled_once(self):
+        self.assertIs(compile_serializer(ActorSerializer),
+                      compile_serializer(ActorSerializer))
+
+    def test_unsupported_serializer(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(MovieDetailSerializer)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_serializers', rows=20, repeat=1, stdout=out)
+        self.assertIn('times faster on 20 rows', out.getvalue())
+        self.assertEqual(2, Movie.objects.count())
+
+
+class CompiledListTestCase(APITestCase):
+
+    def test_actor_list(self):
+        Actor.objects.create(name='Actor1', age=40, description='Описание')
+        Actor.objects.create(name='Actor2', age=42, description='Описание')
+        response = self.client.get(reverse('actor-list'))
+        self.assertEqual(
+            ActorSerializer(Actor.objects.all(), many=True).data,
+            response.data['results'])
+
+    def test_category_list_page(self):
+        Category.objects.create(name='Film', description='Film', url='film')
+        Category.objects.create(name='Serial', description='Serial',
+                                url='serial')
+        response = self.client.get(reverse('category-list') + '?limit=1')
+        self.assertEqual(
+            CategorySerializer(Category.objects.all()[:1], many=True).data,
+            response.data['results'])
@@ -0,0 +1,159 @@
+import gzip
+import json
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.compression import choose_encoding, compress_variants, brotli
+from movies.models import Actor, Movie, Rating, RatingStar
+
+
+class ChooseEncodingTestCase(SimpleTestCase):
+
+    def test_choose_encoding(self):
+        encodings = ('identity', 'gzip', 'br')
+        cases = [
+            ('', 'identity'),
+            ('gzip, deflate', 'gzip'),
+            ('gzip, deflate, br', 'br'),
+            ('gzip;q=1.0, br;q=0.5', 'gzip'),
+            ('GZIP; q=0.8, br;q=0', 'gzip'),
+            ('*', 'br'),
+            ('*, br;q=0', 'gzip'),
+            ('gzip;q=0, deflate', 'identity'),
+            ('gzip;q=abc', 'identity'),
+        ]
+        for header, expected in cases:
+            self.assertEqual(expected, choose_encoding(header, encodings),
+                             header)
+        self.assertEqual('identity', choose_encoding('br', ('identity', )))
+
+    def test_compress_variants(self):
+        self.assertEqual({'identity': b'{}'}, compress_variants(b'{}'))
+        content = json.dumps([{'id': number, 'title': 'Movie'}
+                              for number in range(100)]).encode()
+        variants = compress_variants(content)
+        self.assertEqual(content, gzip.decompress(variants['gzip']))
+        self.assertEqual(variants['gzip'], compress_variants(content)['gzip'])
+        self.assertEqual(brotli is not None, 'br' in variants)
+
+
+class CompressedResponseTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.actor = Actor.objects.create(name='Actor1', age=40,
+                                          description='Описание ' * 50)
+        for number in range(5):
+            movie = Movie.objects.create(
+                title=f'Forsazh{number}', description='Forsazh ' * 20,
+                year=2019, country='USA', url=f'forsazh{number}')
+            movie.actors.add(self.actor)
+        self.movie = movie
+
+    def get(self, url, **headers):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate',
+                               **headers)
+
+    def assertCompressed(self, response, expected):
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('Accept', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(expected,
+                         json.loads(gzip.decompress(response.content)))
+
+    def test_responses_are_compressed_once(self):
+        urls = [reverse('movie-list'), reverse('actor-list'),
+                reverse('movie-detail', args=(self.movie.id, )),
+                reverse('actor-detail', args=(self.actor.id, ))]
+        for url in urls:
+            expected = self.client.get(url).json()
+            with mock.patch('movies.compression.gzip.compress',
+                            wraps=gzip.compress) as compress:
+                self.assertCompressed(self.get(url), expected)
+                self.assertCompressed(self.get(url), expected)
+            compress.assert_not_called()
+
+            cache.clear()
+            with mock.patch('movies.compression.gzip.compress',
+                            wraps=gzip.compress) as compress:
+                self.assertCompressed(self.get(url), expected)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertCompressed(self.get(url), expected)
+            compress.assert_called_once()
+            self.assertLessEqual(len(queries), 1)
+
+    def test_identity_is_served_to_other_clients(self):
+        url = reverse('movie-list')
+        compressed = self.get(url)
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(compressed['ETag'][2:], response['ETag'])
+        self.assertEqual(gzip.decompress(compressed.content),
+                         response.content)
+
+    def test_weak_tag_is_not_modified(self):
+        url = reverse('movie-detail', args=(self.movie.id, ))
+        response = self.get(url)
+        response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_not_modified_varies_by_encoding(self):
+        url = reverse('movie-list')
+        response = self.get(url)
+        response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_lists_with_rated_movies_are_not_cached(self):
+        url = reverse('movie-list')
+        with self.captureOnCommitCallbacks(execute=True):
+            star = RatingStar.objects.create(value=5)
+        Rating.objects.create(ip='127.0.0.1', star=star, movie=self.movie)
+        with mock.patch('movies.compression.cache.set') as cache_set:
+            expected = self.client.get(url).json()
+            self.assertCompressed(self.get(url), expected)
+            self.assertCompressed(self.get(url), expected)
+        keys = [call.args[0] for call in cache_set.call_args_list]
+        self.assertFalse([key for key in keys
+                          if key.startswith('compressed_response:')])
+        rated = [movie for movie in expected['results']
+                 if movie['rating_user']]
+        self.assertEqual([self.movie.id], [movie['id'] for movie in rated])
+
+    def test_changes_are_served(self):
+        url = reverse('movie-detail', args=(self.movie.id, ))
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = 'Forsazh_updated'
+            self.movie.save()
+        response = self.get(url)
+        self.assertEqual('Forsazh_updated',
+                         json.loads(gzip.decompress(response.content))
+                         ['title'])
+
+    def test_browsable_api_is_not_cached(self):
+        url = reverse('movie-list') + '?format=api'
+        response = self.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        url = reverse('movie-list')
+        expected = self.client.get(url).json()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual('br', response['Content-Encoding'])
+        self.assertEqual(expected,
+                         json.loads(brotli.decompress(response.content)))
@@ -0,0 +1,151 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.cache import get_two_tier_cache
+from movies.models import Actor, Category, Movie, Rating, RatingStar, Review
+
+
+class ConditionalGetTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_two_tier_cache().clear()
+        self.category = Category.objects\
+            .create(name='Film', description='First Cat', url='film')
+        self.actor = Actor.objects.create(name='Actor1', age=40,
+                                          description='Описание')
+        self.star = RatingStar.objects.create(value=1)
+        self.movie = Movie.objects\
+            .create(title='Forsazh1', description='Forsazh1', year=2019,
+                    country='USA', category=self.category, url='forsazh1')
+        self.movie.actors.add(self.actor)
+
+    def get(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def assertNotModified(self, url, queries=0, **headers):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.get(url, **headers)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(queries, len(captured))
+        self.assertEqual(b'', response.content)
+
+    def test_detail_not_modified(self):
+        url = reverse('movie-detail', args=(self.movie.id, ))
+        response = self.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotIn('updated_at', response.data)
+        self.assertNotModified(url, 1, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertNotModified(
+            url, 1, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        response = self.get(url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_detail_validators_follow_changes(self):
+        url = reverse('movie-detail', args=(self.movie.id, ))
+        changes = [
+            lambda: Actor.objects.filter(pk=self.actor.pk).first().save(),
+            lambda: self.category.save(),
+            lambda: Review.objects.create(email='a@a.ua', name='Name',
+                                          text='Text', movie=self.movie),
+            lambda: Rating.objects.create(ip='1.1.1.1', star=self.star,
+                                          movie=self.movie),
+            lambda: self.movie.actors.clear(),
+        ]
+        etag = self.get(url)['ETag']
+        for change in changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotEqual(etag, response['ETag'])
+            etag = response['ETag']
+
+    def test_missing_detail(self):
+        url = reverse('movie-detail', args=(self.movie.id + 100, ))
+        response = self.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_list_not_modified(self):
+        url = reverse('movie-list') + '?year_min=2000'
+        response = self.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        other = self.get(reverse('movie-list') + '?year_min=2001',
+                         HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, other.status_code)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = 'Forsazh_updated'
+            self.movie.save()
+        response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('Forsazh_updated',
+                         response.json()['results'][0]['title'])
+
+    def test_list_tag_follows_votes_of_client(self):
+        url = reverse('movie-list')
+        etag = self.get(url)['ETag']
+        self.client.force_login(User.objects.create_user('test', 'test@mail.ua',
+                                                         '12345'))
+        response = self.client.post('/api/v1/add_rating/',
+                                    {'star': self.star.id,
+                                     'movie': self.movie.id})
+        self.assertIn(response.status_code,
+                      (status.HTTP_201_CREATED, status.HTTP_202_ACCEPTED))
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.json()['results'][0]['rating_user'])
+
+    def test_reference_list_not_modified(self):
+        etags = {}
+        for url in (reverse('category-list'),
+                    reverse('category-detail', args=(self.category.id, ))):
+            etags[url] = self.get(url)['ETag']
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=etags[url])
+        self.assertEqual(2, len(set(etags.values())))
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Serial', description='Second Cat',
+                                    url='serial')
+        response = self.get(reverse('category-list'),
+                            HTTP_IF_NONE_MATCH=etags[reverse('category-list')])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, response.data['count'])
+
+    def test_reviews_touch_movie_once_after_commit(self):
+        with CaptureQueriesContext(connection) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                for number in range(3):
+                    Review.objects.create(email='a@a.ua', name='Name',
+                                          text=f'Text{number}',
+                                          movie=self.movie)
+        self.assertEqual(1, len([query for query in captured
+                                 if 'SET "updated_at"' in query['sql']]))
+
+    def test_deleted_movie_is_not_touched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(email='a@a.ua', name='Name', text='Text',
+                                  movie=self.movie)
+        with CaptureQueriesContext(connection) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.movie.delete()
+        self.assertFalse([query for query in captured
+                          if 'SET "updated_at"' in query['sql']])
+
+    def test_touches_of_rolled_back_transaction_are_dropped(self):
+        with CaptureQueriesContext(connection) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(ValueError), transaction.atomic():
+                    Review.objects.create(email='a@a.ua', name='Name',
+                                          text='Text', movie=self.movie)
+                    raise ValueError
+                Review.objects.create(email='a@a.ua', name='Name',
+                                      text='Text', movie=self.movie)
+        self.assertEqual(1, len([query for query in captured
+                                 if 'SET "updated_at"' in query['sql']]))
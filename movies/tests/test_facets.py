@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.models import Movie, Genre, Category, Director
+
+
+class FacetsTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category_1 = Category.objects\
+            .create(name='Film', description='First Cat', url='film')
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.genre_2 = Genre.objects\
+            .create(name='Horror', description='Horror', url='horror')
+        self.director_1 = Director.objects.create(name='Director1', age=40)
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh', category=self.category_1)
+        self.movie_2 = Movie.objects\
+            .create(title='Drive', description='Drive', year=2011,
+                    country='USA', url='drive')
+        self.movie_3 = Movie.objects\
+            .create(title='Брат', description='Брат', year=1997,
+                    country='Russia', url='brat', category=self.category_1)
+        self.movie_1.genres.add(self.genre_1, self.genre_2)
+        self.movie_2.genres.add(self.genre_1)
+        self.movie_1.directors.add(self.director_1)
+
+    def get_facets(self, params=''):
+        response = self.client.get(reverse('movie-facets') + params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_facets_of_catalog(self):
+        data = self.get_facets()
+        self.assertEqual(3, data['count'])
+        self.assertEqual([{'id': self.genre_1.id, 'name': 'Adventure',
+                           'count': 2},
+                          {'id': self.genre_2.id, 'name': 'Horror',
+                           'count': 1}], data['genres'])
+        self.assertEqual([{'id': self.category_1.id, 'name': 'Film',
+                           'count': 2}], data['categories'])
+        self.assertEqual([{'id': self.director_1.id, 'name': 'Director1',
+                           'count': 1}], data['directors'])
+        self.assertEqual([{'name': 'USA', 'count': 2},
+                          {'name': 'Russia', 'count': 1}], data['countries'])
+        self.assertEqual([{'from': 1990, 'to': 1999, 'count': 1},
+                          {'from': 2000, 'to': 2009, 'count': 1},
+                          {'from': 2010, 'to': 2019, 'count': 1}],
+                         data['years'])
+
+    def test_facets_of_selection(self):
+        data = self.get_facets('?genres=Adventure&year_min=2005')
+        self.assertEqual(1, data['count'])
+        self.assertEqual([self.genre_1.id],
+                         [genre['id'] for genre in data['genres']])
+        self.assertEqual([], data['categories'])
+        self.assertEqual([{'from': 2010, 'to': 2019, 'count': 1}],
+                         data['years'])
+
+    def test_facets_with_not_indexed_filter(self):
+        data = self.get_facets('?title=Forsazh,Drive&genres=Horror')
+        self.assertEqual(1, data['count'])
+        self.assertEqual({self.genre_1.id, self.genre_2.id},
+                         {genre['id'] for genre in data['genres']})
+
+    def test_facets_are_cached(self):
+        self.get_facets('?genres=Horror')
+        with CaptureQueriesContext(connection) as queries:
+            self.get_facets('?genres=Horror')
+        self.assertEqual(0, len(queries))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_2.genres.add(self.genre_2)
+        self.assertEqual(2, self.get_facets('?genres=Horror')['count'])
@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from movies.filters import MovieFilter, ActorBasedMovie
+from movies.models import Movie, Actor, Genre
+from movies.movie_index import MovieIndex
+
+
+class RelatedExistsFilterTestCase(TestCase):
+
+    def setUp(self):
+        self.genres = [Genre.objects.create(name=name, description=name,
+                                            url=name.lower())
+                       for name in ('Adventure', 'Horror', 'Comedy')]
+        self.actor_1 = Actor.objects.create(name='Джейсон Стетхем', age=40,
+                                            description='Описание')
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        self.movie_2 = Movie.objects\
+            .create(title='Drive', description='Drive', year=2011,
+                    country='USA', url='drive')
+        self.movie_1.genres.add(*self.genres)
+        self.movie_2.genres.add(self.genres[0])
+        self.movie_1.actors.add(self.actor_1)
+        self.movie_2.actors.add(self.actor_1)
+
+    def filter_movies(self, query):
+        return MovieFilter(QueryDict(query), Movie.objects.all()).qs
+
+    def test_sql_uses_exists_without_joins(self):
+        sql = str(self.filter_movies('genres=Adventure,Horror&actors=A').query)
+        self.assertEqual(2, sql.count('EXISTS'))
+        self.assertNotIn('DISTINCT', sql)
+        outer = sql.split('EXISTS')[0]
+        self.assertNotIn('JOIN', outer)
+
+    def test_count_is_not_inflated(self):
+        movies = self.filter_movies('genres=Adventure,Horror,Comedy')
+        self.assertEqual(2, movies.count())
+        self.assertEqual({self.movie_1.id, self.movie_2.id},
+                         set(movies.values_list('id', flat=True)))
+
+    def test_match_all(self):
+        movies = self.filter_movies('genres=Adventure,Horror&match=all')
+        self.assertEqual(2, str(movies.query).count('EXISTS'))
+        self.assertEqual([self.movie_1.id],
+                         list(movies.values_list('id', flat=True)))
+        self.assertEqual(2, self.filter_movies('genres=Adventure,Adventure'
+                                               '&match=all').count())
+
+    def test_match_all_in_index(self):
+        index = MovieIndex.build()
+        self.assertEqual([self.movie_1.id], list(index.select(
+            QueryDict('genres=Adventure,Horror&match=all'))))
+        self.assertEqual(2, len(index.select(
+            QueryDict('genres=Adventure,Horror&match=any'))))
+        self.assertIsNone(index.select(QueryDict('match=some')))
+
+    def test_actor_filter_uses_exists(self):
+        actors = ActorBasedMovie(QueryDict('title=Forsazh,Drive'),
+                                 Actor.objects.all()).qs
+        self.assertIn('EXISTS', str(actors.query))
+        self.assertEqual(1, actors.count())
+
+
+class MovieFilterApiTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.genre_2 = Genre.objects\
+            .create(name='Horror', description='Horror', url='horror')
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        self.movie_1.genres.add(self.genre_1, self.genre_2)
+
+    def test_filtered_count_in_database(self):
+        url = reverse('movie-list') + '?title=Forsazh&genres=Adventure,Horror'
+        response = self.client.get(url)
+        self.assertEqual(1, response.data['count'])
+        self.assertEqual(1, len(response.data['results']))
+
+    def test_invalid_match(self):
+        response = self.client.get(reverse('movie-list') + '?match=some')
+        self.assertEqual(400, response.status_code)
@@ -0,0 +1,172 @@
+import threading
+import time
+from array import array
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.cache import get_two_tier_cache
+from movies.models import Movie, Actor, Genre, Director, Rating, RatingStar
+from movies.movie_index import MovieIndex, SharedMovieIndex, intersect, \
+    movie_index, bump_movie_index_version
+
+
+class MovieIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.genre_2 = Genre.objects\
+            .create(name='Horror', description='Horror', url='horror')
+        self.actor_1 = Actor.objects.create(name='Джейсон Стетхем', age=40,
+                                            description='Описание')
+        self.director_1 = Director.objects.create(name='Director1', age=40)
+        self.movies = []
+        for number in range(12):
+            movie = Movie.objects\
+                .create(title=f'Forsazh{number}', description='Forsazh',
+                        year=2000 + number, country='USA',
+                        url=f'forsazh{number}')
+            if number % 2:
+                movie.genres.add(self.genre_1)
+            if number % 3:
+                movie.genres.add(self.genre_2)
+            if number % 4 == 0:
+                movie.actors.add(self.actor_1)
+                movie.directors.add(self.director_1)
+            self.movies.append(movie)
+        self.index = MovieIndex.build()
+
+    def select(self, query):
+        movie_ids = self.index.select(QueryDict(query))
+        return None if movie_ids is None else list(movie_ids)
+
+    def filter(self, **lookups):
+        return sorted(set(Movie.objects.filter(**lookups)
+                          .values_list('id', flat=True)))
+
+    def test_select(self):
+        self.assertEqual(self.filter(), self.select(''))
+        self.assertEqual(self.filter(genres__name='Adventure'),
+                         self.select('genres=Adventure'))
+        self.assertEqual(self.filter(genres__name__in=['Adventure', 'Horror']),
+                         self.select('genres=Adventure,Horror'))
+        self.assertEqual(
+            self.filter(genres__name='Horror', actors__name='Джейсон Стетхем',
+                        year__gte=2003, year__lte=2010),
+            self.select('genres=Horror&actors=Джейсон Стетхем&year_min=2003'
+                        '&year_max=2010'))
+        self.assertEqual(self.filter(directors=self.director_1, year__gte=2005),
+                         self.select('directors=Director1&year_min=2005'))
+        self.assertEqual([], self.select('genres=Comedy'))
+
+    def test_select_falls_back_for_not_indexed_filters(self):
+        self.assertIsNone(self.select('title=Forsazh1'))
+        self.assertIsNone(self.select('year_min=abc'))
+        self.assertEqual(self.filter(), self.select('title=&limit=5'))
+
+    def test_intersect(self):
+        big = array('q', range(0, 1000, 2))
+        self.assertEqual([4, 10], list(intersect(array('q', [3, 4, 10]), big)))
+        self.assertEqual(list(range(0, 100, 6)),
+                         list(intersect(array('q', range(0, 100, 3)),
+                                        array('q', range(0, 100, 2)))))
+
+
+class SharedMovieIndexTestCase(SimpleTestCase):
+
+    def test_outdated_index_is_served_while_built(self):
+        cache.clear()
+        shared = SharedMovieIndex()
+        old, new = object(), object()
+        started, release = threading.Event(), threading.Event()
+
+        def build():
+            if shared.index is None:
+                return old
+            started.set()
+            release.wait(5)
+            return new
+
+        with mock.patch('movies.movie_index.MovieIndex.build',
+                        side_effect=build) as built:
+            self.assertIs(old, shared.get())
+            bump_movie_index_version()
+            self.assertIs(old, shared.get())
+            self.assertTrue(started.wait(5))
+            self.assertIs(old, shared.get())
+            release.set()
+            deadline = time.monotonic() + 5
+            while shared.index is not new and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertIs(new, shared.get())
+        self.assertEqual(2, built.call_count)
+
+
+class IndexedMovieListTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_two_tier_cache().clear()
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.genre_2 = Genre.objects\
+            .create(name='Horror', description='Horror', url='horror')
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        self.movie_2 = Movie.objects\
+            .create(title='Drive', description='Drive', year=2011,
+                    country='USA', url='drive')
+        self.movie_1.genres.add(self.genre_1, self.genre_2)
+
+    def test_filtered_list_is_not_duplicated(self):
+        url = reverse('movie-list') + '?genres=Adventure,Horror'
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, response.data['count'])
+        self.assertEqual([self.movie_1.id],
+                         [movie['id'] for movie in response.data['results']])
+
+    def test_filtered_list_does_not_query_database(self):
+        self.client.get(reverse('movie-list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('movie-list') + '?genres=Horror')
+        self.assertEqual(1, response.data['count'])
+        self.assertEqual(0, len(queries))
+
+    def test_index_is_rebuilt_after_changes(self):
+        url = reverse('movie-list') + '?genres=Horror'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_2.genres.add(self.genre_2)
+        response = self.client.get(url)
+        self.assertEqual(2, response.data['count'])
+
+    def test_rating_does_not_rebuild_index(self):
+        index = movie_index.get()
+        star = RatingStar.objects.create(value=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(ip='1.1.1.1', star=star, movie=self.movie_1)
+        self.assertIs(index, movie_index.get())
+
+    def test_not_indexed_fields_do_not_rebuild_index(self):
+        index = movie_index.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_1.description = 'Forsazh 2'
+            self.movie_1.save()
+            self.genre_1.description = 'Adventures'
+            self.genre_1.save()
+        self.assertIs(index, movie_index.get())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_2.year = 2012
+            self.movie_2.save()
+        self.assertIsNot(index, movie_index.get())
@@ -0,0 +1,217 @@
+import socketserver
+import threading
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_movie.celery import app
+from movies.models import Movie, UserWishes, OutboxMessage
+from movies.tasks import notify_subscribers, send_notification_email, \
+    send_notification_emails, schedule_subscribers_notification
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 sink')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode()
+            command = line.strip().upper()
+            if not line or command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 sink')
+            elif command.startswith('MAIL'):
+                recipients = []
+                self.reply('250 OK')
+            elif command.startswith('RCPT'):
+                recipient = line.split(':', 1)[1].strip().strip('<>')
+                if recipient in server.refused:
+                    self.reply('550 No such user')
+                    continue
+                recipients.append(recipient)
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.recipients.extend(recipients)
+                self.reply('250 OK')
+            elif command in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Not implemented')
+
+
+class NotificationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        self.movie_2 = Movie.objects\
+            .create(title='Drive', description='Drive', year=2011,
+                    country='USA', url='drive')
+        for number in range(5):
+            user = User.objects.create_user(f'user{number}',
+                                            f'user{number}@mail.ua', '12345')
+            UserWishes.objects.create(user=user, movie=self.movie_1)
+        user = User.objects.create_user('empty', '', '12345')
+        UserWishes.objects.create(user=user, movie=self.movie_1)
+        UserWishes.objects.create(user=user, movie=self.movie_2)
+
+    @override_settings(NOTIFICATION_CHUNK_SIZE=2)
+    def test_subscribers_are_notified_in_chunks(self):
+        self.assertEqual(3, notify_subscribers(self.movie_1.id))
+        self.assertEqual([f'user{number}@mail.ua' for number in range(5)],
+                         [message.to[0] for message in mail.outbox])
+        self.assertIn('"Forsazh"', mail.outbox[0].body)
+
+    def test_movie_without_subscribers(self):
+        self.assertEqual(0, notify_subscribers(self.movie_2.id))
+        self.assertEqual(0, notify_subscribers(0))
+        self.assertEqual([], mail.outbox)
+
+    @override_settings(NOTIFICATION_DELAY=120)
+    def test_updates_are_coalesced(self):
+        for movie_id in (self.movie_1.id, self.movie_1.id, self.movie_2.id):
+            schedule_subscribers_notification(movie_id)
+        messages = OutboxMessage.objects.order_by('id')
+        self.assertEqual([[self.movie_1.id], [self.movie_2.id]],
+                         [message.args for message in messages])
+        self.assertEqual({notify_subscribers.name},
+                         {message.task for message in messages})
+        delay = messages[0].available_at - timezone.now()
+        self.assertTrue(110 < delay.total_seconds() <= 120)
+
+    def start_smtp_server(self, refused=()):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0),
+                                                 SMTPSinkHandler)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.connections = 0
+        server.recipients = []
+        server.refused = set(refused)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def smtp_settings(self, server):
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='')
+
+    def test_chunk_is_sent_over_one_connection(self):
+        server = self.start_smtp_server()
+        emails = [f'user{number}@mail.ua' for number in range(5)]
+        with self.smtp_settings(server):
+            self.assertEqual(5, send_notification_emails('Forsazh', emails))
+        self.assertEqual(1, server.connections)
+        self.assertEqual(emails, server.recipients)
+
+    def test_refused_recipient_is_skipped(self):
+        server = self.start_smtp_server(refused={'user1@mail.ua'})
+        emails = [f'user{number}@mail.ua' for number in range(3)]
+        with self.smtp_settings(server), \
+                self.assertLogs('movies.tasks', 'WARNING'):
+            self.assertEqual(2, send_notification_emails('Forsazh', emails))
+        self.assertEqual(['user0@mail.ua', 'user2@mail.ua'],
+                         server.recipients)
+
+    def test_rest_of_chunk_is_retried(self):
+        emails = [f'user{number}@mail.ua' for number in range(4)]
+        send_messages = mail.backends.locmem.EmailBackend.send_messages
+        calls = []
+
+        def disconnect_once(backend, messages):
+            calls.append(messages[0].to[0])
+            if len(calls) == 3:
+                raise SMTPServerDisconnected()
+            return send_messages(backend, messages)
+
+        with mock.patch.object(mail.backends.locmem.EmailBackend,
+                               'send_messages', disconnect_once):
+            send_notification_emails.delay('Forsazh', emails)
+        self.assertEqual(emails, [message.to[0] for message in mail.outbox])
+        self.assertEqual(emails[:3] + emails[2:], calls)
+
+    def test_deprecated_task_sends_emails(self):
+        list_films = [{'movie': {'title': 'Forsazh'},
+                       'user': {'email': 'user0@mail.ua'}},
+                      {'movie': {'title': 'Drive'},
+                       'user': {'email': 'user1@mail.ua'}},
+                      {'movie': {'title': 'Forsazh'},
+                       'user': {'email': 'user2@mail.ua'}}]
+        with self.assertWarns(DeprecationWarning):
+            self.assertEqual(2, send_notification_email(list_films))
+        self.assertEqual([['user0@mail.ua'], ['user2@mail.ua'],
+                          ['user1@mail.ua']],
+                         [message.to for message in mail.outbox])
+        self.assertIn('"Drive"', mail.outbox[2].body)
+
+
+class MovieUpdateNotificationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        self.user_1 = User.objects.create_user('test', 'test@mail.ua', '12345')
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        UserWishes.objects.create(user=self.user_1, movie=self.movie_1)
+
+    def test_update_enqueues_only_movie_id(self):
+        url = reverse('movie-detail', args=(self.movie_1.id, ))
+        self.client.force_login(self.user_1)
+        response = self.client.patch(url, data={'title': 'Forsazh_updated'},
+                                     format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([], mail.outbox)
+        message = OutboxMessage.objects.get()
+        self.assertEqual([self.movie_1.id], message.args)
+        notify_subscribers(*message.args)
+        self.assertEqual(['test@mail.ua'],
+                         [message.to[0] for message in mail.outbox])
+        self.assertIn('"Forsazh_updated"', mail.outbox[0].body)
+
+    def test_repeated_updates_send_one_notification(self):
+        url = reverse('movie-detail', args=(self.movie_1.id, ))
+        self.client.force_login(self.user_1)
+        for title in ('Forsazh_1', 'Forsazh_2', 'Forsazh_3'):
+            self.client.patch(url, data={'title': title}, format='json')
+        message = OutboxMessage.objects.get()
+        notify_subscribers(*message.args)
+        self.assertEqual(1, len(mail.outbox))
+        self.assertIn('"Forsazh_3"', mail.outbox[0].body)
+
+    def test_failed_update_enqueues_nothing(self):
+        url = reverse('movie-detail', args=(self.movie_1.id, ))
+        self.client.force_login(self.user_1)
+        response = self.client.patch(url, data={'year': 'abc'}, format='json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(OutboxMessage.objects.exists())
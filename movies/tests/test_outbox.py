@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from django_movie.celery import app
+from movies.models import OutboxMessage
+from movies.outbox import enqueue_task, relay_outbox
+
+
+class OutboxTestCase(TestCase):
+
+    def setUp(self):
+        send_task = mock.patch.object(app, 'send_task')
+        producer = mock.patch.object(app, 'producer_or_acquire')
+        self.send_task = send_task.start()
+        self.producer = producer.start()
+        self.addCleanup(send_task.stop)
+        self.addCleanup(producer.stop)
+
+    def test_messages_are_deduplicated(self):
+        enqueue_task('movies.tasks.notify_subscribers', [1], dedup_key='1')
+        enqueue_task('movies.tasks.notify_subscribers', [1], dedup_key='1')
+        enqueue_task('movies.tasks.upload_popular_movies')
+        enqueue_task('movies.tasks.upload_popular_movies')
+        self.assertEqual(3, OutboxMessage.objects.count())
+
+    def test_rolled_back_messages_are_not_kept(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            enqueue_task('movies.tasks.notify_subscribers', [1])
+            raise ValueError
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_available_messages_are_published_in_batches(self):
+        for movie_id in range(5):
+            enqueue_task('movies.tasks.notify_subscribers', [movie_id],
+                         dedup_key=str(movie_id))
+        enqueue_task('movies.tasks.notify_subscribers', [9], delay=60)
+        self.assertEqual(5, relay_outbox(batch_size=2))
+        self.assertEqual(3, self.producer.call_count)
+        producer = self.producer.return_value.__enter__.return_value
+        self.send_task.assert_any_call('movies.tasks.notify_subscribers',
+                                       args=[0], producer=producer)
+        self.assertEqual(5, self.send_task.call_count)
+        self.assertEqual([[9]], [message.args for message
+                                 in OutboxMessage.objects.all()])
+        enqueue_task('movies.tasks.notify_subscribers', [0], dedup_key='0')
+        self.assertEqual(2, OutboxMessage.objects.count())
+
+    def test_messages_are_kept_when_broker_fails(self):
+        enqueue_task('movies.tasks.notify_subscribers', [1])
+        self.send_task.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            relay_outbox(batch_size=10)
+        self.assertEqual(1, OutboxMessage.objects.count())
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.models import Movie, Actor, Genre
+
+
+class PaginationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.actor_1 = Actor.objects.create(name='Джейсо Стетхем', age=40,
+                                            description='Описание')
+        for number in range(25):
+            movie = Movie.objects\
+                .create(title=f'Forsazh{number}', description='Forsazh',
+                        year=2000 + number, country='USA',
+                        url=f'forsazh{number}')
+            if number % 2:
+                movie.genres.add(self.genre_1)
+                movie.actors.add(self.actor_1)
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotIn('count', response.data)
+            ids.extend(movie['id'] for movie in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_movie_cursor_pagination(self):
+        url = reverse('movie-list') + '?pagination=cursor'
+        ids = self.collect_pages(url)
+        self.assertEqual(list(Movie.objects.order_by('id')
+                              .values_list('id', flat=True)), ids)
+
+    def test_movie_cursor_pagination_with_filter(self):
+        url = reverse('movie-list') + '?pagination=cursor&limit=5&genres='
+        url += self.genre_1.name
+        ids = self.collect_pages(url)
+        self.assertEqual(list(Movie.objects.filter(genres=self.genre_1)
+                              .order_by('id').values_list('id', flat=True)),
+                         ids)
+
+    def test_movie_cursor_pagination_does_not_count(self):
+        url = reverse('movie-list') + '?pagination=cursor'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql']])
+
+    def test_actor_cursor_pagination_with_filter(self):
+        Actor.objects.create(name='Actor', age=30, description='Actor')
+        url = reverse('actor-list') + '?pagination=cursor&title=Forsazh1'
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.actor_1.id],
+                         [actor['id'] for actor in response.data['results']])
+
+    def test_limit_offset_without_count(self):
+        url = reverse('movie-list') + '?count=false&limit=10'
+        with CaptureQueriesContext(connection) as queries:
+            ids = self.collect_pages(url)
+        self.assertEqual(25, len(set(ids)))
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql']])
+
+    def test_limit_offset_with_count(self):
+        response = self.client.get(reverse('movie-list') + '?limit=10')
+        self.assertEqual(25, response.data['count'])
+        self.assertEqual(10, len(response.data['results']))
@@ -0,0 +1,176 @@
+from unittest import mock
+
+from kombu.exceptions import OperationalError
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, DatabaseError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.cache import get_two_tier_cache
+from movies.models import Movie, Rating, RatingStar
+from movies.rating_buffer import LocalRatingBuffer, RatingBuffer, \
+    RedisRatingBuffer, get_rating_buffer
+from movies.utils import get_star_values
+
+
+class LocalRatingBufferTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_two_tier_cache().clear()
+        self.star_1 = RatingStar.objects.create(value=1)
+        self.star_5 = RatingStar.objects.create(value=5)
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        self.movie_2 = Movie.objects\
+            .create(title='Drive', description='Drive', year=2011,
+                    country='USA', url='drive')
+        self.buffer = LocalRatingBuffer(max_size=3, max_delay=60)
+
+    def test_votes_are_coalesced(self):
+        self.assertEqual(1, self.buffer.add('1.1.1.1', self.movie_1.id,
+                                            self.star_1.id))
+        self.assertEqual(1, self.buffer.add('1.1.1.1', self.movie_1.id,
+                                            self.star_5.id))
+        self.assertEqual(2, self.buffer.add('2.1.1.1', self.movie_1.id,
+                                            self.star_1.id))
+        self.assertEqual({('1.1.1.1', self.movie_1.id): self.star_5.id,
+                          ('2.1.1.1', self.movie_1.id): self.star_1.id},
+                         self.buffer.drain())
+        self.assertEqual({}, self.buffer.drain())
+
+    def test_full_buffer_refuses_votes(self):
+        for number in range(3):
+            self.buffer.add(f'{number}.1.1.1', self.movie_1.id, self.star_1.id)
+        self.assertIsNone(self.buffer.add('9.1.1.1', self.movie_1.id,
+                                          self.star_1.id))
+        self.assertEqual(3, self.buffer.add('1.1.1.1', self.movie_1.id,
+                                            self.star_5.id))
+
+    def test_filled_buffer_is_flushed_at_once(self):
+        for number in range(3):
+            self.assertTrue(self.buffer.vote(f'{number}.1.1.1',
+                                             self.movie_1.id, self.star_5.id))
+        self.assertIsNone(self.buffer.timer)
+        self.assertEqual(3, Rating.objects.filter(movie=self.movie_1).count())
+
+    def test_first_vote_schedules_flush(self):
+        self.buffer.vote('1.1.1.1', self.movie_1.id, self.star_1.id)
+        timer = self.buffer.timer
+        self.assertTrue(timer.is_alive())
+        self.buffer.vote('2.1.1.1', self.movie_1.id, self.star_1.id)
+        self.assertIs(timer, self.buffer.timer)
+        self.buffer.drain()
+        self.assertIsNone(self.buffer.timer)
+
+    def test_flush_updates_aggregates_once_per_movie(self):
+        Rating.objects.create(ip='1.1.1.1', star=self.star_1,
+                              movie=self.movie_1)
+        self.buffer.add('1.1.1.1', self.movie_1.id, self.star_5.id)
+        self.buffer.add('2.1.1.1', self.movie_1.id, self.star_5.id)
+        self.buffer.add('2.1.1.1', self.movie_2.id, self.star_1.id)
+        get_star_values()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(3, self.buffer.flush())
+        updates = [query for query in queries
+                   if query['sql'].startswith('UPDATE "movies_movie"')]
+        self.assertEqual(2, len(updates))
+        self.movie_1.refresh_from_db()
+        self.movie_2.refresh_from_db()
+        self.assertEqual({'5': 2}, self.movie_1.rating_histogram)
+        self.assertEqual({'1': 1}, self.movie_2.rating_histogram)
+        self.assertEqual(3, Rating.objects.count())
+
+    def test_flush_skips_missing_movies_and_unchanged_votes(self):
+        Rating.objects.create(ip='1.1.1.1', star=self.star_1,
+                              movie=self.movie_1)
+        self.buffer.add('1.1.1.1', self.movie_1.id, self.star_1.id)
+        self.buffer.add('1.1.1.1', 0, self.star_1.id)
+        self.assertEqual(0, self.buffer.flush())
+        self.movie_1.refresh_from_db()
+        self.assertEqual({'1': 1}, self.movie_1.rating_histogram)
+
+    def test_failed_flush_keeps_votes(self):
+        self.buffer.add('1.1.1.1', self.movie_1.id, self.star_1.id)
+        self.buffer.add('2.1.1.1', self.movie_1.id, self.star_1.id)
+        with mock.patch.object(Rating, 'vote_many',
+                               side_effect=DatabaseError('deadlock')):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        self.buffer.add('1.1.1.1', self.movie_1.id, self.star_5.id)
+        self.assertEqual({('1.1.1.1', self.movie_1.id): self.star_5.id,
+                          ('2.1.1.1', self.movie_1.id): self.star_1.id},
+                         self.buffer.votes)
+        self.assertEqual(2, self.buffer.flush())
+        self.assertEqual(2, Rating.objects.count())
+
+    def test_backend_must_implement_buffer(self):
+        class IncompleteBuffer(RatingBuffer):
+            def add(self, ip, movie_id, star_id):
+                return None
+
+        with self.assertRaises(TypeError):
+            IncompleteBuffer(max_size=1, max_delay=1)
+
+
+class RedisRatingBufferTestCase(TestCase):
+
+    def test_unavailable_broker_does_not_fail_vote(self):
+        buffer = RedisRatingBuffer(max_size=2, max_delay=60,
+                                   url='redis://localhost:1/0')
+        with mock.patch('movies.rating_buffer.app.send_task',
+                        side_effect=OperationalError('down')) as send_task, \
+                self.assertLogs('movies.rating_buffer', 'WARNING'):
+            buffer.schedule_flush(0)
+        send_task.assert_called_once_with(
+            'movies.tasks.flush_rating_votes', countdown=0, retry=False)
+
+
+@override_settings(RATING_BUFFER_BACKEND='local', RATING_BUFFER_MAX_SIZE=2,
+                   RATING_BUFFER_MAX_DELAY=60)
+class BufferedRatingApiTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_two_tier_cache().clear()
+        self.star_1 = RatingStar.objects.create(value=1)
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Forsazh', year=2001,
+                    country='USA', url='forsazh')
+        self.user_1 = User.objects.create_user('test', 'test@mail.ua', '12345')
+        self.client.force_login(self.user_1)
+        self.buffer = get_rating_buffer()
+        self.addCleanup(self.buffer.drain)
+
+    def vote(self, movie_id, ip='1.1.1.1'):
+        return self.client.post('/api/v1/add_rating/',
+                                data={'star': self.star_1.id,
+                                      'movie': movie_id},
+                                format='json', REMOTE_ADDR=ip)
+
+    def test_vote_is_accepted_before_write(self):
+        response = self.vote(self.movie_1.id)
+        self.assertEqual(status.HTTP_202_ACCEPTED, response.status_code)
+        self.assertEqual({'star': self.star_1.id, 'movie': self.movie_1.id},
+                         response.data)
+        self.assertFalse(Rating.objects.exists())
+        self.buffer.flush()
+        self.movie_1.refresh_from_db()
+        self.assertEqual(1, self.movie_1.rating_count)
+
+    def test_vote_for_missing_movie(self):
+        response = self.vote(0)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_full_buffer_writes_vote_directly(self):
+        self.buffer.add('8.1.1.1', 0, self.star_1.id)
+        self.buffer.add('9.1.1.1', 0, self.star_1.id)
+        response = self.vote(self.movie_1.id)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(1, Rating.objects.count())
@@ -0,0 +1,74 @@
+import io
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from movies.parsers import FastJSONParser
+from movies.renderers import FastJSONRenderer, FragmentList, JSONFragment
+
+
+class FastJSONRendererTestCase(SimpleTestCase):
+
+    data = {
+        'count': 2,
+        'next': None,
+        'results': [
+            {'id': 1, 'title': 'Форсаж\u2028', 'vote_average': Decimal('7.25'),
+             'release_date': date(2022, 4, 28), 'directors': [1, 2],
+             'added': datetime(2022, 4, 28, 10, 0, 0, 123456,
+                               tzinfo=timezone.utc),
+             'media_type': gettext_lazy('movie'), 'rating_user': False},
+            {'id': 2, 'rating_histogram': {1: 2, '5': 1}, 'big': 2 ** 70},
+        ],
+    }
+
+    def test_output_is_the_same(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(expected, FastJSONRenderer().render(self.data))
+        self.assertEqual(JSONRenderer().render(self.data['results'][0]),
+                         FastJSONRenderer().render(self.data['results'][0]))
+        self.assertEqual(b'', FastJSONRenderer().render(None))
+
+    def test_indent_is_rendered_by_standard_encoder(self):
+        media_type = 'application/json; indent=4'
+        self.assertEqual(JSONRenderer().render(self.data, media_type),
+                         FastJSONRenderer().render(self.data, media_type))
+
+    def test_fragments(self):
+        data = {'count': 1, 'title': Decimal('1.5'), 'results': FragmentList(
+            [JSONFragment(1, b'{"id":1}')])}
+        self.assertEqual(b'{"count":1,"title":1.5,"results":[{"id":1}]}',
+                         FastJSONRenderer().render(data))
+
+    def test_without_orjson(self):
+        with mock.patch('movies.renderers.orjson', None):
+            self.assertEqual(JSONRenderer().render(self.data),
+                             FastJSONRenderer().render(self.data))
+
+
+class FastJSONParserTestCase(SimpleTestCase):
+
+    content = '{"star": 1, "movie": 2, "text": "Відгук", "rate": 7.25}'
+
+    def parse(self, content: bytes, encoding='utf-8'):
+        return FastJSONParser().parse(io.BytesIO(content),
+                                      parser_context={'encoding': encoding})
+
+    def test_parse(self):
+        expected = JSONParser().parse(io.BytesIO(self.content.encode()))
+        self.assertEqual(expected, self.parse(self.content.encode()))
+        self.assertEqual(expected, self.parse(self.content.encode('utf-16'),
+                                              encoding='utf-16'))
+        with mock.patch('movies.parsers.orjson', None):
+            self.assertEqual(expected, self.parse(self.content.encode()))
+
+    def test_invalid_content(self):
+        for content in (b'{"star": 1', b'{"star": NaN}', b'\xff'):
+            with self.assertRaises(ParseError):
+                self.parse(content)
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.models import Movie, Genre
+
+
+class SearchTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.genre_1 = Genre.objects\
+            .create(name='Adventure', description='Adventure', url='adventure')
+        self.movie_1 = Movie.objects\
+            .create(title='Forsazh', description='Cars and races',
+                    year=2001, country='USA', url='forsazh')
+        self.movie_2 = Movie.objects\
+            .create(title='Drive', description='Forsazh of the night city',
+                    year=2011, country='USA', url='drive')
+        self.movie_3 = Movie.objects\
+            .create(title='Брат', description='Фильм о Петербурге',
+                    year=1997, country='Russia', url='brat')
+        self.movie_2.genres.add(self.genre_1)
+
+    def search(self, params):
+        response = self.client.get(reverse('movie-search') + params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [movie['id'] for movie in response.data['results']]
+
+    def test_search_ranks_title_matches_first(self):
+        self.assertEqual([self.movie_1.id, self.movie_2.id],
+                         self.search('?q=forsazh'))
+
+    def test_search_by_prefix_of_words(self):
+        self.assertEqual([self.movie_2.id], self.search('?q=nig ci'))
+        self.assertEqual([self.movie_3.id], self.search('?q=петерб'))
+
+    def test_search_with_filters(self):
+        self.assertEqual([self.movie_2.id],
+                         self.search('?q=forsazh&genres=Adventure'))
+
+    def test_search_index_is_updated(self):
+        self.movie_1.title = 'Taxi'
+        self.movie_1.save()
+        self.assertEqual([self.movie_2.id], self.search('?q=forsazh'))
+        self.assertEqual([self.movie_1.id], self.search('?q=taxi'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie_2.delete()
+        self.assertEqual([], self.search('?q=forsazh'))
+
+    def test_search_pagination(self):
+        response = self.client.get(reverse('movie-search') + '?q=forsazh&limit=1')
+        self.assertEqual(2, response.data['count'])
+        self.assertEqual([self.movie_1.id],
+                         [movie['id'] for movie in response.data['results']])
+
+    def test_search_without_query(self):
+        response = self.client.get(reverse('movie-search'))
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual([], self.search('?q=%2B%2B'))
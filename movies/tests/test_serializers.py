@@ -4,6 +4,7 @@ from django.test import TestCase
 from django.urls import reverse
 from django.test.client import RequestFactory
 
+from movies.cache import get_two_tier_cache
 from movies.models import Category, Rating, RatingStar, Movie, Actor, Genre, \
     UserWishes, Review, Director
 from movies.serializers import CategorySerializer, \
@@ -19,6 +20,7 @@ from movies.utils import get_client_ip
 class SerializersTestCase(TestCase):
 
     def setUp(self):
+        get_two_tier_cache().clear()
         self.category_1 = Category.objects\
             .create(name='Film', description='First Cat', url='film')
         self.category_2 = Category.objects\
@@ -238,20 +240,22 @@ class SerializersTestCase(TestCase):
                     'description': 'Adventure',
                     'url': 'adventure'
                 }],
+            'review_count': 3,
             'reviews':
                 [
                     {'id': self.review_1.id, 'name': 'Carl',
-                     'text': 'Good film', 'children':
+                     'text': 'Good film', 'reply_count': 1, 'children':
                         [{'id': self.review_2.id, 'name': 'Carl',
-                          'text': 'Good film Children',
+                          'text': 'Good film Children', 'reply_count': 0,
                           'children': []}]
                      },
                     {'id': self.review_3.id, 'name': 'Carl1',
-                     'text': 'Good film', 'children': []}],
+                     'text': 'Good film', 'reply_count': 0, 'children': []}],
             'title': 'Test', 'description': 'Test', 'year': 2019,
             'country': 'USA',
             'world_premier': '2022-04-28', 'budget': 100, 'fees_is_usa': 150,
-            'fees_in_world': 200, 'url': 'test'
+            'fees_in_world': 200, 'url': 'test',
+            'rating_count': 1, 'rating_sum': 1, 'rating_histogram': {'1': 1}
 
         }
         self.assertEqual(expected_data, result)
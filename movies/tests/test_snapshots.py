@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movies.models import Category, Genre, RatingStar
+from movies.serializers import CategorySerializer, GenreSerializer
+from movies.snapshots import ReferenceSnapshot
+
+
+class ReferenceSnapshotTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category_1 = Category.objects\
+            .create(name='Film', description='First Cat', url='film')
+        self.category_2 = Category.objects\
+            .create(name='Serial', description='Second Cat', url='serial')
+        self.star_1 = RatingStar.objects.create(value=1)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_reads_do_not_query_database(self):
+        urls = [reverse('category-list'), reverse('rating-list'),
+                reverse('genre-list'), reverse('director-list'),
+                reverse('category-detail', args=(self.category_1.id, ))]
+        for url in urls:
+            self.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            data = [self.get(url) for url in urls]
+        self.assertEqual(0, len(queries))
+        self.assertEqual(
+            CategorySerializer([self.category_1, self.category_2],
+                               many=True).data, data[0]['results'])
+        self.assertEqual([{'id': self.star_1.id, 'value': 1}],
+                         data[1]['results'])
+        self.assertEqual(CategorySerializer(self.category_1).data, data[4])
+
+    def test_missing_detail(self):
+        for pk in (0, 'abc'):
+            response = self.client.get(reverse('category-detail', args=(pk, )))
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_changes_reach_snapshots(self):
+        other_process = ReferenceSnapshot(Genre, GenreSerializer)
+        self.assertEqual([], other_process.get())
+        self.get(reverse('genre-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            genre = Genre.objects.create(name='Horror', description='Horror',
+                                         url='horror')
+        self.assertEqual([genre.id], [row['id'] for row in
+                                      self.get(reverse('genre-list'))
+                                      ['results']])
+        self.assertEqual([genre.id],
+                         [row['id'] for row in other_process.get()])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category_2.delete()
+        self.assertEqual(1, self.get(reverse('category-list'))['count'])
+
+    def test_rows_keep_ordering_of_model(self):
+        star_3 = RatingStar.objects.create(value=3)
+        star_2 = RatingStar.objects.create(value=2)
+        self.assertEqual([self.star_1.id, star_2.id, star_3.id],
+                         [row['id'] for row in
+                          self.get(reverse('rating-list'))['results']])
+
+    def test_ratings_have_no_detail(self):
+        response = self.client.get(f'/api/v1/rating/{self.star_1.id}/')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
@@ -0,0 +1,145 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from django.test import TestCase, override_settings
+
+from movies.models import MovieImdb
+from movies.tasks import upload_popular_movies
+from movies.tmdb import TrendingFetcher, create_session, iter_array_items
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        page = int(parse_qs(url.query)['page'][0])
+        server = self.server
+        with server.lock:
+            server.ports.add(self.client_address[1])
+            server.calls[page] = server.calls.get(page, 0) + 1
+            failures = server.failures.get(page, 0)
+            if failures:
+                server.failures[page] = failures - 1
+        if url.path != '/3/trending/all/day':
+            status, body = 404, {}
+        elif failures:
+            status, body = 503, {}
+        elif page > server.pages:
+            status, body = 422, {'errors': ['page must be less than 500']}
+        else:
+            status, body = 200, {
+                'page': page,
+                'results': [{'id': page * 100 + number,
+                             'title': f'Movie{page}-{number}',
+                             'release_date': '2022-05-01',
+                             'vote_count': 10, 'vote_average': 7.5,
+                             'media_type': 'movie'} for number in range(20)],
+                'total_pages': server.pages}
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TrendingFetcherTestCase(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.pages = 3
+        self.server.ports = set()
+        self.server.calls = {}
+        self.server.failures = {}
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/3'
+
+    def get_fetcher(self, workers=2):
+        session = create_session(workers, backoff_factor=0)
+        self.addCleanup(session.close)
+        return TrendingFetcher(base_url=self.url, api_key='key',
+                               workers=workers, timeout=5, session=session)
+
+    def test_pages_are_fetched_in_batches(self):
+        batches = []
+        total = self.get_fetcher().fetch(
+            5, lambda movies: batches.append(len(movies['results'])),
+            batch_size=30)
+        self.assertEqual(60, total)
+        self.assertEqual(60, sum(batches))
+        self.assertTrue(all(size >= 30 for size in batches[:-1]))
+        self.assertEqual({1, 2, 3, 4, 5}, set(self.server.calls))
+
+    def test_connections_are_reused(self):
+        fetcher = self.get_fetcher(workers=2)
+        fetcher.fetch(3, lambda movies: None)
+        fetcher.fetch(3, lambda movies: None)
+        self.assertLessEqual(len(self.server.ports), 2)
+
+    def test_failed_requests_are_repeated(self):
+        self.server.failures = {2: 2}
+        self.assertEqual(20, len(self.get_fetcher().fetch_page(2)))
+        self.assertEqual(3, self.server.calls[2])
+
+    def test_repeated_failures_are_raised(self):
+        self.server.failures = {1: 10}
+        with self.assertRaises(requests.HTTPError):
+            self.get_fetcher().fetch_page(1)
+        self.assertEqual(4, self.server.calls[1])
+
+    def test_wrong_path_is_raised(self):
+        self.url += '/wrong'
+        with self.assertRaises(requests.HTTPError):
+            self.get_fetcher().fetch_page(1)
+        with override_settings(TMDB_API_URL=self.url, TMDB_PAGES=2):
+            result = upload_popular_movies.apply()
+        self.assertEqual('FAILURE', result.state)
+        self.assertFalse(MovieImdb.objects.exists())
+
+    def test_own_session_is_closed(self):
+        with TrendingFetcher(base_url=self.url, api_key='key') as fetcher:
+            fetcher.fetch_page(1)
+            pools = fetcher.session.get_adapter(self.url).poolmanager.pools
+            self.assertEqual(1, len(pools))
+        self.assertEqual(0, len(pools))
+
+        with self.get_fetcher() as fetcher:
+            fetcher.fetch_page(1)
+        pools = fetcher.session.get_adapter(self.url).poolmanager.pools
+        self.assertEqual(1, len(pools))
+
+    def test_upload_popular_movies(self):
+        with override_settings(TMDB_API_URL=self.url, TMDB_PAGES=4):
+            self.assertTrue(upload_popular_movies.apply().get())
+        self.assertEqual(60, MovieImdb.objects.count())
+
+
+class IterArrayItemsTestCase(TestCase):
+
+    def test_items_are_decoded_from_chunks(self):
+        text = json.dumps({'page': 1, 'results': [{'title': 'a ] b, "c'},
+                                                  7, [1, 2], 12345],
+                           'total_pages': 1})
+        for size in (1, 3, 1000):
+            chunks = [text[start:start + size]
+                      for start in range(0, len(text), size)]
+            self.assertEqual([{'title': 'a ] b, "c'}, 7, [1, 2], 12345],
+                             list(iter_array_items(chunks, 'results')))
+
+    def test_not_complete_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_array_items(['{"results": [{"id": 1}'], 'results'))
+        with self.assertRaises(ValueError):
+            list(iter_array_items(['{"page": 1}'], 'results'))
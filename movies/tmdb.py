@@ -0,0 +1,164 @@
+"""
+    Collect client of the movie database api
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, List
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+TRENDING_PATH = '/trending/all/day'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_session(workers: int, retries: int = 3,
+                   backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Create session keeping connections alive for all workers. Requests
+    failed with 429 and 5xx are repeated with growing pauses
+    :param workers: amount of threads using the session
+    :param retries: amount of repeats
+    :param backoff_factor: base of pauses between repeats in seconds
+    :return: session
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUSES, allowed_methods=['GET'],
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def iter_array_items(chunks: Iterable[str], key: str) -> Iterator:
+    """
+    Decode items of the array under the key of the json object while chunks
+    of the text are read, so the whole response is not kept in memory.
+    The key is looked for before the first array, so it must belong to the
+    top object
+    :param chunks: chunks of the json text
+    :param key: key of the array
+    :return: decoded items
+    """
+    decoder = json.JSONDecoder()
+    marker = json.dumps(key)
+    buffer = ''
+    position = None
+    chunks = iter(chunks)
+    exhausted = False
+    while True:
+        if position is None:
+            start = buffer.find(marker)
+            opening = buffer.find('[', start) if start >= 0 else -1
+            if opening >= 0:
+                buffer = buffer[opening + 1:]
+                position = 0
+        else:
+            while True:
+                while position < len(buffer) and \
+                        buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer) and buffer[position] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                if end == len(buffer) and not exhausted:
+                    # Number at the end of the buffer may be not complete
+                    break
+                position = end
+                yield item
+            buffer, position = buffer[position:], 0
+        if exhausted:
+            raise ValueError(f'Array "{key}" is not complete')
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer += chunk
+
+
+class TrendingFetcher:
+    """
+    Fetcher of pages of trending movies. Pages are requested by the pool
+    of threads over one session. The fetcher is a context manager closing
+    the session created by the fetcher
+    """
+
+    def __init__(self, base_url: str = None, api_key: str = None,
+                 workers: int = None, timeout=None,
+                 session: requests.Session = None):
+        self.base_url = (base_url or settings.TMDB_API_URL).rstrip('/')
+        self.api_key = api_key if api_key is not None \
+            else os.environ.get('API_KEY', '')
+        self.workers = workers or settings.TMDB_WORKERS
+        self.timeout = timeout or settings.TMDB_TIMEOUT
+        self.owns_session = session is None
+        self.session = session or create_session(self.workers)
+
+    def __enter__(self) -> 'TrendingFetcher':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close connections of the session when it was created by the fetcher,
+        the passed session is closed by its owner
+        """
+        if self.owns_session:
+            self.session.close()
+
+    def fetch_page(self, page: int) -> List[dict]:
+        """
+        Get movies of the page. Pages after the last one are empty, other
+        errors of the api are raised
+        :param page: number of the page
+        :return: movies
+        """
+        params = {'api_key': self.api_key, 'language': 'en-US', 'page': page}
+        with self.session.get(self.base_url + TRENDING_PATH, params=params,
+                              timeout=self.timeout, stream=True) as response:
+            if response.status_code in (400, 422):
+                return []
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            chunks = response.iter_content(chunk_size=8192,
+                                           decode_unicode=True)
+            return list(iter_array_items(chunks, 'results'))
+
+    def fetch(self, pages: int, consume: Callable[[dict], None],
+              batch_size: int = 500) -> int:
+        """
+        Fetch pages concurrently and pass movies to the consumer in batches
+        while the rest of pages are loaded
+        :param pages: amount of pages
+        :param consume: function taking the response with movies
+        :param batch_size: amount of movies in one batch
+        :return: amount of fetched movies
+        """
+        batch = []
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.fetch_page, page)
+                       for page in range(1, pages + 1)]
+            for future in as_completed(futures):
+                movies = future.result()
+                total += len(movies)
+                batch.extend(movies)
+                if len(batch) >= batch_size:
+                    consume({'results': batch})
+                    batch = []
+        if batch:
+            consume({'results': batch})
+        return total
@@ -12,6 +12,11 @@ from . import views
 urlpatterns = [
     path('create_review/', views.ReviewCreateView.as_view()),
     path('add_rating/', views.AddStarRatingView.as_view()),
+    path('movie/<int:movie_id>/reviews/', views.MovieReviewsView.as_view(),
+         name='movie-reviews'),
+    path('autocomplete/', views.AutocompleteView.as_view(),
+         name='autocomplete'),
+    path('cache_stats/', views.CacheStatsView.as_view(), name='cache-stats'),
 ]
 
 
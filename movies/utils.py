@@ -2,6 +2,23 @@
     Collect function utils
 """
 
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache, caches, DEFAULT_CACHE_ALIAS
+from django.db.models import Count
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:
+    RedisCache = None
+
+from .cache import cached
+from .models import Rating, RatingStar, Review
+
 
 def get_client_ip(request) -> str:
     """
@@ -13,3 +30,200 @@ def get_client_ip(request) -> str:
     else:
         ip = request.META.get('REMOTE_ADDR')
     return ip
+
+
+# Sets of rated movies in Redis keep the id which is never used, so the
+# set of the client without votes is found in the cache
+LOADED_MARK = 0
+ADD_RATED_MOVIE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+return redis.call('SADD', KEYS[1], ARGV[1]) + 1
+"""
+
+_rated_movies_lock = threading.Lock()
+
+
+def rated_movies_key(ip: str) -> str:
+    """
+    Key of the set of movies rated from the ip in the cache
+    """
+    return f'rated_movies:{ip}'
+
+
+def get_redis_client():
+    """
+    Get the client of Redis when it is the shared cache, None otherwise
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if RedisCache is None or not isinstance(backend, RedisCache):
+        return None
+    return backend.client.get_client()
+
+
+def get_rated_movie_ids(ip: str) -> Optional[set]:
+    """
+    Get ids of movies rated from the ip, None when they are not cached
+    """
+    client = get_redis_client()
+    if client is None:
+        return cache.get(rated_movies_key(ip))
+    members = client.smembers(cache.make_key(rated_movies_key(ip)))
+    if not members:
+        return None
+    return {int(member) for member in members} - {LOADED_MARK}
+
+
+def store_rated_movie_ids(ip: str, movie_ids: set) -> None:
+    """
+    Put ids of movies rated from the ip to the cache. Ids are added to the
+    set in Redis, so ids added concurrently are kept
+    """
+    client = get_redis_client()
+    if client is None:
+        cache.set(rated_movies_key(ip), movie_ids,
+                  settings.RATED_MOVIES_CACHE_TIMEOUT)
+        return
+    key = cache.make_key(rated_movies_key(ip))
+    with client.pipeline() as pipeline:
+        pipeline.sadd(key, LOADED_MARK, *movie_ids)
+        pipeline.expire(key, settings.RATED_MOVIES_CACHE_TIMEOUT)
+        pipeline.execute()
+
+
+def load_rated_movie_ids(ip: str) -> set:
+    """
+    Load ids of movies rated from the ip from the database
+    """
+    return set(Rating.objects.filter(ip=ip)
+               .values_list('movie_id', flat=True))
+
+
+def cache_rated_movie_ids(ip: str) -> set:
+    """
+    Load ids of movies rated from the ip and put them to the cache
+    """
+    movie_ids = load_rated_movie_ids(ip)
+    store_rated_movie_ids(ip, movie_ids)
+    return movie_ids
+
+
+def add_rated_movie_id(ip: str, movie_id: int) -> None:
+    """
+    Add the movie to the cached set of movies rated from the ip. The movie
+    is added to the set in Redis by one command. The cache of the process
+    is changed under the lock
+    """
+    client = get_redis_client()
+    if client is not None:
+        add = client.register_script(ADD_RATED_MOVIE_SCRIPT)
+        if not add(keys=[cache.make_key(rated_movies_key(ip))],
+                   args=[movie_id]):
+            store_rated_movie_ids(ip, load_rated_movie_ids(ip) | {movie_id})
+        return
+    with _rated_movies_lock:
+        movie_ids = get_rated_movie_ids(ip)
+        if movie_ids is None:
+            movie_ids = load_rated_movie_ids(ip)
+        store_rated_movie_ids(ip, movie_ids | {movie_id})
+
+
+@cached('rating_stars', timeout=None)
+def get_star_values() -> dict:
+    """
+    Get values of rating stars by their ids. Stars are changed rarely, so
+    they are kept in the cache until a star is saved or deleted
+    """
+    return dict(RatingStar.objects.values_list('pk', 'value'))
+
+
+CATALOG_VERSION_KEY = 'catalog_version'
+
+
+def get_catalog_version() -> int:
+    """
+    Get version of the catalog, it is changed on every change of movies
+    and related to them objects
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the current time, so the version is not repeated when
+        # the counter was evicted from the cache
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version() -> None:
+    """
+    Change version of the catalog, so all cached lists become outdated
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+        cache.incr(CATALOG_VERSION_KEY)
+
+
+def get_list_cache_key(prefix: str, request) -> str:
+    """
+    Get key of the cached list for the request. Key is built from the
+    current version of the catalog and normalized query params
+    """
+    params = sorted((name, sorted(values))
+                    for name, values in request.query_params.lists())
+    signature = hashlib.md5(
+        f'{request.build_absolute_uri(request.path)}?{params}'.encode()
+    ).hexdigest()
+    return f'{prefix}:{get_catalog_version()}:{signature}'
+
+
+def link_review_threads(reviews) -> list:
+    """
+    Link reviews with their replies in memory
+    :param reviews: reviews of the movie
+    :return: reviews whose parents are not among given ones
+    """
+    reviews = list(reviews)
+    reviews_by_id = {}
+    for review in reviews:
+        review.linked_replies = []
+        reviews_by_id[review.id] = review
+
+    top_reviews = []
+    for review in reviews:
+        if review.parent_id in reviews_by_id:
+            reviews_by_id[review.parent_id].linked_replies.append(review)
+        else:
+            top_reviews.append(review)
+    return top_reviews
+
+
+def load_review_threads(top_reviews, depth: int) -> list:
+    """
+    Load replies of the reviews level by level up to the depth and link
+    them into threads. Replies below the depth are only counted
+    :param top_reviews: reviews which threads are loaded
+    :param depth: amount of loaded levels of replies
+    :return: top reviews
+    """
+    top_reviews = list(top_reviews)
+    loaded = list(top_reviews)
+    level = top_reviews
+    for _ in range(depth):
+        if not level:
+            break
+        level = list(Review.objects.filter(parent__in=level).order_by('id'))
+        loaded.extend(level)
+    link_review_threads(loaded)
+
+    for review in loaded:
+        review.reply_count = len(review.linked_replies)
+    if level:
+        reply_counts = dict(Review.objects.filter(parent__in=level)
+                            .values_list('parent_id')
+                            .annotate(total=Count('id')).order_by())
+        for review in level:
+            review.reply_count = reply_counts.get(review.id, 0)
+    return top_reviews
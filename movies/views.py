@@ -2,29 +2,52 @@
 Collect all api call for app movies
 """
 
+from array import array
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_view, extend_schema, \
     OpenApiParameter
-from rest_framework import generics, viewsets
+from rest_framework import generics, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 
 from .models import Movie, Category, Actor, Genre, UserWishes, RatingStar, \
-    Director
+    Director, Review
 from .serializers import MovieListSerializer, MovieDetailSerializer, \
     CategorySerializer, ReviewCreateSerializer, CreateRatingSerializer, \
     ActorSerializer, GenreSerializer, WishesSerializer, \
-    WishesCreateSerializer, RatingSerializer, DirectorSerializer
-
-from .utils import get_client_ip
+    WishesCreateSerializer, RatingSerializer, DirectorSerializer, \
+    ReviewThreadSerializer, WishesListSerializer
+
+from .utils import get_client_ip, get_rated_movie_ids, \
+    cache_rated_movie_ids, add_rated_movie_id, get_list_cache_key, \
+    load_review_threads
+from .autocomplete import autocomplete_index
+from .cache import get_two_tier_cache
+from .compiled import CompiledListMixin
+from .compression import CompressedResponseMixin
+from .conditional import ConditionalGetMixin, get_list_etag
 from .filters import MovieFilter, ActorBasedMovie
+from .movie_index import movie_index, IndexedMovies
+from .fragments import get_movie_fragments, build_movie_list_fragments, \
+    build_wished_movie_fragments
+from .pagination import KeysetPaginationMixin, IdCursorPagination
+from .renderers import FragmentList
+from .search import search_movies
+from .snapshots import ReferenceSnapshotMixin, ReferenceSnapshotDetailMixin
 
 
-class CategoryView(viewsets.ModelViewSet):
+class CategoryView(ReferenceSnapshotDetailMixin, viewsets.ModelViewSet):
     """
     View for get, create, update, delete category
     """
@@ -38,8 +61,12 @@ class CategoryView(viewsets.ModelViewSet):
     list=extend_schema(parameters=[
         OpenApiParameter("title", OpenApiTypes.STR, OpenApiParameter.QUERY,
                          description='Set the titles of movies'),
+        OpenApiParameter("pagination", OpenApiTypes.STR,
+                         OpenApiParameter.QUERY, enum=['cursor'],
+                         description='Set cursor for keyset pagination'),
     ], description='Filter actors by movie'))
-class ActorViews(viewsets.ModelViewSet):
+class ActorViews(CompressedResponseMixin, ConditionalGetMixin, CompiledListMixin,
+                 KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     View for get, create, update, delete actors
     """
@@ -49,7 +76,7 @@ class ActorViews(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class DirectorViews(viewsets.ModelViewSet):
+class DirectorViews(ReferenceSnapshotDetailMixin, viewsets.ModelViewSet):
     """
     View for get, create, update, delete directors
     """
@@ -58,7 +85,7 @@ class DirectorViews(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class GenresViews(viewsets.ModelViewSet):
+class GenresViews(ReferenceSnapshotDetailMixin, viewsets.ModelViewSet):
     """
     View for get, create, update, delete actors
     """
@@ -68,22 +95,34 @@ class GenresViews(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
+MOVIE_FILTER_PARAMETERS = [
+    OpenApiParameter("genres", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description='Set the genres'),
+    OpenApiParameter("actors", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description='Set actors for filter'),
+    OpenApiParameter("directors", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description='Set directors for filter'),
+    OpenApiParameter("title", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description='Set film title for filter'),
+    OpenApiParameter("year_min", OpenApiTypes.NUMBER, OpenApiParameter.QUERY,
+                     description='Set year start'),
+    OpenApiParameter("year_max", OpenApiTypes.NUMBER, OpenApiParameter.QUERY,
+                     description='Set year end'),
+    OpenApiParameter("match", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     enum=['any', 'all'],
+                     description='Set all to require every listed genre, '
+                                 'actor and director'),
+]
+
+
 @extend_schema_view(
-    list=extend_schema(parameters=[
-        OpenApiParameter("genres", OpenApiTypes.STR, OpenApiParameter.QUERY,
-                         description='Set the genres'),
-        OpenApiParameter("actors", OpenApiTypes.STR, OpenApiParameter.QUERY,
-                         description='Set actors for filter'),
-        OpenApiParameter("directors", OpenApiTypes.STR, OpenApiParameter.QUERY,
-                         description='Set directors for filter'),
-        OpenApiParameter("title", OpenApiTypes.STR, OpenApiParameter.QUERY,
-                         description='Set film title for filter'),
-        OpenApiParameter("year_min", OpenApiTypes.NUMBER, OpenApiParameter.QUERY,
-                         description='Set year start'),
-        OpenApiParameter("year_max", OpenApiTypes.NUMBER, OpenApiParameter.QUERY,
-                         description='Set year end')
+    list=extend_schema(parameters=MOVIE_FILTER_PARAMETERS + [
+        OpenApiParameter("pagination", OpenApiTypes.STR,
+                         OpenApiParameter.QUERY, enum=['cursor'],
+                         description='Set cursor for keyset pagination')
     ], description='View to get movie with full list or use query params'))
-class MovieViews(viewsets.ModelViewSet):
+class MovieViews(CompressedResponseMixin, ConditionalGetMixin,
+                 KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     View for get, create, update, delete movie
     """
@@ -97,31 +136,154 @@ class MovieViews(viewsets.ModelViewSet):
         """
 
         if self.action == 'list':
-
-            movies = (
-                Movie.objects.all()
-                    .prefetch_related('directors', 'actors', 'genres')
-                    .annotate(
-                    rating_user=models
-                        .Count("ratings",
-                               filter=models.Q(ratings__ip=get_client_ip(
-                                   self.request)))
-                ).annotate(
-                    middle_star=models
-                                    .Sum(models.F('ratings__star__value')
-                                         ) / models.Count(models.F('ratings'))
-                )
-            )
-            return movies
+            return Movie.objects.only('id')
+        if self.action == 'search':
+            text = self.request.query_params.get('q')
+            if not text:
+                raise ValidationError({'q': 'This field is required.'})
+            return search_movies(Movie.objects.only('id'), text,
+                                 connection.vendor)
         return (Movie.objects.all()
-                .prefetch_related('reviews', 'directors', 'actors', 'genres')
+                .select_related('category')
+                .prefetch_related('directors', 'actors', 'genres')
                 )
 
+    def filter_queryset(self, queryset):
+        """
+        Select movies of the list by the inverted index when all filters
+        are indexed. Otherwise filter the queryset in the database
+        """
+        if self.action == 'list' and \
+                not self.is_cursor_pagination_requested():
+            movie_ids = movie_index.get().select(self.request.query_params)
+            if movie_ids is not None:
+                return IndexedMovies(movie_ids)
+        return super().filter_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Return the list of movies from the cache when it was built for the
+        same query params and the catalog was not changed since then.
+        Otherwise only ids of movies are selected and the list is stitched
+        from pre-serialized movies. Movies rated by the client are marked
+        after the cache, so the cached list is shared between clients
+        """
+        return self.get_movie_list('movie_list')
+
+    @extend_schema(parameters=[
+        OpenApiParameter("q", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                         required=True,
+                         description='Set words of the title or description'),
+    ], description='Search movies by the title and description, the best '
+                   'matches go first. Filters of the list can be used too')
+    @action(detail=False)
+    def search(self, request, *args, **kwargs):
+        """
+        Return movies found by the full-text index, ranked by relevance
+        """
+        return self.get_movie_list('movie_search')
+
+    @extend_schema(parameters=MOVIE_FILTER_PARAMETERS,
+                   responses=OpenApiTypes.OBJECT,
+                   description='Count movies matching filters per genre, '
+                               'category, director, country and years')
+    @action(detail=False, pagination_class=None)
+    def facets(self, request, *args, **kwargs):
+        """
+        Return counts of facets for movies matching filters of the list.
+        Movies are selected by the inverted index or by the database when
+        filters are not indexed, counts are cached by filters
+        """
+        key = get_list_cache_key('movie_facets', request)
+        data = cache.get(key)
+        if data is None:
+            index = movie_index.get()
+            movie_ids = index.select(request.query_params)
+            if movie_ids is None:
+                queryset = self.filter_queryset(Movie.objects.all())
+                movie_ids = array('q', sorted(set(
+                    queryset.values_list('pk', flat=True))))
+            data = index.count_facets(movie_ids, settings.MOVIE_FACET_SIZE,
+                                      settings.MOVIE_FACET_YEAR_BUCKET)
+            cache.set(key, data, settings.MOVIE_LIST_CACHE_TIMEOUT)
+        return Response(data)
+
+    def get_movie_list(self, key_prefix: str) -> Response:
+        """
+        Return the list of movies of the current action, using the cache.
+        Clients having the same list get 304 Not Modified. The list is
+        tagged by the version of the catalog, query params and movies rated
+        by the client, so it is checked without queries to the database.
+        Compressed lists with rated movies are not cached, so the cache is
+        not filled by a copy of the page per client
+        :param key_prefix: prefix of the cache key for the action
+        :return: response with the list of movies
+        """
+        key = get_list_cache_key(key_prefix, self.request)
+        rated_movie_ids = self.get_rated_movie_ids()
+        etag = get_list_etag(key, sorted(rated_movie_ids))
+        return self.tagged_response(
+            lambda: self.build_movie_list(key, rated_movie_ids), etag=etag,
+            shared=not rated_movie_ids)
+
+    def build_movie_list(self, key: str, rated_movie_ids: set) -> Response:
+        """
+        Build the list of movies of the current action
+        :param key: key of the cached list
+        :param rated_movie_ids: ids of movies rated by the client
+        :return: response with the list of movies
+        """
+        data = cache.get(key)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            movies = page if page is not None else queryset
+            data = FragmentList(get_movie_fragments(
+                'list', [movie.id for movie in movies],
+                build_movie_list_fragments))
+            if page is not None:
+                data = self.get_paginated_response(data).data
+            cache.set(key, data, settings.MOVIE_LIST_CACHE_TIMEOUT)
+        return Response(self.mark_rated_movies(data, rated_movie_ids))
+
+    def get_rated_movie_ids(self) -> set:
+        """
+        Get ids of movies rated by the client
+        """
+        ip = get_client_ip(self.request)
+        rated_movie_ids = get_rated_movie_ids(ip)
+        if rated_movie_ids is None:
+            rated_movie_ids = cache_rated_movie_ids(ip)
+        return rated_movie_ids
+
+    @staticmethod
+    def mark_rated_movies(data, rated_movie_ids: set):
+        """
+        Set rating_user for movies rated by the client
+        :param data: list of movies or paginated data
+        :param rated_movie_ids: ids of movies rated by the client
+        :return: data
+        """
+        movies = data['results'] if isinstance(data, dict) else data
+        for index, movie in enumerate(movies):
+            if movie.id in rated_movie_ids:
+                movies[index] = movie.replace(b'"rating_user":false',
+                                              b'"rating_user":true')
+        return data
+
+    def is_cursor_pagination_requested(self) -> bool:
+        """
+        Search results are ordered by rank, so they are paged by offset
+        """
+        if self.action == 'search':
+            return False
+        return super().is_cursor_pagination_requested()
+
     def get_serializer_class(self):
         """
         Returns the class that should be used for the serializer.
         """
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             return MovieListSerializer
         if self.action == "retrieve":
             return MovieDetailSerializer
@@ -136,6 +298,94 @@ class ReviewCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
+@extend_schema_view(
+    get=extend_schema(parameters=[
+        OpenApiParameter("parent", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                         description='Set review to get its replies'),
+        OpenApiParameter("depth", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                         description='Set amount of loaded reply levels'),
+    ], description='Page through review threads of the movie'))
+class MovieReviewsView(generics.ListAPIView):
+    """
+    View for getting threads of reviews for films
+    """
+    serializer_class = ReviewThreadSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        """
+        Returns top level reviews of the movie or replies of the review
+        from parent query param
+        """
+        if getattr(self, 'swagger_fake_view', False):
+            return Review.objects.none()
+        movie = get_object_or_404(Movie.objects.only('id'),
+                                  pk=self.kwargs['movie_id'])
+        parent = self.request.query_params.get('parent') or None
+        if parent is not None and not parent.isdigit():
+            raise ValidationError({'parent': 'A valid integer is required.'})
+        return Review.objects.filter(movie=movie, parent=parent)
+
+    def get_depth(self) -> int:
+        """
+        Returns amount of reply levels loaded for every review of the page
+        """
+        depth = self.request.query_params.get('depth', '')
+        if not depth.isdigit():
+            return settings.REVIEW_REPLY_DEPTH
+        return min(int(depth), settings.REVIEW_REPLY_DEPTH)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        threads = load_review_threads(page, self.get_depth())
+        serializer = self.get_serializer(threads, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+@extend_schema_view(
+    get=extend_schema(parameters=[
+        OpenApiParameter("q", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                         description='Set the beginning of words'),
+        OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                         description='Set amount of names of every kind'),
+    ], responses=OpenApiTypes.OBJECT,
+        description='Suggest movies, actors, directors and genres'))
+class AutocompleteView(APIView):
+    """
+    View for suggestions of the search box. Names are found in memory of
+    the process without queries to the database
+    """
+    default_limit = 10
+    max_limit = 50
+
+    def get_limit(self) -> int:
+        """
+        Returns amount of suggested names of every kind
+        """
+        limit = self.request.query_params.get('limit', '')
+        if not limit.isdigit():
+            return self.default_limit
+        return min(int(limit), self.max_limit)
+
+    def get(self, request, *args, **kwargs):
+        text = request.query_params.get('q', '')
+        return Response(autocomplete_index.search(text, self.get_limit()))
+
+
+@extend_schema_view(
+    get=extend_schema(responses=OpenApiTypes.OBJECT,
+                      description='Counters of the two-tier cache of the '
+                                  'process'))
+class CacheStatsView(APIView):
+    """
+    View for hits, misses and refreshes of the two-tier cache
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_two_tier_cache().get_stats())
+
+
 class AddStarRatingView(generics.CreateAPIView):
     """
     View for setting rating for films
@@ -150,7 +400,19 @@ class AddStarRatingView(generics.CreateAPIView):
         :param serializer:
         :return: None
         """
-        serializer.save(ip=get_client_ip(self.request))
+        ip = get_client_ip(self.request)
+        rating = serializer.save(ip=ip)
+        add_rated_movie_id(ip, rating.movie_id)
+        self.buffered = rating.pk is None
+
+    def create(self, request, *args, **kwargs):
+        """
+        Answer 202 when the vote is buffered and is not written yet
+        """
+        response = super().create(request, *args, **kwargs)
+        if getattr(self, 'buffered', False):
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
 
 
 class WishesCreateView(viewsets.mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -188,15 +450,33 @@ class WishesRetrieveDeleteView(viewsets.mixins.ListModelMixin,
         Returns the queryset that should be used for list views,
         and that should be used as the base for lookups in detail views.
         """
-        users_wishes = (
-            UserWishes.objects.select_related('movie')
-                .prefetch_related('movie__directors',
-                                  'movie__actors', 'movie__genres')
-            .filter(user=self.request.user.id))
+        users_wishes = (UserWishes.objects.select_related('user')
+                        .filter(user=self.request.user.id))
         return users_wishes
 
-
-class RatingView(viewsets.mixins.ListModelMixin, viewsets.GenericViewSet):
+    def list(self, request, *args, **kwargs):
+        """
+        Return wishes of the user with movies stitched from pre-serialized
+        ones
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        wishes = page if page is not None else queryset
+        fragments = get_movie_fragments(
+            'wish', list({wish.movie_id: None for wish in wishes}),
+            build_wished_movie_fragments)
+
+        context = self.get_serializer_context()
+        context['movie_fragments'] = {movie.id: movie for movie in fragments}
+        data = FragmentList(WishesListSerializer(wishes, many=True,
+                                                 context=context).data)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class RatingView(ReferenceSnapshotMixin, viewsets.mixins.ListModelMixin,
+                 viewsets.GenericViewSet):
     """
     View for getting list available ratings
     """